@@ -1,10 +1,62 @@
+import time
+
+IMPORTS_STARTED = time.perf_counter()
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-from dateutil.relativedelta import relativedelta
-from collections import Counter
 import os
 from io import BytesIO
+import uuid
+
+from engine.columns import NOME_COLUNA_CIDADE, NOME_COLUNA_ENDERECO, NOME_COLUNA_TELEFONE
+from engine.dataset import Dataset
+from engine.enrichment import SITUACAO_ENCONTRADO, read_identifiers
+from engine.export import export_file_name, export_mime, lazy_export
+from engine.jobs import JOBS, submit_append, submit_load
+from engine.market_share import DIMENSIONS as MARKET_DIMENSIONS
+from engine.metrics import METRICS, timed
+from engine.prediction import get_sales_pitch
+from engine.profiles import plate_details
+from engine.registry import DATASETS
+from engine.views import filter_signature
+from engine.warmup import start_warmup
+IMPORT_SECONDS = time.perf_counter() - IMPORTS_STARTED
+
+# --- Constantes e Caminhos ---
+DATA_DIR = "data"
+DEFAULT_EXCEL_FILE = os.path.join(DATA_DIR, "EMPLACAMENTO ANUAL - CAMINHÕES.xlsx")
+# Fonte padrão dos dados: uma planilha ou uma pasta com uma planilha por ano (ex.: DATA_DIR).
+# Numa pasta, todas as .xlsx são lidas em paralelo (com snapshot por planilha) e unidas
+DEFAULT_DATA_SOURCE = DEFAULT_EXCEL_FILE
+if os.path.isdir(DEFAULT_DATA_SOURCE):
+    DEFAULT_SOURCE_LABEL = f"planilhas da pasta {DEFAULT_DATA_SOURCE}"
+else:
+    DEFAULT_SOURCE_LABEL = f"arquivo padrão {os.path.basename(DEFAULT_DATA_SOURCE)}"
+LOGO_COLOR_PATH = os.path.join(DATA_DIR, "logo_denigris_colorido.png")
+LOGO_WHITE_PATH = os.path.join(DATA_DIR, "logo_denigris_branco.png")
+
+# Modo de esquema compacto: colunas repetitivas como categóricas e Ano/Mes como inteiros pequenos
+COMPACT_SCHEMA = True
+
+# Clientes por página na lista de inativos
+INACTIVE_PAGE_SIZE = 100
+
+# Clientes listados (do mais ao menos parecido) quando a busca encontra mais de um
+SEARCH_TOP_K = 10
+
+# Janelas (meses) da participação de mercado
+MARKET_WINDOW_LABELS = {1: "Mês", 3: "3 meses", 12: "12 meses"}
+
+# Intervalo (s) de atualização da barra de progresso dos uploads processados em segundo plano
+JOB_POLL_SECONDS = 1
+
+# Métricas de desempenho: uma linha JSON por rerun (tempos por etapa, memória e percentis).
+# O painel de administração aparece na barra lateral ao abrir o app com ?admin=1
+METRICS_LOG_FILE = os.path.join("logs", "metricas.jsonl")
+METRICS.log_path = METRICS_LOG_FILE
+
+# Aquecimento: o dataset padrão e os módulos pesados começam a carregar em segundo plano
+# já na tela de senha (uma vez por processo), para a primeira busca não esperar pela leitura.
+start_warmup(DEFAULT_DATA_SOURCE, compact=COMPACT_SCHEMA, import_seconds=IMPORT_SECONDS)
 
 # =================== BLOQUEIO DE ACESSO ===================
 SENHA_CORRETA = "23290000"
@@ -102,241 +154,54 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# --- Constantes e Caminhos ---
-DATA_DIR = "data"
-DEFAULT_EXCEL_FILE = os.path.join(DATA_DIR, "EMPLACAMENTO ANUAL - CAMINHÕES.xlsx")
-LOGO_COLOR_PATH = os.path.join(DATA_DIR, "logo_denigris_colorido.png")
-LOGO_WHITE_PATH = os.path.join(DATA_DIR, "logo_denigris_branco.png")
+# --- Funções de Carregamento de Dados ---
+# A leitura, os índices e as consultas ficam no motor (engine.dataset.Dataset), que não
+# depende do Streamlit; aqui só se trata a exibição dos erros.
+def show_load_error(error, file_path_or_buffer):
+    """Exibe na tela o erro de leitura/processamento da planilha."""
+    if isinstance(error, FileNotFoundError):
+        st.error(f"Erro: dados padrão não encontrados ({error}). Faça o upload de um arquivo.")
+    else:
+        file_info = "arquivo carregado" if isinstance(file_path_or_buffer, BytesIO) else os.path.basename(str(file_path_or_buffer))
+        st.error(f"Erro ao carregar ou processar o arquivo Excel ({file_info}): {error}")
 
-NOME_COLUNA_ENDERECO = "ENDEREÇO COMPLETO"
-NOME_COLUNA_TELEFONE = "TELEFONE1"
-NOME_COLUNA_CIDADE = "NO_CIDADE"
-NOME_COLUNA_CONCESSIONARIO = "concessionário"
 
-# --- Funções de Carregamento de Dados ---
-def load_data(file_path_or_buffer):
-    """Carrega e pré-processa os dados do arquivo Excel."""
-    try:
-        df = pd.read_excel(file_path_or_buffer)
-        
-        # Verificar e normalizar nomes de colunas (remover espaços extras, etc.)
-        df.columns = [col.strip() for col in df.columns]
-        
-        # **NOVO: Processamento da coluna PLACA**
-        # Verificar se a coluna PLACA existe e a normalizar para busca
-        if "PLACA" in df.columns:
-            df["PLACA"] = df["PLACA"].astype(str).str.strip().str.upper()
-            # Remove hífens e espaços para normalização na busca
-            df["PLACA_NORMALIZED"] = df["PLACA"].str.replace("-", "").str.replace(" ", "").str.upper()
-        else:
-            # Verificar variações do nome da coluna PLACA
-            placa_variations = ["PLACA", "Placa", "placa", "PLACA VEÍCULO", "Placa Veículo", 
-                               "PLACA_VEICULO", "NÚMERO DA PLACA", "Numero da Placa"]
-            found_placa_col = None
-            
-            for var in placa_variations:
-                if var in df.columns:
-                    found_placa_col = var
-                    break
-            
-            if found_placa_col:
-                df.rename(columns={found_placa_col: "PLACA"}, inplace=True)
-                df["PLACA"] = df["PLACA"].astype(str).str.strip().str.upper()
-                df["PLACA_NORMALIZED"] = df["PLACA"].str.replace("-", "").str.replace(" ", "").str.upper()
-                print(f"Coluna '{found_placa_col}' renomeada para 'PLACA'")
-            else:
-                df["PLACA"] = "N/A"
-                df["PLACA_NORMALIZED"] = ""
-                print("Coluna 'PLACA' não encontrada. Criada com valor padrão 'N/A'")
-        
-        # Verificar e normalizar a coluna concessionário
-        if NOME_COLUNA_CONCESSIONARIO not in df.columns:
-            # Verificar variações do nome da coluna concessionário
-            concessionario_variations = ["concessionário", "concessionario", "Concessionário", "Concessionaria", 
-                                        "CONCESSIONÁRIO", "CONCESSIONARIO", "CONC", "LOJA", "Conc", "Loja"]
-            found_concessionario_col = None
-            
-            # Imprimir todas as colunas para debug
-            print("Colunas disponíveis:", df.columns.tolist())
-            
-            for var in concessionario_variations:
-                if var in df.columns:
-                    found_concessionario_col = var
-                    break
-            
-            # Se encontrou uma variação, renomear para o padrão
-            if found_concessionario_col:
-                df.rename(columns={found_concessionario_col: NOME_COLUNA_CONCESSIONARIO}, inplace=True)
-                print(f"Coluna '{found_concessionario_col}' renomeada para '{NOME_COLUNA_CONCESSIONARIO}'")
-            else:
-                # Se não encontrou, criar a coluna
-                df[NOME_COLUNA_CONCESSIONARIO] = "N/A"
-                print(f"Coluna '{NOME_COLUNA_CONCESSIONARIO}' não encontrada. Criada com valor padrão 'N/A'")
-        
-        # Limpeza e conversão de tipos (com dayfirst=True)
-        df["Data emplacamento"] = pd.to_datetime(df["Data emplacamento"], errors="coerce", dayfirst=True)
-        df["CNPJ CLIENTE"] = df["CNPJ CLIENTE"].astype(str).str.strip()
-        df["NOME DO CLIENTE"] = df["NOME DO CLIENTE"].astype(str).str.strip()
-
-        # Processar colunas opcionais usando nomes globais
-        if NOME_COLUNA_ENDERECO in df.columns:
-            df[NOME_COLUNA_ENDERECO] = df[NOME_COLUNA_ENDERECO].astype(str).str.strip()
-        else:
-            df[NOME_COLUNA_ENDERECO] = "N/A"
+def load_dataset(file_path_or_buffer):
+    """Carrega os dados no registro compartilhado do processo e retorna a chave do dataset.
 
-        if NOME_COLUNA_TELEFONE in df.columns:
-            df[NOME_COLUNA_TELEFONE] = df[NOME_COLUNA_TELEFONE].astype(str).str.strip()
-        else:
-            df[NOME_COLUNA_TELEFONE] = "N/A"
-            
-        if NOME_COLUNA_CIDADE in df.columns:
-            df[NOME_COLUNA_CIDADE] = df[NOME_COLUNA_CIDADE].astype(str).str.strip()
-        else:
-            df[NOME_COLUNA_CIDADE] = "N/A"
-
-        # Garantir que as colunas para o detalhamento existam
-        if "Chassi" not in df.columns:
-            chassi_variations = ["CHASSI", "Chassi", "chassi", "CHASSIS", "Chassis", "chassis", "CHASSÍS", "Chassís"]
-            found_chassi_col = None
-            for var in chassi_variations:
-                if var in df.columns:
-                    found_chassi_col = var
-                    break
-            
-            if found_chassi_col:
-                df.rename(columns={found_chassi_col: "Chassi"}, inplace=True)
-            else:
-                df["Chassi"] = "N/A"
-        
-        df["Chassi"] = df["Chassi"].astype(str).str.strip()
-            
-        if "Modelo" not in df.columns:
-            modelo_variations = ["MODELO", "modelo", "Model", "model", "VEÍCULO", "Veículo", "veículo"]
-            found_modelo_col = None
-            for var in modelo_variations:
-                if var in df.columns:
-                    found_modelo_col = var
-                    break
-            
-            if found_modelo_col:
-                df.rename(columns={found_modelo_col: "Modelo"}, inplace=True)
-            else:
-                df["Modelo"] = "N/A"
-        
-        df["Modelo"] = df["Modelo"].astype(str).str.strip()
-            
-        # Garantir que a coluna concessionário tenha valores válidos
-        df[NOME_COLUNA_CONCESSIONARIO] = df[NOME_COLUNA_CONCESSIONARIO].astype(str).str.strip()
-        # Substituir valores vazios por N/A
-        df[NOME_COLUNA_CONCESSIONARIO] = df[NOME_COLUNA_CONCESSIONARIO].replace('', 'N/A')
-        df[NOME_COLUNA_CONCESSIONARIO] = df[NOME_COLUNA_CONCESSIONARIO].replace('nan', 'N/A')
-
-        df["CNPJ_NORMALIZED"] = df["CNPJ CLIENTE"].str.replace(r"[.\\/-]", "", regex=True)
-        df["Ano"] = df["Data emplacamento"].dt.year
-        df["Mes"] = df["Data emplacamento"].dt.month
-
-        # Remover linhas onde 'Ano' é NaN (resultante de datas inválidas)
-        df.dropna(subset=["Ano"], inplace=True)
-        if not df.empty:
-            df["Ano"] = df["Ano"].astype(int)
-
-        return df
-    except FileNotFoundError:
-        st.error(f"Erro: Arquivo Excel padrão não encontrado em {DEFAULT_EXCEL_FILE}. Faça o upload de um arquivo.")
-        return None
+    O Excel só é lido quando o conteúdo não está nem na memória do processo nem em snapshot.
+    """
+    try:
+        dataset = Dataset.open(file_path_or_buffer, compact=COMPACT_SCHEMA)
     except Exception as e:
-        file_info = "arquivo carregado" if isinstance(file_path_or_buffer, BytesIO) else os.path.basename(str(file_path_or_buffer))
-        st.error(f"Erro ao carregar ou processar o arquivo Excel ({file_info}): {e}")
+        show_load_error(e, file_path_or_buffer)
         return None
+    # Índices hash de CNPJ/placa/chassi montados junto com o carregamento (uma vez por versão)
+    dataset.exact_index
+    return dataset.key
+
+
+def restore_dataset(dataset_key):
+    """Garante que o dataset da chave esteja na memória (recuperando do snapshot se foi descartado)."""
+    return Dataset.restore(dataset_key) is not None
+
+# Uploads e extratos são processados em segundo plano (engine.jobs): enquanto isso a sessão
+# continua consultando a versão atual e só troca a chave do dataset quando o trabalho termina
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def show_job_progress(job_id):
+    """Progresso do trabalho; ao terminar, reexecuta o app inteiro para trocar a versão dos dados."""
+    job = JOBS.get(job_id)
+    if job is None or job.done:
+        st.rerun()
+    st.progress(job.progress, text=f"{job.description}: {job.label}... ({job.elapsed:.0f}s)")
+    st.caption("As consultas continuam usando os dados atuais até o carregamento terminar.")
 
 # --- Funções Auxiliares ---
-def get_modes(series):
-    cleaned_series = series.dropna().astype(str)
-    cleaned_series = cleaned_series[cleaned_series != "N/A"]
-    cleaned_series = cleaned_series[cleaned_series != "nan"]
-    cleaned_series = cleaned_series[cleaned_series != ""]
-    
-    if cleaned_series.empty:
-        return ["N/A"]
-    counts = Counter(cleaned_series)
-    if not counts:
-        return ["N/A"]
-    max_count = counts.most_common(1)[0][1]
-    modes = sorted([item for item, count in counts.items() if count == max_count])
-    return modes
-
 def format_list(items):
     if not items or items == ["N/A"]:
         return "N/A"
     return ", ".join(map(str, items))
 
-def calculate_next_purchase_prediction(valid_purchase_dates):
-    if not valid_purchase_dates or len(valid_purchase_dates) < 2:
-        return "Previsão não disponível (histórico insuficiente).", None
-
-    valid_purchase_dates.sort()
-    last_purchase_date = valid_purchase_dates[-1]
-    intervals_months = []
-    for i in range(1, len(valid_purchase_dates)):
-        delta = relativedelta(valid_purchase_dates[i], valid_purchase_dates[i-1])
-        months_diff = delta.years * 12 + delta.months
-        days_diff = delta.days
-        if months_diff > 0:
-            intervals_months.append(months_diff)
-        elif months_diff == 0 and days_diff > 0:
-             intervals_months.append(0.5)
-
-    if not intervals_months:
-         return "Previsão não disponível (compras muito próximas ou única).", last_purchase_date
-
-    avg_interval_months = sum(intervals_months) / len(intervals_months)
-    if avg_interval_months < 1:
-        avg_interval_months = 1
-
-    predicted_next_date = last_purchase_date + relativedelta(months=int(round(avg_interval_months)))
-
-    meses = ["Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho", "Julho", "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro"]
-    predicted_month_year = f"{meses[predicted_next_date.month - 1]} de {predicted_next_date.year}"
-    prediction_text = f"Próxima compra provável em: **{predicted_month_year}**"
-
-    return prediction_text, predicted_next_date
-
-def get_sales_pitch(last_purchase_date, predicted_next_date, total_purchases):
-    today = pd.Timestamp.now().normalize()
-    if not last_purchase_date:
-        return "Primeira vez? 🤔 Sem histórico de compras registrado para este cliente."
-
-    if not isinstance(last_purchase_date, pd.Timestamp):
-        last_purchase_date = pd.to_datetime(last_purchase_date)
-
-    months_since_last = relativedelta(today, last_purchase_date).years * 12 + relativedelta(today, last_purchase_date).months
-    last_purchase_str = last_purchase_date.strftime("%d/%m/%Y")
-
-    if predicted_next_date and isinstance(predicted_next_date, pd.Timestamp):
-        months_to_next = relativedelta(predicted_next_date, today).years * 12 + relativedelta(predicted_next_date, today).months
-        days_to_next = relativedelta(predicted_next_date, today).days
-        predicted_month_year = f"{["Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho", "Julho", "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro"][predicted_next_date.month - 1]} de {predicted_next_date.year}"
-
-        if months_to_next < 0 or (months_to_next == 0 and days_to_next < 0):
-            return f"🚨 **Atenção!** A compra prevista para **{predicted_month_year}** pode estar próxima ou já passou! Última compra em {last_purchase_str}. Contato urgente!"
-        elif months_to_next <= 2:
-            return f"📈 **Oportunidade Quente!** Próxima compra prevista para **{predicted_month_year}**. Ótimo momento para contato! Última compra em {last_purchase_str}."
-        elif months_to_next <= 6:
-            return f"🗓️ **Planeje-se!** Próxima compra prevista para **{predicted_month_year}**. Prepare sua abordagem! Última compra em {last_purchase_str}."
-        else:
-            return f"⏳ Compra prevista para **{predicted_month_year}**. Mantenha o relacionamento aquecido! Última compra em {last_purchase_str}."
-    else:
-        if months_since_last >= 18:
-            return f"🚨 Alerta de sumiço! Faz {months_since_last} meses desde a última compra ({last_purchase_str}). Hora de reativar esse cliente! 📞"
-        elif months_since_last >= 12:
-            return f"👀 E aí, sumido! Faz {months_since_last} meses desde a última compra ({last_purchase_str}). Que tal um alô para esse cliente?"
-        elif months_since_last >= 6:
-            return f"⏳ Já se passaram {months_since_last} meses... ({last_purchase_str}). Bom momento para um follow-up e mostrar as novidades!"
-        elif total_purchases > 3:
-             return f"👍 Cliente fiel ({total_purchases} compras)! Última compra em {last_purchase_str}. Mantenha o bom trabalho!"
-        else:
-            return f"✅ Compra recente ({last_purchase_str}). Ótimo para fortalecer o relacionamento!"
-
 # --- Interface Principal --- 
 
 # --- Cabeçalho ---
@@ -356,94 +221,157 @@ st.divider()
 st.sidebar.header("Atualizar Dados")
 uploaded_file = st.sidebar.file_uploader("Selecione o arquivo Excel (.xlsx)", type=["xlsx"], key="file_uploader")
 
-# Inicializar estado da sessão
-if "dataframe" not in st.session_state:
-    st.session_state["dataframe"] = None
+# Inicializar estado da sessão. A sessão guarda apenas a CHAVE do dataset; o DataFrame
+# fica no registro compartilhado do processo (uma única cópia para todas as sessões).
+if "session_id" not in st.session_state:
+    st.session_state["session_id"] = uuid.uuid4().hex
+METRICS.start_run(st.session_state["session_id"])
+if "dataset_key" not in st.session_state:
+    st.session_state["dataset_key"] = None
 if "data_source_info" not in st.session_state: # Armazena info sobre a fonte (nome do arquivo ou 'default')
     st.session_state["data_source_info"] = None
-if "uploaded_file_content" not in st.session_state: # Armazena o CONTEÚDO do arquivo carregado
-    st.session_state["uploaded_file_content"] = None
+
+if "load_job" not in st.session_state:  # Trabalho em segundo plano da sessão: {"id", "tipo"}
+    st.session_state["load_job"] = None
 
 needs_reload = False
 data_to_process = None
-current_source_info = None
+upload_to_process = None
+pending_job = st.session_state.get("load_job")
 
-# 1. Verificar se um NOVO arquivo foi carregado
+# 1. Verificar se um NOVO arquivo foi carregado (ele é lido em segundo plano)
 if uploaded_file is not None:
-    uploaded_content = BytesIO(uploaded_file.getvalue())
     uploaded_info = f"uploaded_{uploaded_file.name}_{uploaded_file.size}"
     
     # Se for diferente do que está na memória ou se não há nada na memória
     if uploaded_info != st.session_state.get("data_source_info"):
-        st.session_state["uploaded_file_content"] = uploaded_content # Guarda o conteúdo
         st.session_state["data_source_info"] = uploaded_info
-        data_to_process = st.session_state["uploaded_file_content"]
-        needs_reload = True
-        st.sidebar.success(f"Arquivo 	'{uploaded_file.name}'	 pronto para carregar.")
-    else:
-        # Mesmo arquivo, usar o conteúdo já guardado se precisar recarregar
-        data_to_process = st.session_state["uploaded_file_content"]
-        current_source_info = st.session_state["data_source_info"]
-        if st.session_state.get("dataframe") is None: # Se o dataframe não está carregado por algum motivo
-            needs_reload = True
+        upload_to_process = uploaded_file
+    elif pending_job is None and not restore_dataset(st.session_state.get("dataset_key")):
+        # Mesmo arquivo, mas o dataset não está mais disponível: recarregar do upload
+        upload_to_process = uploaded_file
 
 # 2. Se nenhum arquivo foi carregado, decidir qual usar
 else:
-    if st.session_state.get("uploaded_file_content") is not None:
-        # Usar o conteúdo carregado anteriormente
-        data_to_process = st.session_state["uploaded_file_content"]
-        current_source_info = st.session_state["data_source_info"]
-        if st.session_state.get("dataframe") is None:
-            needs_reload = True
-            st.sidebar.info("Usando arquivo carregado anteriormente.")
-        # else: # Já está carregado, não precisa fazer nada
-        #     pass 
-    elif os.path.exists(DEFAULT_EXCEL_FILE):
+    if pending_job is not None and pending_job["tipo"] == "upload":
+        # Upload removido antes de terminar de carregar: a troca de versão é cancelada
+        st.session_state["load_job"] = pending_job = None
+        st.session_state["data_source_info"] = None
+    source_info = st.session_state.get("data_source_info")
+    if source_info and source_info != "default" and restore_dataset(st.session_state.get("dataset_key")):
+        # Continuar usando o arquivo carregado anteriormente (já está no registro compartilhado)
+        pass
+    elif os.path.exists(DEFAULT_DATA_SOURCE):
         # Usar o arquivo padrão
-        data_to_process = DEFAULT_EXCEL_FILE
-        current_source_info = "default"
-        # Se estávamos usando um arquivo carregado, limpar o conteúdo da memória
-        if st.session_state.get("data_source_info") != "default":
-            st.session_state["uploaded_file_content"] = None
+        data_to_process = DEFAULT_DATA_SOURCE
+        if source_info != "default":
+            if source_info:
+                st.sidebar.info("O arquivo carregado anteriormente não está mais disponível.")
             st.session_state["data_source_info"] = "default"
             needs_reload = True # Precisa recarregar o default
-            st.sidebar.info(f"Usando arquivo padrão: {os.path.basename(DEFAULT_EXCEL_FILE)}")
-        elif st.session_state.get("dataframe") is None:
+            st.sidebar.info(f"Usando {DEFAULT_SOURCE_LABEL}")
+        elif not restore_dataset(st.session_state.get("dataset_key")):
              needs_reload = True # Carregar o default pela primeira vez
-             st.sidebar.info(f"Usando arquivo padrão: {os.path.basename(DEFAULT_EXCEL_FILE)}")
+             st.sidebar.info(f"Usando {DEFAULT_SOURCE_LABEL}")
     else:
         # Nenhum arquivo disponível
         st.error("Nenhum arquivo de dados disponível. Faça o upload de um arquivo Excel ou certifique-se que o arquivo padrão existe.")
         st.stop()
 
 # 3. Carregar os dados se necessário
-if needs_reload and data_to_process is not None:
-    # Rebobinar o BytesIO antes de ler novamente
-    if isinstance(data_to_process, BytesIO):
-        data_to_process.seek(0)
-    st.session_state["dataframe"] = load_data(data_to_process)
-    if st.session_state["dataframe"] is not None:
+if upload_to_process is not None:
+    job = submit_load(upload_to_process.getvalue(), f"Arquivo '{upload_to_process.name}'", compact=COMPACT_SCHEMA)
+    st.session_state["load_job"] = pending_job = {"id": job.id, "tipo": "upload"}
+elif needs_reload and data_to_process is not None:
+    dataset_key = load_dataset(data_to_process)
+    if dataset_key is not None:
+        st.session_state["dataset_key"] = dataset_key
         st.sidebar.success("Dados carregados/atualizados!")
         st.rerun() # Força o rerender para UI refletir a mudança
     else:
         st.sidebar.error("Falha ao carregar/atualizar dados.")
-        # Limpar estado se o carregamento falhar
-        st.session_state["dataframe"] = None
+        # A sessão mantém a versão anterior (se houver); a fonte é reavaliada no próximo rerun
         st.session_state["data_source_info"] = None
-        st.session_state["uploaded_file_content"] = None
 
-# Usar o dataframe do estado da sessão
-df_full = st.session_state.get("dataframe")
+# 4. Acrescentar um extrato (ex.: mensal) ao dataset atual, sem recarregar a base inteira
+st.sidebar.caption("Ou acrescente só as novidades do mês à base atual:")
+delta_file = st.sidebar.file_uploader("Acrescentar extrato mensal (.xlsx)", type=["xlsx"], key="delta_uploader")
+if delta_file is not None and st.session_state.get("dataset_key") and pending_job is None:
+    delta_info = f"{delta_file.name}_{delta_file.size}"
+    applied = st.session_state.get("delta_applied") or {}
+    if applied.get("file") != delta_info or applied.get("result") != st.session_state["dataset_key"]:
+        job = submit_append(
+            st.session_state["dataset_key"], delta_file.getvalue(), f"Extrato '{delta_file.name}'", compact=COMPACT_SCHEMA
+        )
+        st.session_state["delta_applied"] = {"file": delta_info, "result": None}
+        st.session_state["load_job"] = pending_job = {"id": job.id, "tipo": "extrato"}
+
+# 5. Acompanhar o trabalho em segundo plano e, quando terminar, trocar a versão dos dados
+if pending_job is not None:
+    job = JOBS.get(pending_job["id"])
+    if job is None or job.done:
+        st.session_state["load_job"] = None
+        if job is None:
+            # Resultado expirado antes de a sessão voltar: o arquivo é processado de novo
+            if pending_job["tipo"] == "upload":
+                st.session_state["data_source_info"] = None
+            st.session_state.pop("delta_applied", None)
+        elif job.failed:
+            # A sessão continua com a versão anterior dos dados
+            st.error(f"Erro ao carregar ou processar o arquivo Excel ({job.description}): {job.error}")
+            if job.kind == "extrato":
+                st.session_state["delta_applied"]["result"] = st.session_state["dataset_key"]
+                st.sidebar.error("Falha ao acrescentar o extrato.")
+            else:
+                st.sidebar.error("Falha ao carregar/atualizar dados.")
+        else:
+            # Troca atômica: a partir deste rerun a sessão consulta a nova versão
+            st.session_state["dataset_key"] = job.result["key"]
+            if job.kind == "extrato":
+                st.session_state["delta_applied"]["result"] = job.result["key"]
+                stats = job.result["stats"]
+                st.sidebar.success(
+                    f"{job.description}: {stats['acrescentadas']} emplacamentos novos acrescentados "
+                    f"({stats['duplicadas']} já existentes ignorados)."
+                )
+            else:
+                st.sidebar.success(f"Dados carregados/atualizados em {job.elapsed:.1f}s!")
+    else:
+        with st.sidebar:
+            show_job_progress(job.id)
+
+other_jobs = [job for job in JOBS.running() if pending_job is None or job.id != pending_job["id"]]
+if other_jobs:
+    st.sidebar.caption(
+        f"⏳ {len(other_jobs)} planilha(s) enviada(s) por outros usuários em processamento; "
+        "os dados atuais continuam disponíveis."
+    )
 
+# Usar o dataset compartilhado apontado pela sessão
+dataset_entry = DATASETS.acquire(st.session_state.get("dataset_key"), st.session_state["session_id"])
+df_full = dataset_entry.df if dataset_entry is not None else None
+dataset = Dataset(dataset_entry.key) if dataset_entry is not None else None
+
+if df_full is None and st.session_state.get("load_job") is not None:
+    st.info("Carregando os dados em segundo plano; o progresso aparece na barra lateral.")
+    st.stop()
 if df_full is None or df_full.empty:
     st.warning("Os dados não puderam ser carregados ou estão vazios. Verifique o arquivo ou a mensagem de erro acima.")
     st.stop()
 
 # --- Barra de Busca e Filtros --- 
-st.subheader("Buscar Cliente, Placa ou CNPJ")
-search_query = st.text_input("Digite o Nome, CNPJ ou Placa do cliente:", "", key="search_input")
+st.subheader("Buscar Cliente, Placa, CNPJ ou Chassi")
+search_query = st.text_input("Digite o Nome, CNPJ, Placa ou Chassi do cliente:", "", key="search_input")
 search_button = st.button("Buscar", key="search_button")
 
+# A busca continua ativa nos reruns seguintes (ex.: ao escolher outro cliente da lista)
+# enquanto o texto da caixa não mudar
+if search_button:
+    st.session_state["busca_ativa"] = search_query
+busca_ativa = st.session_state.get("busca_ativa")
+if busca_ativa != search_query:
+    busca_ativa = None
+
 st.sidebar.header("Filtros Gerais (Afetam Busca e Resumo)")
 all_brands = sorted(df_full["Marca"].dropna().unique())
 selected_brands = st.sidebar.multiselect("Filtrar por Marca:", all_brands)
@@ -451,74 +379,68 @@ selected_brands = st.sidebar.multiselect("Filtrar por Marca:", all_brands)
 all_segments = sorted(df_full["Segmento"].dropna().unique())
 selected_segments = st.sidebar.multiselect("Filtrar por Segmento:", all_segments)
 
-# Aplicar filtros ao DataFrame principal ANTES de qualquer cálculo
-df_display = df_full.copy()
-if selected_brands:
-    df_display = df_display[df_display["Marca"].isin(selected_brands)]
-if selected_segments:
-    df_display = df_display[df_display["Segmento"].isin(selected_segments)]
+# Os filtros são aplicados pelo Dataset com visões memorizadas por versão: busca, resumo e
+# listas de recompra consultam as linhas de cada combinação de filtros sem copiar a base
 
 # --- Exibição dos Resultados da Busca --- 
 st.divider()
 
-if search_button and search_query:
-    st.markdown(f"### Resultados da Busca por: '{search_query}'")
-    query_normalized = ''.join(filter(str.isdigit, str(search_query)))
-    
-    # **NOVO: Normalização da busca por placa**
-    query_placa_normalized = search_query.replace("-", "").replace(" ", "").upper()
-
-    mask = (
-        df_display["NOME DO CLIENTE"].str.contains(search_query, case=False, na=False)
-    )
-    if query_normalized and len(query_normalized) > 5:
-         mask = mask | df_display["CNPJ_NORMALIZED"].str.contains(query_normalized, case=False, na=False)
-    
-    # **NOVO: Adicionar busca por placa**
-    if query_placa_normalized:
-        mask = mask | df_display["PLACA_NORMALIZED"].str.contains(query_placa_normalized, case=False, na=False)
-
-    results_df = df_display[mask]
+if busca_ativa:
+    st.markdown(f"### Resultados da Busca por: '{busca_ativa}'")
+    # CNPJ/placa/chassi são respondidos pelos índices hash e de trigramas; nomes pelo índice
+    # ranqueado (sem acentos e tolerante a erros de digitação). Os filtros de Marca/Segmento
+    # valem para os clientes listados e para a contagem de emplacamentos
+    ranking = dataset.rank_clients(busca_ativa, selected_brands, selected_segments, limit=SEARCH_TOP_K)
 
-    if results_df.empty:
+    if ranking.empty:
         st.warning("Cliente ou placa não encontrado na base de dados (considerando os filtros aplicados, se houver).")
     else:
-        unique_cnpjs = results_df["CNPJ_NORMALIZED"].unique()
-
-        if len(unique_cnpjs) > 1:
-            st.info(f"Múltiplos clientes encontrados para \"{search_query}\". Exibindo o primeiro encontrado: {results_df.iloc[0]['NOME DO CLIENTE']} ({results_df.iloc[0]['CNPJ CLIENTE']}).")
-            target_cnpj_normalized = unique_cnpjs[0]
-        elif len(unique_cnpjs) == 1:
-            target_cnpj_normalized = unique_cnpjs[0]
+        if len(ranking) > 1:
+            st.info(f"{len(ranking)} clientes mais parecidos com \"{busca_ativa}\" (do mais ao menos parecido). Escolha o cliente abaixo.")
+            st.dataframe(
+                ranking.rename(columns={"Pontuacao": "Pontuação"}),
+                use_container_width=True,
+                hide_index=True,
+                column_config={"Pontuação": st.column_config.ProgressColumn("Pontuação", min_value=0, max_value=1, format="%.2f")},
+            )
+            target_cnpj_normalized = st.selectbox(
+                "Cliente:",
+                list(ranking.index),
+                format_func=lambda cnpj: (
+                    f"{ranking.at[cnpj, 'NOME DO CLIENTE']} ({ranking.at[cnpj, 'CNPJ CLIENTE']}) - "
+                    f"{ranking.at[cnpj, 'Emplacamentos']} emplacamentos"
+                ),
+                key="cliente_escolhido",
+            )
         else:
-             st.warning("Não foi possível identificar um CNPJ único para o cliente.")
-             st.stop()
+            target_cnpj_normalized = ranking.index[0]
 
-        client_df = results_df[results_df["CNPJ_NORMALIZED"] == target_cnpj_normalized].copy()
+        # Perfil do cliente: uma linha da tabela de perfis (calculada uma vez por versão do
+        # dataset e por combinação de filtros)
+        profile = dataset.client_profile(target_cnpj_normalized, selected_brands, selected_segments)
+        client_df = dataset.client_rows(target_cnpj_normalized, selected_brands, selected_segments)
 
-        if not client_df.empty:
-            client_df_sorted = client_df.sort_values(by="Data emplacamento", ascending=False)
-            latest_record = client_df_sorted.iloc[0]
+        if not client_df.empty and profile is not None:
             
-            client_name = latest_record["NOME DO CLIENTE"]
-            client_cnpj = latest_record["CNPJ CLIENTE"]
-            client_address = latest_record.get(NOME_COLUNA_ENDERECO, "N/A")
-            client_phone = latest_record.get(NOME_COLUNA_TELEFONE, "N/A")
-            client_city = latest_record.get(NOME_COLUNA_CIDADE, "N/A")
+            client_name = profile["NOME DO CLIENTE"]
+            client_cnpj = profile["CNPJ CLIENTE"]
+            client_address = profile.get(NOME_COLUNA_ENDERECO, "N/A")
+            client_phone = profile.get(NOME_COLUNA_TELEFONE, "N/A")
+            client_city = profile.get(NOME_COLUNA_CIDADE, "N/A")
             
-            # Calcular estatísticas para informações iniciais
-            total_plated = len(client_df_sorted)
-            first_plate_date = client_df_sorted["Data emplacamento"].min()
-            last_plate_date = client_df_sorted["Data emplacamento"].max()
+            # Estatísticas já calculadas no perfil
+            total_plated = int(profile["TotalCompras"])
+            first_plate_date = profile["PrimeiraCompra"]
+            last_plate_date = profile["UltimaCompra"]
             
             first_plate_date_str = first_plate_date.strftime("%d/%m/%Y") if pd.notna(first_plate_date) else "N/A"
             last_plate_date_str = last_plate_date.strftime("%d/%m/%Y") if pd.notna(last_plate_date) else "N/A"
             last_plate_date_obj = last_plate_date if pd.notna(last_plate_date) else None
             
-            # Obter preferências do cliente
-            preferred_models = get_modes(client_df["Modelo"])
-            preferred_brands = get_modes(client_df["Marca"])
-            preferred_concessionarias = get_modes(client_df[NOME_COLUNA_CONCESSIONARIO])
+            # Preferências do cliente
+            preferred_models = profile["ModelosPreferidos"]
+            preferred_brands = profile["MarcasPreferidas"]
+            preferred_concessionarias = profile["ConcessionariasPreferidas"]
             
             # Layout exatamente como na imagem de exemplo
             col_left, col_right = st.columns(2)
@@ -597,8 +519,8 @@ if search_button and search_query:
             
             st.markdown("#### Previsão e Insights")
             
-            valid_dates = client_df["Data emplacamento"].dropna().tolist()
-            prediction_text, predicted_date_obj = calculate_next_purchase_prediction(valid_dates)
+            prediction_text = profile["PrevisaoTexto"]
+            predicted_date_obj = profile["ProximaCompraPrevista"] if pd.notna(profile["ProximaCompraPrevista"]) else None
             sales_pitch = get_sales_pitch(last_plate_date_obj, predicted_date_obj, total_plated)
             
             col_pred, col_insight = st.columns(2)
@@ -608,17 +530,19 @@ if search_button and search_query:
                 st.success(f"💡 {sales_pitch}")
                 
             st.markdown("#### Histórico de Compras")
-            # Preparar dados para o gráfico
-            client_df['AnoMes'] = client_df['Data emplacamento'].dt.to_period('M')
-            purchase_history = client_df.groupby('AnoMes').size().reset_index(name='Quantidade')
-            purchase_history['AnoMes'] = purchase_history['AnoMes'].astype(str)
-
-            if not purchase_history.empty:
-                fig = px.bar(purchase_history, x='AnoMes', y='Quantidade', title=f'Histórico de Compras de {client_name}',
-                             labels={'AnoMes': 'Mês/Ano', 'Quantidade': 'Nº de Emplacamentos'},
-                             color_discrete_sequence=px.colors.qualitative.Pastel)
-                fig.update_layout(xaxis_title="Período", yaxis_title="Quantidade Emplacada")
-                st.plotly_chart(fig, use_container_width=True)
+            # Preparar dados para o gráfico (linha do cliente na matriz cliente × mês da versão do dataset)
+            historico_compras = dataset.purchase_history(target_cnpj_normalized, selected_brands, selected_segments)
+
+            if not historico_compras.empty:
+                # Importado só quando algum gráfico é exibido (o aquecimento já o deixa em memória)
+                import plotly.express as px
+
+                with timed("grafico"):
+                    fig = px.bar(historico_compras, x='AnoMes', y='Quantidade', title=f'Histórico de Compras de {client_name}',
+                                 labels={'AnoMes': 'Mês/Ano', 'Quantidade': 'Nº de Emplacamentos'},
+                                 color_discrete_sequence=px.colors.qualitative.Pastel)
+                    fig.update_layout(xaxis_title="Período", yaxis_title="Quantidade Emplacada")
+                    st.plotly_chart(fig, use_container_width=True)
             else:
                 st.warning("Não há histórico de compras suficiente para gerar gráfico.")
             
@@ -626,29 +550,52 @@ if search_button and search_query:
             st.markdown("#### Detalhamento dos Emplacamentos")
             
             # Preparar DataFrame para exibição incluindo a coluna PLACA
-            detail_df = client_df_sorted[["Data emplacamento", "PLACA", "Chassi", "Modelo", NOME_COLUNA_CONCESSIONARIO]].copy()
-            detail_df["Data emplacamento"] = detail_df["Data emplacamento"].dt.strftime("%d/%m/%Y")
-            detail_df.columns = ["Data", "Placa", "Chassi", "Modelo", "Concessionária"]
+            detail_df = plate_details(client_df)
             
             # Exibir tabela detalhada
             st.dataframe(detail_df, use_container_width=True)
+            st.download_button(
+                label="📥 Baixar Detalhamento (XLSX)",
+                data=lazy_export(
+                    ("detalhamento", dataset.key, filter_signature(selected_brands, selected_segments), target_cnpj_normalized),
+                    lambda: detail_df,
+                    "xlsx"
+                ),
+                file_name=export_file_name(f"emplacamentos_{target_cnpj_normalized}", "xlsx"),
+                mime=export_mime("xlsx")
+            )
+
+            # Prospecção: clientes cuja frota (participação de cada modelo e marca) mais se parece
+            # com a deste, por produto escalar na matriz esparsa de compras
+            st.markdown("#### Clientes com Frota Parecida")
+            similar_df = dataset.similar_clients(target_cnpj_normalized, selected_brands, selected_segments)
+            if not similar_df.empty:
+                st.dataframe(
+                    similar_df,
+                    use_container_width=True,
+                    hide_index=True,
+                    column_config={"Similaridade": st.column_config.ProgressColumn("Similaridade", min_value=0, max_value=1, format="%.2f")},
+                )
+            else:
+                st.info("Nenhum cliente com modelos ou marcas em comum (considerando os filtros aplicados).")
             
         else:
             st.warning("Cliente encontrado, mas sem registros de emplacamento válidos.")
-elif search_button and not search_query:
+elif search_button:
     st.warning("Por favor, digite um nome, CNPJ ou placa para buscar.")
 else:
     # Se nenhuma busca foi feita, exibir o resumo geral
     st.divider()
     st.subheader("Resumo Geral da Base de Dados (Considerando Filtros)")
 
-    # Calcular estatísticas gerais do df_display (DataFrame filtrado)
-    total_emplacamentos_display = len(df_display)
-    total_clientes_unicos_display = df_display["CNPJ_NORMALIZED"].nunique()
+    # Estatísticas gerais tiradas do cubo de contagens (montado uma vez por versão do dataset)
+    resumo = dataset.summary(selected_brands, selected_segments)
+    total_emplacamentos_display = resumo["total_emplacamentos"]
+    total_clientes_unicos_display = resumo["clientes_unicos"]
     
-    if not df_display.empty:
-        primeiro_ano_display = int(df_display["Ano"].min())
-        ultimo_ano_display = int(df_display["Ano"].max())
+    if resumo["primeiro_ano"] is not None:
+        primeiro_ano_display = resumo["primeiro_ano"]
+        ultimo_ano_display = resumo["ultimo_ano"]
     else:
         primeiro_ano_display = "N/A"
         ultimo_ano_display = "N/A"
@@ -662,20 +609,56 @@ else:
         st.metric(label="Período Coberto (Filtro)", value=f"{primeiro_ano_display} - {ultimo_ano_display}")
 
     st.markdown("#### Emplacamentos por Ano (Filtro)")
-    emplacamentos_por_ano_display = df_display['Ano'].value_counts().sort_index()
+    emplacamentos_por_ano_display = resumo["por_ano"]
     if not emplacamentos_por_ano_display.empty:
         st.bar_chart(emplacamentos_por_ano_display)
     else:
         st.info("Não há dados de emplacamento por ano para exibir com os filtros aplicados.")
 
     st.markdown("#### Emplacamentos por Marca e Ano (Filtro)")
-    emplacamentos_marca_ano_display = df_display.groupby(["Ano", "Marca"]).size().reset_index(name="Quantidade")
-    if not emplacamentos_marca_ano_display.empty:
-        pivot_marca_ano_display = emplacamentos_marca_ano_display.pivot(index="Marca", columns="Ano", values="Quantidade").fillna(0).astype(int)
+    pivot_marca_ano_display = resumo["marca_ano"]
+    if not pivot_marca_ano_display.empty:
         st.dataframe(pivot_marca_ano_display, use_container_width=True)
     else:
         st.info("Não há dados de emplacamento por marca e ano para exibir com os filtros aplicados.")
 
+    # Participação de mercado: ranking e série saem das somas móveis pré-calculadas do cubo
+    # de participação (montado uma vez por versão do dataset e estendido a cada extrato)
+    st.markdown("#### 📈 Participação de Mercado (Filtro)")
+    col_share1, col_share2, col_share3 = st.columns(3)
+    with col_share1:
+        dimensao_participacao = st.radio(
+            "Participação por:", list(MARKET_DIMENSIONS), format_func=lambda dim: MARKET_DIMENSIONS[dim][1],
+            horizontal=True, key="participacao_dimensao",
+        )
+    with col_share2:
+        janela_participacao = st.selectbox(
+            "Janela:", list(MARKET_WINDOW_LABELS), index=len(MARKET_WINDOW_LABELS) - 1,
+            format_func=MARKET_WINDOW_LABELS.get, key="participacao_janela",
+        )
+    with col_share3:
+        top_participacao = st.number_input("Quantidade no ranking:", min_value=3, max_value=30, value=10, step=1)
+    participacao = dataset.market_share(
+        dimensao_participacao, janela_participacao, selected_brands, selected_segments, top_n=int(top_participacao)
+    )
+    if participacao["total"] > 0:
+        st.caption(
+            f"{participacao['periodo']}: {participacao['total']:,} emplacamentos. ".replace(",", ".")
+            + "Variação em pontos percentuais contra a janela anterior do mesmo tamanho."
+        )
+        st.dataframe(
+            participacao["ranking"].rename(columns={
+                "Participacao": "Participação (%)", "ParticipacaoAnterior": "Anterior (%)", "Variacao": "Variação (p.p.)",
+            }),
+            use_container_width=True,
+            hide_index=True,
+            column_config={"Participação (%)": st.column_config.ProgressColumn("Participação (%)", min_value=0, max_value=100, format="%.2f")},
+        )
+        with timed("grafico"):
+            st.line_chart(participacao["serie"])
+    else:
+        st.info("Não há dados de emplacamento para calcular a participação com os filtros aplicados.")
+
 # --- Rodapé (Opcional) ---
 st.sidebar.divider()
 if os.path.exists(LOGO_WHITE_PATH):
@@ -689,58 +672,163 @@ st.sidebar.caption("© Comercial De Nigris")
 st.divider()
 st.subheader("📌 Oportunidades de Recompra")
 
-if st.button("🔍 Listar Clientes Inativos ( > 1 ano sem comprar )"):
-    hoje = pd.Timestamp.now()
-    ano_atual = hoje.year
-
-    # Última compra de cada cliente
-    ultima_compra = df_display.groupby("CNPJ_NORMALIZED")["Data emplacamento"].max().reset_index()
-    ultima_compra = ultima_compra.rename(columns={"Data emplacamento": "UltimaCompra"})
+st.markdown("#### 🔥 Oportunidades Quentes (Próxima Compra Prevista)")
+col_hot1, col_hot2 = st.columns(2)
+with col_hot1:
+    meses_a_frente = st.number_input("Compra prevista nos próximos (meses):", min_value=1, max_value=24, value=3, step=1)
+with col_hot2:
+    incluir_vencidas = st.checkbox("Incluir previsões já vencidas", value=False)
 
-    # Total de compras por cliente
-    total_compras = df_display.groupby("CNPJ_NORMALIZED").size().reset_index(name="TotalCompras")
-
-    # Juntar infos
-    clientes_info = pd.merge(ultima_compra, total_compras, on="CNPJ_NORMALIZED", how="left")
-
-    # Clientes que não compraram no ano atual e cuja última compra foi há mais de 12 meses
-    clientes_info = clientes_info[clientes_info["UltimaCompra"].notna()]
-    clientes_info["MesesSemCompra"] = ((hoje - clientes_info["UltimaCompra"]) / pd.Timedelta(days=30)).astype(int)
-    clientes_inativos = clientes_info[
-        (clientes_info["UltimaCompra"].dt.year < ano_atual) & 
-        (clientes_info["MesesSemCompra"] > 12)
-    ].copy()
+if st.button("🔥 Listar Oportunidades Quentes"):
+    oportunidades = dataset.hot_opportunities(
+        int(meses_a_frente), include_overdue=incluir_vencidas, brands=selected_brands, segments=selected_segments
+    )
 
-    if clientes_inativos.empty:
-        st.success("✅ Nenhum cliente inativo encontrado! Todos os clientes ativos compraram no último ano.")
+    if oportunidades.empty:
+        st.info(f"Nenhum cliente com compra prevista para os próximos {int(meses_a_frente)} meses.")
     else:
-        # Trazer dados adicionais (Nome, CNPJ e Cidade)
-        clientes_inativos = clientes_inativos.merge(
-            df_display[["CNPJ_NORMALIZED", "NOME DO CLIENTE", "CNPJ CLIENTE", NOME_COLUNA_CIDADE]].drop_duplicates(),
-            on="CNPJ_NORMALIZED",
-            how="left"
+        st.success(f"📈 {len(oportunidades)} clientes com compra prevista para os próximos {int(meses_a_frente)} meses!")
+        # Datas mantidas como datetime para a tabela ordenar corretamente ao clicar nas colunas
+        st.dataframe(
+            oportunidades,
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "UltimaCompra": st.column_config.DateColumn("UltimaCompra", format="DD/MM/YYYY"),
+                "ProximaCompraPrevista": st.column_config.DateColumn("ProximaCompraPrevista", format="MM/YYYY"),
+            }
+        )
+        st.download_button(
+            label="📥 Baixar Oportunidades Quentes (CSV)",
+            data=lazy_export(
+                ("oportunidades_quentes", dataset.key, filter_signature(selected_brands, selected_segments),
+                 int(meses_a_frente), incluir_vencidas, pd.Timestamp.now().date()),
+                lambda: oportunidades,
+                "csv"
+            ),
+            file_name=export_file_name("oportunidades_quentes", "csv"),
+            mime=export_mime("csv")
         )
 
-        clientes_inativos = clientes_inativos[[
-            "NOME DO CLIENTE", "CNPJ CLIENTE", NOME_COLUNA_CIDADE, "UltimaCompra", "TotalCompras", "MesesSemCompra"
-        ]].sort_values(by="MesesSemCompra", ascending=False)
+st.markdown("#### 💤 Clientes Inativos")
+col_inat1, col_inat2 = st.columns(2)
+with col_inat1:
+    meses_sem_compra_min = st.number_input("Mínimo de meses sem comprar:", min_value=1, max_value=600, value=13, step=1)
+with col_inat2:
+    meses_sem_compra_max = st.number_input("Máximo de meses sem comprar (0 = sem limite):", min_value=0, max_value=600, value=0, step=1)
 
-        clientes_inativos["UltimaCompra"] = clientes_inativos["UltimaCompra"].dt.strftime("%d/%m/%Y")
+# A lista continua aberta nos reruns seguintes para permitir a troca de página e de faixa
+if st.button("🔍 Listar Clientes Inativos"):
+    st.session_state["mostrar_inativos"] = True
 
-        st.warning(f"🚨 {len(clientes_inativos)} clientes estão há mais de 1 ano sem comprar!")
+if st.session_state.get("mostrar_inativos"):
+    hoje = pd.Timestamp.now()
 
-        st.dataframe(clientes_inativos, use_container_width=True)
+    # Índice de recência (um cliente por CNPJ, ordenado pela última compra) da versão do
+    # dataset e dos filtros atuais; a faixa de meses vira um intervalo contíguo do índice
+    recency_index = dataset.recency_index(selected_brands, selected_segments)
+    inicio_inativos, fim_inativos = recency_index.inactive_range(
+        int(meses_sem_compra_min), int(meses_sem_compra_max) or None, today=hoje
+    )
+    total_inativos = fim_inativos - inicio_inativos
 
+    if total_inativos == 0:
+        st.success("✅ Nenhum cliente inativo encontrado! Todos os clientes ativos compraram no último ano.")
+    else:
+        if meses_sem_compra_max:
+            faixa_inativos = f"entre {int(meses_sem_compra_min)} e {int(meses_sem_compra_max)} meses"
+        else:
+            faixa_inativos = f"há {int(meses_sem_compra_min)} meses ou mais"
+        st.warning(f"🚨 {total_inativos} clientes estão {faixa_inativos} sem comprar!")
+
+        # Só a página exibida é montada, mesmo para listas com dezenas de milhares de clientes
+        total_paginas = -(-total_inativos // INACTIVE_PAGE_SIZE)
+        pagina = 1
+        if total_paginas > 1:
+            pagina = int(st.number_input(f"Página (de {total_paginas}):", min_value=1, max_value=total_paginas, value=1, step=1))
+        inicio_pagina = inicio_inativos + (pagina - 1) * INACTIVE_PAGE_SIZE
+        fim_pagina = min(fim_inativos, inicio_pagina + INACTIVE_PAGE_SIZE)
+        st.caption(f"Exibindo {inicio_pagina - inicio_inativos + 1} a {fim_pagina - inicio_inativos} de {total_inativos} clientes.")
+
+        pagina_inativos = recency_index.rows(inicio_pagina, fim_pagina, today=hoje)
+        pagina_inativos["UltimaCompra"] = pagina_inativos["UltimaCompra"].dt.strftime("%d/%m/%Y")
+        st.dataframe(pagina_inativos, use_container_width=True, hide_index=True)
+
+        # Botão para download em XLSX (lista completa da faixa), gerado só quando pedido
+        def clientes_inativos_para_exportar():
+            clientes_inativos = recency_index.rows(inicio_inativos, fim_inativos, today=hoje)
+            clientes_inativos["UltimaCompra"] = clientes_inativos["UltimaCompra"].dt.strftime("%d/%m/%Y")
+            return clientes_inativos
 
+        st.download_button(
+            label="📥 Baixar Lista de Clientes Inativos (XLSX)",
+            data=lazy_export(
+                ("clientes_inativos", dataset.key, filter_signature(selected_brands, selected_segments),
+                 int(meses_sem_compra_min), int(meses_sem_compra_max), hoje.date()),
+                clientes_inativos_para_exportar,
+                "xlsx"
+            ),
+            file_name=export_file_name("clientes_inativos", "xlsx"),
+            mime=export_mime("xlsx")
+        )
 
+# --- Consulta em lote: perfis de uma lista de CNPJs, placas ou chassis ---
+st.divider()
+st.subheader("📋 Consulta em Lote (Lista de CNPJs ou Placas)")
+st.caption("Envie uma planilha (.xlsx) ou .csv com um CNPJ, placa ou chassi por linha (cabeçalho opcional: CNPJ, Placa, Chassi ou Identificador).")
+lista_lote = st.file_uploader("Lista de identificadores", type=["xlsx", "csv"], key="lote_uploader")
 
-        # Botão para download em XLSX
-        excel_buffer = BytesIO()
-        clientes_inativos.to_excel(excel_buffer, index=False, engine='openpyxl')
-        excel_buffer.seek(0)
+if lista_lote is not None:
+    # A lista inteira é resolvida de uma vez (índice de veículos e tabela de perfis dos filtros)
+    try:
+        identificadores = read_identifiers(BytesIO(lista_lote.getvalue()), lista_lote.name)
+    except Exception as e:
+        st.error(f"Não foi possível ler a lista: {e}")
+        identificadores = None
+
+    if identificadores is not None and identificadores.empty:
+        st.warning("A lista enviada não tem identificadores.")
+    elif identificadores is not None:
+        lote = dataset.enrich(identificadores, selected_brands, selected_segments)
+        encontrados = int((lote["Situacao"] == SITUACAO_ENCONTRADO).sum())
+        st.success(f"✅ {encontrados} de {len(lote)} identificadores encontrados (considerando os filtros aplicados, se houver).")
+        st.dataframe(
+            lote,
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "UltimaCompra": st.column_config.DateColumn("UltimaCompra", format="DD/MM/YYYY"),
+                "ProximaCompraPrevista": st.column_config.DateColumn("ProximaCompraPrevista", format="MM/YYYY"),
+            }
+        )
         st.download_button(
-            label="📥 Baixar Lista de Clientes Inativos (XLSX)",
-            data=excel_buffer,
-            file_name="clientes_inativos.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            label="📥 Baixar Consulta em Lote (XLSX)",
+            data=lazy_export(
+                ("consulta_lote", dataset.key, filter_signature(selected_brands, selected_segments),
+                 lista_lote.file_id, pd.Timestamp.now().date()),
+                lambda: lote,
+                "xlsx"
+            ),
+            file_name=export_file_name("consulta_lote", "xlsx"),
+            mime=export_mime("xlsx")
+        )
+
+# --- Métricas do rerun e painel de administração ---
+execucao = METRICS.finish_run()
+if execucao is not None and st.query_params.get("admin") == "1":
+    with st.sidebar.expander("⏱️ Desempenho (admin)", expanded=True):
+        memoria = f"{execucao['memoria_mb']:.0f} MB" if execucao["memoria_mb"] is not None else "N/A"
+        st.caption(f"Este rerun: {execucao['total_s'] * 1000:.0f} ms | memória do processo: {memoria}")
+        etapas = pd.DataFrame(
+            [(etapa, valores["s"] * 1000, valores["n"]) for etapa, valores in execucao["etapas"].items()],
+            columns=["Etapa", "ms", "Chamadas"],
         )
+        st.dataframe(etapas, hide_index=True, use_container_width=True)
+        if execucao["contadores"]:
+            st.caption(" | ".join(f"{nome}: {valor}" for nome, valor in execucao["contadores"].items()))
+        st.markdown("Percentis no processo (ms)")
+        percentis = pd.DataFrame.from_dict(execucao["percentis"], orient="index")
+        if not percentis.empty:
+            percentis[["p50", "p90", "p99"]] = percentis[["p50", "p90", "p99"]] * 1000
+        st.dataframe(percentis.round(1), use_container_width=True)
+        st.caption(f"Log: {METRICS_LOG_FILE}")
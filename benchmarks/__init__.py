@@ -0,0 +1 @@
+"""Benchmarks com dados sintéticos (ver benchmarks/run.py)."""
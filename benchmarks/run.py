@@ -0,0 +1,268 @@
+"""Benchmarks dos caminhos críticos do app sobre planilhas sintéticas.
+
+Uso (a partir da raiz do repositório):
+
+    python -m benchmarks.run --rows 10k 100k
+    python -m benchmarks.run --rows 10k 100k 1M 5M --excel-max-rows 100k
+    python -m benchmarks.run --rows 100k --baseline benchmarks/results/anterior.json
+
+Cada etapa é cronometrada isoladamente e, em uma segunda execução sob tracemalloc,
+tem o pico de memória (alocações Python/NumPy) medido. O resultado vai para um JSON
+em benchmarks/results/; com --baseline, etapas mais lentas que a tolerância são
+apontadas e o comando termina com código 1.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import generate_frame
+from engine.client_search import build_client_name_index
+from engine.cube import build_summary_cube
+from engine.enrichment import build_vehicle_index, classify_identifiers, enrichment_table
+from engine.export import write_xlsx
+from engine.loader import load_excel, normalize_columns, resolve_columns
+from engine.market_share import build_market_share_cube
+from engine.prediction import calculate_next_purchase_prediction, predict_next_purchases
+from engine.profiles import build_client_profiles
+from engine.purchase_matrix import build_purchase_matrix
+from engine.recency import build_recency_index
+from engine.search_index import build_exact_index, build_search_index, search_rows
+from engine.storage import StoredDataset, write_database
+
+RESULTS_DIR = os.path.join("benchmarks", "results")
+SIZE_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+# Identificadores da lista da consulta em lote (metade CNPJs, metade placas)
+BULK_IDENTIFIERS = 1_000
+# Limite de linhas de uma aba do Excel
+EXCEL_MAX_ROWS = 1_048_575
+QUERY_REPEATS = 20
+SCALAR_PREDICTION_CLIENTS = 2_000
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    if text[-1] in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+    return int(text)
+
+
+def measure(stage, fn, track_memory=True):
+    """Executa `fn` uma vez cronometrada e, se pedido, outra sob tracemalloc para o pico de memória."""
+    started = time.perf_counter()
+    result = fn()
+    record = {"etapa": stage, "segundos": time.perf_counter() - started}
+    if track_memory:
+        tracemalloc.start()
+        fn()
+        record["pico_memoria_mb"] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+    return result, record
+
+
+def measure_queries(stage, queries, fn):
+    """Mediana do tempo por consulta (cada consulta repetida QUERY_REPEATS vezes)."""
+    timings = []
+    for query in queries:
+        for _ in range(QUERY_REPEATS):
+            started = time.perf_counter()
+            fn(query)
+            timings.append(time.perf_counter() - started)
+    return {"etapa": stage, "segundos": statistics.median(timings), "consultas": len(timings)}
+
+
+def raw_columns(frame):
+    """Colunas brutas no formato de `read_columns`, sem passar pelo Excel."""
+    resolved = resolve_columns(list(frame.columns))
+    return {col: frame.iloc[:, position].tolist() for col, position in resolved.items()}
+
+
+def run_size(n_rows, args):
+    print(f"--- {n_rows:,} linhas ---")
+    records = []
+    track = not args.no_memory
+    frame = generate_frame(n_rows, seed=args.seed, header_variant=args.header_variant)
+
+    if n_rows <= min(args.excel_max_rows, EXCEL_MAX_ROWS):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "emplacamentos.xlsx")
+            write_xlsx(frame, path)
+            _, record = measure("carga_excel", lambda: load_excel(path), track)
+            records.append(record)
+
+    df, record = measure("normalizacao", lambda: normalize_columns(raw_columns(frame)), track)
+    records.append(record)
+    frame = None
+
+    exact_index, record = measure("indice_exato", lambda: build_exact_index(df), track)
+    records.append(record)
+    search_index, record = measure("indice_busca", lambda: build_search_index(df), track)
+    records.append(record)
+
+    rng = np.random.default_rng(args.seed)
+    sample = df.iloc[rng.choice(len(df), size=min(10, len(df)), replace=False)]
+    query_sets = {
+        "busca_nome": [name.split()[0] + " " + name.split()[1][:3] for name in sample["NOME DO CLIENTE"]],
+        "busca_cnpj_completo": list(sample["CNPJ_NORMALIZED"]),
+        "busca_cnpj_parcial": [cnpj[:8] for cnpj in sample["CNPJ_NORMALIZED"]],
+        "busca_placa": list(sample["PLACA"]),
+    }
+    for stage, queries in query_sets.items():
+        records.append(measure_queries(stage, queries, lambda q: search_rows(q, exact_index, search_index)))
+
+    name_index, record = measure("indice_nomes", lambda: build_client_name_index(df), track)
+    records.append(record)
+    # Nomes com uma letra trocada, para exercitar a tolerância a erros de digitação
+    typo_queries = [query[:2] + query[3] + query[2] + query[4:] for query in query_sets["busca_nome"]]
+    records.append(measure_queries("busca_nome_ranqueada", query_sets["busca_nome"] + typo_queries, name_index.rank))
+
+    cube, record = measure("cubo_resumo", lambda: build_summary_cube(df), track)
+    records.append(record)
+    brand = df["Marca"].value_counts().index[0]
+    records.append(measure_queries("resumo_sem_filtro", [None], lambda _: cube.summary([], [])))
+    records.append(measure_queries("resumo_com_filtro", [brand], lambda b: cube.summary([b], [])))
+
+    clients = df["CNPJ_NORMALIZED"].drop_duplicates()
+    clients = clients.sample(min(SCALAR_PREDICTION_CLIENTS, len(clients)), random_state=args.seed)
+    dates_by_client = df[df["CNPJ_NORMALIZED"].isin(clients)].groupby("CNPJ_NORMALIZED")["Data emplacamento"].agg(list)
+    _, record = measure(
+        "previsao_escalar", lambda: [calculate_next_purchase_prediction(dates) for dates in dates_by_client], track
+    )
+    record["clientes"] = len(dates_by_client)
+    records.append(record)
+    _, record = measure("previsao_vetorizada", lambda: predict_next_purchases(df), track)
+    records.append(record)
+
+    profiles, record = measure("perfis_clientes", lambda: build_client_profiles(df), track)
+    records.append(record)
+    recency, record = measure("indice_recencia", lambda: build_recency_index(profiles), track)
+    records.append(record)
+
+    def inactive_first_page():
+        start, stop = recency.inactive_range(13)
+        return recency.rows(start, min(stop, start + 100))
+
+    records.append(measure_queries("inativos_pagina", [None], lambda _: inactive_first_page()))
+
+    matrix, record = measure("matriz_compras", lambda: build_purchase_matrix(df), track)
+    records.append(record)
+    records.append(measure_queries("historico_cliente", list(sample["CNPJ_NORMALIZED"]), matrix.history))
+    records.append(measure_queries("clientes_semelhantes", list(sample["CNPJ_NORMALIZED"]), matrix.similar))
+
+    market, record = measure("cubo_participacao", lambda: build_market_share_cube(df), track)
+    records.append(record)
+    records.append(measure_queries(
+        "participacao", [(dim, window) for dim in ("concessionaria", "cidade") for window in (1, 3, 12)],
+        lambda query: market.market_share(*query, brands=[brand]),
+    ))
+
+    vehicles, record = measure("indice_veiculos", lambda: build_vehicle_index(df), track)
+    records.append(record)
+    listed = df.iloc[rng.choice(len(df), size=min(BULK_IDENTIFIERS, len(df)), replace=False)]
+    bulk = list(listed["CNPJ CLIENTE"].iloc[::2]) + list(listed["PLACA"].iloc[1::2])
+
+    def enrich(identifiers):
+        classified = classify_identifiers(identifiers)
+        return enrichment_table(classified, vehicles.owners(classified), profiles)
+
+    records.append(measure_queries("consulta_lote", [bulk], enrich))
+
+    # Mesmas consultas no armazenamento SQLite (resolvidas no banco)
+    with tempfile.TemporaryDirectory() as tmp:
+        _, record = measure("banco_sqlite", lambda: write_database("benchmark", df, tmp), track)
+        records.append(record)
+        stored = StoredDataset("benchmark", tmp)
+        records.append(measure_queries("sqlite_busca_nome", query_sets["busca_nome"], stored.search))
+        records.append(measure_queries("sqlite_busca_cnpj", query_sets["busca_cnpj_completo"], stored.search))
+        records.append(measure_queries("sqlite_resumo", [brand], lambda b: stored.summary([b], [])))
+        records.append(measure_queries("sqlite_inativos_pagina", [None], lambda _: stored.inactive_clients(13, limit=100)))
+        records.append(measure_queries("sqlite_consulta_lote", [bulk], stored.enrich))
+
+    for record in records:
+        record["linhas"] = n_rows
+        memory = f" | pico {record['pico_memoria_mb']:.1f} MB" if "pico_memoria_mb" in record else ""
+        print(f"{record['etapa']:<22} {record['segundos'] * 1000:>10.3f} ms{memory}")
+    return records
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit or None,
+        "python": sys.version.split()[0],
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "plataforma": platform.platform(),
+    }
+
+
+def compare(records, baseline_path, tolerance):
+    """Etapas mais lentas que `tolerance` vezes o tempo da execução de referência."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["linhas"], r["etapa"]): r["segundos"] for r in json.load(f)["resultados"]}
+    regressions = []
+    for record in records:
+        previous = baseline.get((record["linhas"], record["etapa"]))
+        if previous and record["segundos"] > previous * tolerance:
+            regressions.append((record["linhas"], record["etapa"], previous, record["segundos"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks do app de emplacamentos com dados sintéticos.")
+    parser.add_argument("--rows", nargs="+", default=["10k", "100k"], help="tamanhos (ex.: 10k 100k 1M 5M)")
+    parser.add_argument("--excel-max-rows", default="100k", help="maior tamanho em que a carga do .xlsx é medida")
+    parser.add_argument("--header-variant", default="padrao", choices=["padrao", "alternativo"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="não medir o pico de memória (mais rápido)")
+    parser.add_argument("--output", help="arquivo JSON de saída (padrão: benchmarks/results/<data>.json)")
+    parser.add_argument("--baseline", help="JSON de uma execução anterior para comparar")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="razão de tempo considerada regressão")
+    args = parser.parse_args(argv)
+    args.excel_max_rows = parse_size(args.excel_max_rows)
+
+    records = []
+    peak_rss_mb = {}
+    for size in args.rows:
+        n_rows = parse_size(size)
+        records.extend(run_size(n_rows, args))
+        if resource is not None:
+            # ru_maxrss é o pico do processo até aqui (KB no Linux)
+            peak_rss_mb[n_rows] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"ambiente": environment(), "pico_rss_mb": peak_rss_mb, "resultados": records}, f, indent=2)
+    print(f"Resultados gravados em {output}")
+
+    if args.baseline:
+        regressions = compare(records, args.baseline, args.tolerance)
+        for n_rows, stage, previous, current in regressions:
+            print(f"REGRESSÃO {stage} ({n_rows:,} linhas): {previous * 1000:.2f} ms -> {current * 1000:.2f} ms")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""Gerador de planilhas de emplacamento sintéticas para os benchmarks.
+
+Os dados imitam a base real: CNPJs válidos (com e sem pontuação), placas antigas e
+Mercosul, chassis no formato VIN com o WMI de cada marca, distribuições
+concentradas (poucos clientes, marcas e concessionárias respondem pela maior parte
+dos emplacamentos) e variações nos nomes das colunas do cabeçalho.
+"""
+import numpy as np
+import pandas as pd
+
+# Marca -> (peso, WMI do chassi, [(modelo, segmento), ...])
+BRANDS = {
+    "VW": (0.30, "9BW", [("DELIVERY 11.180", "SEMIPESADOS"), ("CONSTELLATION 24.280", "PESADOS"),
+                         ("METEOR 28.460", "EXTRAPESADOS"), ("DELIVERY EXPRESS", "LEVES")]),
+    "MERCEDES-BENZ": (0.24, "9BM", [("ACCELO 1017", "MEDIOS"), ("ATEGO 2426", "SEMIPESADOS"),
+                                    ("ACTROS 2651", "EXTRAPESADOS"), ("AXOR 3344", "PESADOS")]),
+    "SCANIA": (0.14, "9BS", [("R 450", "EXTRAPESADOS"), ("P 320", "PESADOS"), ("G 410", "EXTRAPESADOS")]),
+    "VOLVO": (0.12, "93K", [("FH 540", "EXTRAPESADOS"), ("VM 270", "SEMIPESADOS"), ("FM 380", "PESADOS")]),
+    "IVECO": (0.08, "93Z", [("DAILY 35-160", "LEVES"), ("TECTOR 240E28", "SEMIPESADOS"), ("S-WAY 480", "EXTRAPESADOS")]),
+    "DAF": (0.07, "98P", [("XF 530", "EXTRAPESADOS"), ("CF 410", "PESADOS")]),
+    "HYUNDAI": (0.03, "95P", [("HR 2.5", "LEVES")]),
+    "JAC": (0.02, "LJ1", [("IEV1200T", "LEVES")]),
+}
+DEALERS = ["DE NIGRIS", "RODOBENS", "SUPERVIA", "DIVESA", "TREVISO", "ITAVEMA", "CAMINHOES SUL", "BRASCAM",
+           "VOLVO CENTRAL", "SCANIA NORTE", "AUTOSTAR", "GRUPO VIX", "CARBUS", "TRANSDIESEL", "RIVEL"]
+CITIES = ["SAO PAULO", "GUARULHOS", "CAMPINAS", "SANTO ANDRÉ", "SÃO BERNARDO DO CAMPO", "OSASCO", "SOROCABA",
+          "RIBEIRÃO PRETO", "JUNDIAÍ", "SÃO JOSÉ DOS CAMPOS", "CURITIBA", "BELO HORIZONTE", "RIO DE JANEIRO",
+          "GOIÂNIA", "CUIABÁ", "CAMPO GRANDE", "PORTO ALEGRE", "UBERLÂNDIA", "LONDRINA", "MARINGÁ"]
+NAME_WORDS = ["TRANSPORTES", "LOGISTICA", "RODOVIARIO", "EXPRESSO", "COMERCIO", "DISTRIBUIDORA", "AGRO",
+              "CARGAS", "CONSTRUTORA", "ALIMENTOS", "MINERACAO", "SÃO JOÃO", "IRMÃOS", "BRASIL", "PAULISTA",
+              "NORDESTE", "TRANSLOG", "ROTA", "ESTRELA", "AGUIA", "CONDOR", "TRIUNFO", "UNIÃO", "ALIANÇA"]
+NAME_SUFFIXES = ["LTDA", "LTDA", "LTDA", "S.A.", "EIRELI", "ME", "S/A"]
+STREET_TYPES = ["RUA", "AVENIDA", "RODOVIA", "ESTRADA", "ALAMEDA"]
+
+# Nomes de cabeçalho: o da planilha real e variações aceitas pelo carregador
+HEADER_VARIANTS = {
+    "padrao": {},
+    "alternativo": {"Concessionário": "LOJA", "PLACA": "Placa Veículo", "Chassi": "CHASSI", "Modelo": "MODELO"},
+}
+VIN_CHARS = np.frombuffer(b"ABCDEFGHJKLMNPRSTUVWXYZ0123456789", dtype=np.uint8)
+LETTERS = np.frombuffer(b"ABCDEFGHIJKLMNOPQRSTUVWXYZ", dtype=np.uint8)
+DIGITS = np.frombuffer(b"0123456789", dtype=np.uint8)
+
+CNPJ_WEIGHTS_1 = np.array([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+CNPJ_WEIGHTS_2 = np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+
+
+def zipf_weights(n, exponent=1.1):
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def _ascii_strings(codes):
+    """Converte uma matriz (n, k) de códigos ASCII em textos de k caracteres."""
+    codes = np.ascontiguousarray(codes, dtype=np.uint8)
+    return codes.view(f"S{codes.shape[1]}").ravel().astype(str)
+
+
+def _cnpj_check_digit(digits, weights):
+    remainder = (digits * weights).sum(axis=1) % 11
+    return np.where(remainder < 2, 0, 11 - remainder)
+
+
+def generate_cnpjs(rng, n):
+    """CNPJs válidos (14 dígitos, com dígitos verificadores), todos da matriz (0001)."""
+    digits = np.empty((n, 14), dtype=np.int64)
+    digits[:, :8] = rng.integers(0, 10, size=(n, 8))
+    digits[:, 8:12] = [0, 0, 0, 1]
+    digits[:, 12] = _cnpj_check_digit(digits[:, :12], CNPJ_WEIGHTS_1)
+    digits[:, 13] = _cnpj_check_digit(digits[:, :13], CNPJ_WEIGHTS_2)
+    return _ascii_strings(digits + ord("0"))
+
+
+def format_cnpjs(cnpjs):
+    cnpjs = pd.Series(cnpjs)
+    return cnpjs.str[:2] + "." + cnpjs.str[2:5] + "." + cnpjs.str[5:8] + "/" + cnpjs.str[8:12] + "-" + cnpjs.str[12:]
+
+
+def generate_plates(rng, n, mercosul_share=0.6):
+    """Placas Mercosul (ABC1D23) e antigas (ABC-1234)."""
+    codes = np.empty((n, 7), dtype=np.uint8)
+    codes[:, :3] = rng.choice(LETTERS, size=(n, 3))
+    codes[:, 3] = rng.choice(DIGITS, size=n)
+    codes[:, 4] = np.where(rng.random(n) < mercosul_share, rng.choice(LETTERS, size=n), rng.choice(DIGITS, size=n))
+    codes[:, 5:] = rng.choice(DIGITS, size=(n, 2))
+    plates = pd.Series(_ascii_strings(codes))
+    old_format = plates.str[4].str.isdigit()
+    plates[old_format] = plates[old_format].str[:3] + "-" + plates[old_format].str[3:]
+    return plates
+
+
+def generate_vins(rng, wmis):
+    """Chassis de 17 caracteres (sem I, O e Q) começando pelo WMI da marca."""
+    n = len(wmis)
+    codes = np.empty((n, 17), dtype=np.uint8)
+    codes[:, :3] = np.frombuffer("".join(wmis).encode(), dtype=np.uint8).reshape(n, 3)
+    codes[:, 3:] = rng.choice(VIN_CHARS, size=(n, 14))
+    return _ascii_strings(codes)
+
+
+def generate_clients(rng, n_clients):
+    words = np.array(NAME_WORDS, dtype=object)
+    names = (
+        pd.Series(rng.choice(words, n_clients)) + " " + pd.Series(rng.choice(words, n_clients)) + " "
+        + pd.Series(rng.choice(np.array(NAME_SUFFIXES, dtype=object), n_clients))
+    )
+    cnpjs = generate_cnpjs(rng, n_clients)
+    numbers = pd.Series(rng.integers(1, 5000, n_clients)).astype(str)
+    streets = pd.Series(rng.choice(np.array(STREET_TYPES, dtype=object), n_clients)) + " " + pd.Series(rng.choice(words, n_clients))
+    return pd.DataFrame({
+        "nome": names.to_numpy(),
+        "cnpj": cnpjs,
+        "endereco": (streets + ", " + numbers).to_numpy(),
+        "cidade": rng.choice(np.array(CITIES, dtype=object), n_clients, p=zipf_weights(len(CITIES), 0.9)),
+        "cep": pd.Series(rng.integers(1_000_000, 99_999_999, n_clients)).astype(str).str.zfill(8).to_numpy(),
+        "ddd": rng.integers(11, 99, n_clients),
+        "telefone": pd.Series(rng.integers(30_000_000, 999_999_999, n_clients)).astype(str).to_numpy(),
+    })
+
+
+def generate_frame(n_rows, seed=0, header_variant="padrao", start="2019-01-01", end="2026-06-30"):
+    """DataFrame com as colunas da planilha de emplacamentos, como viria do Excel.
+
+    Cerca de 1 cliente para cada 6 emplacamentos, com concentração (Zipf) nos maiores
+    clientes; 30% dos CNPJs vêm formatados e 0,5% das datas vêm como serial do Excel.
+    """
+    rng = np.random.default_rng(seed)
+    clients = generate_clients(rng, max(1, n_rows // 6))
+    client_of_row = rng.choice(len(clients), n_rows, p=zipf_weights(len(clients)))
+    rows = clients.iloc[client_of_row].reset_index(drop=True)
+
+    brand_names = list(BRANDS)
+    brand_of_row = rng.choice(len(brand_names), n_rows, p=np.array([BRANDS[b][0] for b in brand_names]))
+    model_choice = rng.random(n_rows)
+    models = np.empty(n_rows, dtype=object)
+    segments = np.empty(n_rows, dtype=object)
+    wmis = np.empty(n_rows, dtype=object)
+    for i, brand in enumerate(brand_names):
+        in_brand = brand_of_row == i
+        catalog = BRANDS[brand][2]
+        picked = (model_choice[in_brand] * len(catalog)).astype(int)
+        models[in_brand] = np.array([model for model, _ in catalog], dtype=object)[picked]
+        segments[in_brand] = np.array([segment for _, segment in catalog], dtype=object)[picked]
+        wmis[in_brand] = BRANDS[brand][1]
+
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    # Mais emplacamentos nos anos recentes (a base cresce com o tempo)
+    offsets = (np.sqrt(rng.random(n_rows)) * (end - start).days).astype(int)
+    dates = start + pd.to_timedelta(offsets, unit="D")
+    date_cells = pd.Series(dates.strftime("%d/%m/%Y"), dtype=object)
+    serial = rng.random(n_rows) < 0.005
+    date_cells[serial] = (dates[serial] - pd.Timestamp("1899-12-30")).days
+
+    cnpjs = pd.Series(rows["cnpj"].to_numpy())
+    formatted = rng.random(n_rows) < 0.3
+    cnpjs[formatted] = format_cnpjs(cnpjs[formatted]).to_numpy()
+
+    frame = pd.DataFrame({
+        "Chassi": generate_vins(rng, wmis),
+        "Data emplacamento": date_cells,
+        "Modelo": models,
+        "Marca": np.array(brand_names, dtype=object)[brand_of_row],
+        "Segmento": segments,
+        "Concessionário": rng.choice(np.array(DEALERS, dtype=object), n_rows, p=zipf_weights(len(DEALERS))),
+        "CNPJ CLIENTE": cnpjs.to_numpy(),
+        "NOME DO CLIENTE": rows["nome"].to_numpy(),
+        "ENDEREÇO COMPLETO": rows["endereco"].to_numpy(),
+        "NO_CIDADE": rows["cidade"].to_numpy(),
+        "NU_CEP": rows["cep"].to_numpy(),
+        "DDD1": rows["ddd"].to_numpy(),
+        "TELEFONE1": rows["telefone"].to_numpy(),
+        "PLACA": generate_plates(rng, n_rows).to_numpy(),
+    })
+    return frame.rename(columns=HEADER_VARIANTS[header_variant])
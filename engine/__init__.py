@@ -0,0 +1,5 @@
+"""Camada de dados do app de emplacamentos (independente do Streamlit).
+
+`engine.dataset.Dataset` é a API de consultas usada pelo app e pela linha de
+comando (`python -m engine`, ver engine/cli.py).
+"""
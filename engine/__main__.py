@@ -0,0 +1,6 @@
+"""Permite rodar `python -m engine ...` (ver engine/cli.py)."""
+import sys
+
+from engine.cli import main
+
+sys.exit(main())
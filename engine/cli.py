@@ -0,0 +1,196 @@
+"""Linha de comando do motor de consultas (sem Streamlit).
+
+Exemplos (a partir da raiz do repositório):
+
+    python -m engine resumo "data/EMPLACAMENTO ANUAL - CAMINHÕES.xlsx"
+    python -m engine buscar data/base.xlsx "TRANSPORTES SILVA" --marca VW
+    python -m engine cliente data/base.xlsx 12.345.678/0001-90
+    python -m engine semelhantes data/base.xlsx 12.345.678/0001-90 --limite 20
+    python -m engine participacao data/base.xlsx --dimensao cidade --janela 3 --ate 2024-12
+    python -m engine lote data/base.xlsx prospects.xlsx --saida prospects_perfis.xlsx
+    python -m engine oportunidades data/base.xlsx --meses 6 --saida quentes.csv
+    python -m engine inativos data/base.xlsx --min-meses 12 --max-meses 24 --saida inativos.xlsx
+    python -m engine perfis data/base.xlsx --extrato data/extrato_mes.xlsx --saida perfis.parquet
+    python -m engine resumo data/anos/   # todas as planilhas da pasta, lidas em paralelo
+    python -m engine inativos data/base.xlsx --armazenamento sqlite   # consultas no banco SQLite
+
+Com --saida, o relatório é gravado no formato indicado pela extensão (.csv, .xlsx
+ou .parquet); sem ela, as primeiras linhas são impressas na tela.
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+from engine.dataset import Dataset
+from engine.enrichment import SITUACAO_ENCONTRADO, read_identifiers
+from engine.export import EXPORT_FORMATS, export_frame
+from engine.market_share import DIMENSIONS as MARKET_DIMENSIONS, ROLLING_WINDOWS
+from engine.storage import StoredDataset
+
+
+def print_frame(df, limit):
+    if df.empty:
+        print("(nenhum registro)")
+        return
+    with pd.option_context("display.max_columns", None, "display.width", 200):
+        print(df.head(limit).to_string())
+    if len(df) > limit:
+        print(f"... {len(df) - limit} linhas omitidas (use --limite ou --saida)")
+
+
+def write_output(df, path):
+    fmt = os.path.splitext(path)[1].lstrip(".").lower()
+    if fmt not in EXPORT_FORMATS:
+        raise SystemExit(f"Extensão de saída não suportada: {path} (use .csv, .xlsx ou .parquet)")
+    with open(path, "wb") as f:
+        f.write(export_frame(df, fmt))
+    print(f"{len(df)} linhas gravadas em {path}")
+
+
+def emit(df, args):
+    if args.saida:
+        write_output(df, args.saida)
+    else:
+        print_frame(df, args.limite)
+
+
+def open_dataset(args):
+    started = time.perf_counter()
+    if args.armazenamento == "sqlite" and not args.extrato:
+        dataset = StoredDataset.open(args.arquivo, use_snapshot=not args.sem_snapshot)
+    else:
+        dataset = Dataset.open(args.arquivo, use_snapshot=not args.sem_snapshot)
+        for extrato in args.extrato or []:
+            dataset, stats = dataset.append_file(extrato)
+            print(f"Extrato {extrato}: {stats['acrescentadas']} acrescentados, {stats['duplicadas']} já existentes")
+        if args.armazenamento == "sqlite":
+            dataset = StoredDataset.from_dataset(dataset)
+    print(f"Dataset {dataset.key}: {len(dataset)} emplacamentos ({time.perf_counter() - started:.2f}s)")
+    return dataset
+
+
+def cmd_resumo(dataset, args):
+    resumo = dataset.summary(args.marca, args.segmento)
+    print(f"Total de emplacamentos: {resumo['total_emplacamentos']}")
+    print(f"Clientes únicos: {resumo['clientes_unicos']}")
+    print(f"Período coberto: {resumo['primeiro_ano']} - {resumo['ultimo_ano']}")
+    print("\nEmplacamentos por ano:")
+    print_frame(resumo["por_ano"].to_frame("Quantidade"), args.limite)
+    print("\nEmplacamentos por marca e ano:")
+    emit(resumo["marca_ano"].reset_index(), args)
+
+
+def cmd_buscar(dataset, args):
+    emit(dataset.rank_clients(args.consulta, args.marca, args.segmento, limit=args.limite).reset_index(), args)
+
+
+def cmd_cliente(dataset, args):
+    report = dataset.client_report(args.cnpj, args.marca, args.segmento)
+    if report is None:
+        raise SystemExit(f"Cliente {args.cnpj} não encontrado (considerando os filtros).")
+    profile = report["perfil"]
+    for label, value in profile.items():
+        if isinstance(value, list):
+            value = ", ".join(value)
+        elif isinstance(value, pd.Timestamp):
+            value = value.strftime("%d/%m/%Y")
+        print(f"{label}: {value}")
+    print(f"Argumento de venda: {report['argumento']}")
+    print("\nHistórico mensal:")
+    print_frame(report["historico"], args.limite)
+    print("\nDetalhamento dos emplacamentos:")
+    emit(report["detalhamento"], args)
+
+
+def cmd_semelhantes(dataset, args):
+    emit(dataset.similar_clients(args.cnpj, args.marca, args.segmento, limit=args.limite).reset_index(), args)
+
+
+def cmd_participacao(dataset, args):
+    report = dataset.market_share(args.dimensao, args.janela, args.marca, args.segmento, top_n=args.limite, end=args.ate)
+    print(f"Período: {report['periodo']} ({report['total']} emplacamentos)")
+    emit(report["ranking"], args)
+
+
+def cmd_lote(dataset, args):
+    table = dataset.enrich(read_identifiers(args.lista), args.marca, args.segmento)
+    found = int((table["Situacao"] == SITUACAO_ENCONTRADO).sum())
+    print(f"{found} de {len(table)} identificadores encontrados")
+    emit(table, args)
+
+
+def cmd_oportunidades(dataset, args):
+    emit(dataset.hot_opportunities(args.meses, args.vencidas, args.marca, args.segmento), args)
+
+
+def cmd_inativos(dataset, args):
+    emit(dataset.inactive_clients(args.min_meses, args.max_meses, args.marca, args.segmento), args)
+
+
+def cmd_perfis(dataset, args):
+    profiles = dataset.client_profiles(args.marca, args.segmento).reset_index()
+    # Listas de preferências viram texto para caber em CSV/XLSX
+    for col in profiles.columns:
+        if profiles[col].map(lambda value: isinstance(value, list)).any():
+            profiles[col] = profiles[col].map(", ".join)
+    emit(profiles, args)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m engine", description="Consultas e relatórios de emplacamentos.")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("arquivo", help="planilha de emplacamentos (.xlsx) ou pasta com uma planilha por ano")
+    common.add_argument("--extrato", action="append", help="extrato a acrescentar à base (pode repetir)")
+    common.add_argument("--marca", action="append", default=[], help="filtrar por marca (pode repetir)")
+    common.add_argument("--segmento", action="append", default=[], help="filtrar por segmento (pode repetir)")
+    common.add_argument("--saida", help="grava o relatório em .csv, .xlsx ou .parquet")
+    common.add_argument("--limite", type=int, default=30, help="linhas exibidas na tela")
+    common.add_argument("--sem-snapshot", action="store_true", help="sempre lê o Excel (ignora data/.cache)")
+    common.add_argument(
+        "--armazenamento", choices=["memoria", "sqlite"], default="memoria",
+        help="sqlite: grava a base em data/.cache/<chave>.sqlite e faz as consultas no banco",
+    )
+
+    commands = parser.add_subparsers(dest="comando", required=True)
+    commands.add_parser("resumo", parents=[common], help="totais, ano e marca x ano").set_defaults(run=cmd_resumo)
+    buscar = commands.add_parser("buscar", parents=[common], help="clientes mais parecidos com o nome, CNPJ, placa ou chassi")
+    buscar.add_argument("consulta")
+    buscar.set_defaults(run=cmd_buscar)
+    cliente = commands.add_parser("cliente", parents=[common], help="perfil, previsão e histórico de um cliente")
+    cliente.add_argument("cnpj")
+    cliente.set_defaults(run=cmd_cliente)
+    semelhantes = commands.add_parser("semelhantes", parents=[common], help="clientes com a frota mais parecida com a do cliente")
+    semelhantes.add_argument("cnpj")
+    semelhantes.set_defaults(run=cmd_semelhantes)
+    participacao = commands.add_parser("participacao", parents=[common], help="participação de mercado de concessionárias ou cidades")
+    participacao.add_argument("--dimensao", choices=list(MARKET_DIMENSIONS), default="concessionaria")
+    participacao.add_argument("--janela", type=int, choices=list(ROLLING_WINDOWS), default=12, help="meses da janela móvel")
+    participacao.add_argument("--ate", help="último mês da janela (aaaa-mm); padrão: o mês mais recente da base")
+    participacao.set_defaults(run=cmd_participacao)
+    lote = commands.add_parser("lote", parents=[common], help="perfis de uma lista de CNPJs, placas ou chassis")
+    lote.add_argument("lista", help="lista de identificadores (.xlsx ou .csv), um por linha")
+    lote.set_defaults(run=cmd_lote)
+    oportunidades = commands.add_parser("oportunidades", parents=[common], help="próximas compras previstas")
+    oportunidades.add_argument("--meses", type=int, default=3)
+    oportunidades.add_argument("--vencidas", action="store_true", help="incluir previsões já vencidas")
+    oportunidades.set_defaults(run=cmd_oportunidades)
+    inativos = commands.add_parser("inativos", parents=[common], help="clientes sem comprar há N meses")
+    inativos.add_argument("--min-meses", type=int, default=13)
+    inativos.add_argument("--max-meses", type=int)
+    inativos.set_defaults(run=cmd_inativos)
+    commands.add_parser("perfis", parents=[common], help="tabela de perfis de clientes").set_defaults(run=cmd_perfis)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        dataset = open_dataset(args)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Erro ao carregar os dados: {e}", file=sys.stderr)
+        return 1
+    args.run(dataset, args)
+    return 0
@@ -0,0 +1,153 @@
+"""Busca ranqueada de clientes por nome, tolerante a acentos e erros de digitação.
+
+O índice é montado sobre os pares únicos (CNPJ, nome) — bem menos numerosos que as
+linhas — com os nomes "dobrados" (sem acentos, maiúsculos, só letras e dígitos):
+
+* vocabulário ordenado das palavras dos nomes, para casar prefixos ("TRANSP") com
+  uma busca binária;
+* índice de deleções no estilo SymSpell: cada palavra do vocabulário é registrada
+  sob todas as variações obtidas apagando até MAX_EDIT_DISTANCE letras do seu
+  prefixo. Uma palavra da consulta gera as próprias deleções e encontra as
+  candidatas por consulta ao dicionário; só elas têm a distância de edição
+  (Damerau-Levenshtein) conferida;
+* listas CSR palavra -> pares (CNPJ, nome) que contêm a palavra.
+
+A pontuação de um nome é a média, sobre as palavras da consulta, da melhor
+similaridade com alguma palavra do nome (1 para igual, menor para prefixo ou erro
+de digitação, 0 sem correspondência).
+"""
+import numpy as np
+import pandas as pd
+
+from engine.columns import COLUNA_CNPJ_NORMALIZADO, COLUNA_NOME
+
+MAX_EDIT_DISTANCE = 2
+# Só o início das palavras entra no índice de deleções (como no SymSpell): índice menor,
+# mesma cobertura prática para nomes de empresas
+DELETE_PREFIX_LENGTH = 7
+MIN_PREFIX_QUERY_LENGTH = 3
+# Pontuação mínima (0 a 1) para um cliente aparecer no resultado
+MIN_SCORE = 0.6
+TOP_K = 10
+
+
+def fold_text(values):
+    """Textos sem acentos, em maiúsculas e só com letras/dígitos separados por um espaço."""
+    text = pd.Series(values, copy=False).astype(str)
+    return (
+        text.str.normalize("NFKD")
+        .str.replace("[\u0300-\u036f]", "", regex=True)
+        .str.upper()
+        .str.replace(r"[^A-Z0-9]+", " ", regex=True)
+        .str.strip()
+    )
+
+
+def allowed_distance(token):
+    """Erros tolerados numa palavra da consulta: nenhum até 3 letras, 1 até 6, depois 2."""
+    if len(token) <= 3:
+        return 0
+    return 1 if len(token) <= 6 else MAX_EDIT_DISTANCE
+
+
+def deletes(word, max_distance):
+    """A palavra e todas as variações com até `max_distance` letras apagadas."""
+    result = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        result |= frontier
+    return result
+
+
+def edit_distance(a, b, max_distance):
+    """Distância de Damerau-Levenshtein (com transposição de vizinhas), limitada a max_distance + 1."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    before_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before_previous[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        before_previous, previous = previous, current
+    return min(previous[-1], max_distance + 1)
+
+
+class ClientNameIndex:
+    """Índice dos nomes de clientes para busca ranqueada (uma vez por versão do dataset)."""
+
+    def __init__(self, df):
+        pairs = df[[COLUNA_CNPJ_NORMALIZADO, COLUNA_NOME]].dropna().astype(str).drop_duplicates()
+        self.cnpjs = pairs[COLUNA_CNPJ_NORMALIZADO].to_numpy()
+        words = fold_text(pairs[COLUNA_NOME]).str.split()
+        tokens = words.explode().dropna()
+        entry_of_token = np.repeat(np.arange(len(pairs)), words.str.len().to_numpy())
+        token_codes, vocabulary = pd.factorize(tokens.to_numpy(), sort=True)
+        self.vocabulary = np.asarray(vocabulary, dtype=object)
+        # CSR: entradas (pares CNPJ/nome) de cada palavra do vocabulário
+        order = np.argsort(token_codes, kind="stable")
+        self._entries = entry_of_token[order]
+        self._offsets = np.concatenate(([0], np.cumsum(np.bincount(token_codes, minlength=len(vocabulary)))))
+        self._deletes = {}
+        for token_id, token in enumerate(self.vocabulary):
+            for variant in deletes(token[:DELETE_PREFIX_LENGTH], MAX_EDIT_DISTANCE):
+                self._deletes.setdefault(variant, []).append(token_id)
+
+    def __len__(self):
+        return len(self.cnpjs)
+
+    def token_matches(self, token):
+        """(ids do vocabulário, similaridades) das palavras que casam com `token`."""
+        matches = {}
+        # Prefixo: palavra ainda sendo digitada ou abreviada
+        if len(token) >= MIN_PREFIX_QUERY_LENGTH:
+            start = np.searchsorted(self.vocabulary, token, side="left")
+            stop = np.searchsorted(self.vocabulary, token + "\uffff", side="left")
+            for token_id in range(start, stop):
+                matches[token_id] = 0.6 + 0.4 * len(token) / len(self.vocabulary[token_id])
+        # Igualdade ou erros de digitação, via índice de deleções
+        max_distance = allowed_distance(token)
+        candidates = set()
+        for variant in deletes(token[:DELETE_PREFIX_LENGTH], max_distance):
+            candidates.update(self._deletes.get(variant, ()))
+        for token_id in candidates:
+            word = self.vocabulary[token_id]
+            distance = edit_distance(token, word, max_distance)
+            if distance <= max_distance:
+                similarity = 1.0 - distance / max(len(token), len(word))
+                matches[token_id] = max(matches.get(token_id, 0.0), similarity)
+        ids = np.fromiter(matches.keys(), dtype=np.int64, count=len(matches))
+        similarities = np.fromiter(matches.values(), dtype=float, count=len(matches))
+        return ids, similarities
+
+    def rank(self, query, min_score=MIN_SCORE):
+        """Series CNPJ -> pontuação (0 a 1) dos clientes cujo nome casa com a consulta, da maior para a menor."""
+        tokens = fold_text([query]).iat[0].split()
+        if not tokens:
+            return pd.Series(dtype=float)
+        scores = np.zeros(len(self.cnpjs))
+        for token in tokens:
+            ids, similarities = self.token_matches(token)
+            best = np.zeros(len(self.cnpjs))
+            if ids.size:
+                starts = self._offsets[ids]
+                lengths = self._offsets[ids + 1] - starts
+                positions = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+                entries = self._entries[positions + np.arange(lengths.sum())]
+                np.maximum.at(best, entries, np.repeat(similarities, lengths))
+            scores += best
+        scores /= len(tokens)
+        hits = np.flatnonzero(scores >= min_score)
+        # Um CNPJ pode aparecer com mais de uma grafia do nome: fica a melhor
+        ranked = pd.Series(scores[hits], index=self.cnpjs[hits]).groupby(level=0).max()
+        return ranked.sort_values(ascending=False)
+
+
+def build_client_name_index(df):
+    return ClientNameIndex(df)
@@ -0,0 +1,10 @@
+"""Nomes das colunas do DataFrame normalizado por load_data."""
+NOME_COLUNA_ENDERECO = "ENDEREÇO COMPLETO"
+NOME_COLUNA_TELEFONE = "TELEFONE1"
+NOME_COLUNA_CIDADE = "NO_CIDADE"
+NOME_COLUNA_CONCESSIONARIO = "concessionário"
+
+COLUNA_DATA = "Data emplacamento"
+COLUNA_CNPJ = "CNPJ CLIENTE"
+COLUNA_CNPJ_NORMALIZADO = "CNPJ_NORMALIZED"
+COLUNA_NOME = "NOME DO CLIENTE"
@@ -0,0 +1,86 @@
+"""Cubo de contagens que alimenta o "Resumo Geral".
+
+As contagens ficam no grão (Ano, Mes, Marca, Segmento) e, para os clientes únicos,
+cada célula (Ano, Marca, Segmento) guarda o conjunto de códigos de clientes que
+compraram nela. Os totais, o gráfico anual e a tabela Marca × Ano de qualquer
+combinação de filtros saem de fatias do cubo, cujo tamanho depende do número de
+combinações e de clientes, e não do número de emplacamentos.
+"""
+import numpy as np
+import pandas as pd
+
+from engine.columns import COLUNA_CNPJ_NORMALIZADO
+from engine.schema import concat_frames
+from engine.views import filter_mask
+
+CUBE_DIMENSIONS = ["Ano", "Mes", "Marca", "Segmento"]
+# O mês não entra em nenhuma contagem de clientes únicos e multiplicaria o tamanho dos conjuntos
+CLIENT_SET_DIMENSIONS = ["Ano", "Marca", "Segmento"]
+
+
+class SummaryCube:
+    """Contagens por (Ano, Mes, Marca, Segmento) e clientes distintos por (Ano, Marca, Segmento)."""
+
+    def __init__(self, df):
+        self.client_codes = {}
+        codes = self._encode_clients(df[COLUNA_CNPJ_NORMALIZADO])
+        self.counts = _count_cells(df)
+        self.client_sets = _client_sets(df, codes)
+
+    def _encode_clients(self, cnpjs):
+        """Código inteiro de cada CNPJ; CNPJs inéditos recebem os próximos códigos livres."""
+        new_cnpjs = [cnpj for cnpj in pd.unique(cnpjs) if cnpj not in self.client_codes]
+        first_code = len(self.client_codes)
+        self.client_codes.update((cnpj, first_code + offset) for offset, cnpj in enumerate(new_cnpjs))
+        return cnpjs.map(self.client_codes).to_numpy(dtype=np.int64)
+
+    def extend(self, delta_df):
+        """Nova versão do cubo somando as linhas de `delta_df` (o cubo atual não é alterado)."""
+        extended = SummaryCube.__new__(SummaryCube)
+        extended.client_codes = dict(self.client_codes)
+        codes = extended._encode_clients(delta_df[COLUNA_CNPJ_NORMALIZADO])
+        merged = concat_frames([self.counts, _count_cells(delta_df)])
+        extended.counts = (
+            merged.groupby(CUBE_DIMENSIONS, observed=True, dropna=False, sort=False)["Quantidade"].sum().reset_index()
+        )
+        extended.client_sets = concat_frames([self.client_sets, _client_sets(delta_df, codes)]).drop_duplicates(
+            ignore_index=True
+        )
+        return extended
+
+    def summary(self, brands, segments):
+        """Métricas do Resumo Geral para a combinação de filtros de Marca/Segmento."""
+        counts = self.counts
+        client_sets = self.client_sets
+        mask = filter_mask(counts, brands, segments)
+        if mask is not None:
+            counts = counts[mask]
+            client_sets = client_sets[filter_mask(client_sets, brands, segments)]
+        counts = counts[counts["Quantidade"] > 0]
+
+        clients = client_sets["Cliente"].to_numpy()
+        por_ano = counts.groupby("Ano")["Quantidade"].sum().sort_index().rename("count")
+        marca_ano = counts.groupby(["Ano", "Marca"], observed=True)["Quantidade"].sum().reset_index()
+        marca_ano = marca_ano[marca_ano["Quantidade"] > 0]
+        return {
+            "total_emplacamentos": int(counts["Quantidade"].sum()),
+            "clientes_unicos": int(np.count_nonzero(np.bincount(clients))) if clients.size else 0,
+            "primeiro_ano": int(counts["Ano"].min()) if not counts.empty else None,
+            "ultimo_ano": int(counts["Ano"].max()) if not counts.empty else None,
+            "por_ano": por_ano,
+            "marca_ano": marca_ano.pivot(index="Marca", columns="Ano", values="Quantidade").fillna(0).astype(int),
+        }
+
+
+def _count_cells(df):
+    return df.groupby(CUBE_DIMENSIONS, observed=True, dropna=False, sort=False).size().reset_index(name="Quantidade")
+
+
+def _client_sets(df, codes):
+    pairs = df[CLIENT_SET_DIMENSIONS].copy(deep=False)
+    pairs["Cliente"] = codes
+    return pairs.drop_duplicates(ignore_index=True)
+
+
+def build_summary_cube(df):
+    return SummaryCube(df)
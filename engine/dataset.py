@@ -0,0 +1,341 @@
+"""API do motor de consultas: um objeto `Dataset` por versão dos dados.
+
+O `Dataset` reúne carregamento (com snapshot), busca, perfis, previsão, resumo e
+relatórios de recompra sobre uma versão imutável dos dados, sem depender do
+Streamlit. O app e a linha de comando (`python -m engine`) usam esta mesma API;
+as estruturas derivadas (índices, cubo, perfis) ficam no registro do processo e
+são montadas uma única vez por versão.
+"""
+import os
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from engine import snapshot
+from engine.client_search import TOP_K, build_client_name_index
+from engine.columns import COLUNA_CNPJ, COLUNA_CNPJ_NORMALIZADO, COLUNA_NOME, NOME_COLUNA_CIDADE
+from engine.cube import build_summary_cube
+from engine.directory import DIRECTORY_PATTERN, directory_keys, list_spreadsheets, load_directory_frame
+from engine.enrichment import build_vehicle_index, classify_identifiers, enrichment_table
+from engine.ingest import append_delta
+from engine.loader import load_excel
+from engine.market_share import TOP_N as MARKET_TOP_N, build_market_share_cube
+from engine.metrics import count, timed
+from engine.prediction import get_sales_pitch
+from engine.profiles import build_client_profiles, hot_opportunities, plate_details, purchase_history
+from engine.purchase_matrix import SIMILAR_LIMIT, build_purchase_matrix
+from engine.recency import build_recency_index
+from engine.registry import DATASETS
+from engine.search_index import build_exact_index, build_search_index, normalize_cnpj_query, search_rows
+from engine.views import build_filtered_views, filter_signature
+
+
+def read_source_bytes(file_path_or_buffer):
+    """Lê o conteúdo bruto do arquivo (caminho ou BytesIO) para calcular a chave do snapshot."""
+    if isinstance(file_path_or_buffer, BytesIO):
+        return file_path_or_buffer.getvalue()
+    with open(file_path_or_buffer, "rb") as f:
+        return f.read()
+
+
+# Pontuação de quem só casa pelo trecho exato do nome (ex.: "TRANSP" dentro de "LOGTRANSP")
+SUBSTRING_SCORE = 0.9
+
+
+def merge_client_scores(name_scores, identifier_cnpjs, substring_cnpjs):
+    """Maior pontuação de cada CNPJ: nome parecido (0 a 1), identificador (1) ou trecho do nome (SUBSTRING_SCORE)."""
+    return pd.concat([
+        name_scores,
+        pd.Series(1.0, index=pd.unique(identifier_cnpjs)),
+        pd.Series(SUBSTRING_SCORE, index=pd.unique(substring_cnpjs)),
+    ]).groupby(level=0).max()
+
+
+def rank_table(profiles, scores):
+    """Clientes pontuados que estão em `profiles`, da maior pontuação para a menor (empates por emplacamentos)."""
+    # get_indexer consulta a tabela hash do índice (isin percorre os CNPJs de `profiles` um a um)
+    positions = profiles.index.get_indexer(scores.index)
+    scores = scores[positions >= 0]
+    ranked = profiles.iloc[positions[positions >= 0]][[COLUNA_NOME, COLUNA_CNPJ, NOME_COLUNA_CIDADE, "TotalCompras"]]
+    ranked = ranked.rename(columns={"TotalCompras": "Emplacamentos"}).rename_axis(COLUNA_CNPJ_NORMALIZADO)
+    ranked["Pontuacao"] = scores.round(3)
+    return ranked.sort_values(["Pontuacao", "Emplacamentos"], ascending=False, kind="stable")
+
+
+def similar_table(profiles, scores):
+    """Clientes parecidos (de `scores`, CNPJ -> similaridade) com os dados do perfil, do mais ao menos parecido."""
+    return rank_table(profiles, scores).rename(columns={"Pontuacao": "Similaridade"})
+
+
+def build_client_report(profile, rows, history=None):
+    """Relatório do cliente a partir da linha do perfil e dos emplacamentos dele.
+
+    `history` é o histórico mensal já calculado (ex.: a linha da matriz de compras);
+    sem ele, o histórico é agrupado a partir de `rows`.
+    """
+    predicted = profile["ProximaCompraPrevista"]
+    return {
+        "perfil": profile,
+        "argumento": get_sales_pitch(
+            profile["UltimaCompra"], predicted if pd.notna(predicted) else None, int(profile["TotalCompras"])
+        ),
+        "historico": purchase_history(rows) if history is None else history,
+        "detalhamento": plate_details(rows),
+    }
+
+
+class Dataset:
+    """Uma versão dos dados de emplacamentos registrada em `registry` sob `key`."""
+
+    def __init__(self, key, registry=DATASETS):
+        if key not in registry:
+            raise KeyError(key)
+        self.key = key
+        self.registry = registry
+
+    @classmethod
+    def open(cls, file_path_or_buffer, registry=DATASETS, compact=True, use_snapshot=True, progress=None):
+        """Carrega a planilha (ou o snapshot dela) e devolve o Dataset.
+
+        O Excel só é lido quando o conteúdo não está nem no registro nem em snapshot.
+        Um caminho de pasta carrega todas as planilhas dela (ver `open_directory`).
+        Erros de leitura (arquivo ausente, colunas obrigatórias faltando) são propagados.
+        `progress(etapa)` acompanha a leitura do Excel (ver `load_excel`).
+        """
+        if isinstance(file_path_or_buffer, (str, os.PathLike)) and os.path.isdir(file_path_or_buffer):
+            return cls.open_directory(file_path_or_buffer, registry=registry, compact=compact, use_snapshot=use_snapshot)
+        key = snapshot.content_key(read_source_bytes(file_path_or_buffer), compact)
+
+        def parse_excel():
+            if isinstance(file_path_or_buffer, BytesIO):
+                file_path_or_buffer.seek(0)
+            return load_excel(file_path_or_buffer, compact=compact, progress=progress)
+
+        loader = (lambda: snapshot.load_with_snapshot(key, parse_excel)) if use_snapshot else parse_excel
+        source_name = None if isinstance(file_path_or_buffer, BytesIO) else str(file_path_or_buffer)
+        with timed("carga"):
+            registry.get_or_load(key, loader, source_name)
+        return cls(key, registry)
+
+    @classmethod
+    def open_directory(cls, directory, pattern=DIRECTORY_PATTERN, registry=DATASETS, compact=True, use_snapshot=True,
+                       max_workers=None):
+        """Dataset com todas as planilhas `pattern` da pasta, unidas e sem emplacamentos repetidos.
+
+        Cada planilha tem snapshot próprio, então acrescentar uma planilha (ex.: um ano
+        novo) só lê essa do Excel; as pendentes são lidas em paralelo em processos.
+        """
+        paths = list_spreadsheets(directory, pattern)
+        if not paths:
+            raise FileNotFoundError(f"Nenhuma planilha '{pattern}' encontrada em {directory}")
+        file_keys, key = directory_keys(paths, compact)
+
+        def load_directory():
+            return load_directory_frame(paths, file_keys, compact=compact, use_snapshot=use_snapshot, max_workers=max_workers)
+
+        loader = (lambda: snapshot.load_with_snapshot(key, load_directory)) if use_snapshot else load_directory
+        with timed("carga"):
+            registry.get_or_load(key, loader, str(directory))
+        return cls(key, registry)
+
+    @classmethod
+    def restore(cls, key, registry=DATASETS):
+        """Dataset da chave, recuperado do snapshot se já saiu da memória. None se não existir."""
+        if not key:
+            return None
+        if registry.get_or_load(key, lambda: snapshot.read_snapshot(key)) is None:
+            return None
+        return cls(key, registry)
+
+    @property
+    def df(self):
+        return self.registry.get(self.key).df
+
+    def __len__(self):
+        return len(self.registry.get(self.key))
+
+    def derived(self, name, builder):
+        """Estrutura derivada `name`, montada (e cronometrada) só na primeira vez por versão."""
+        stage = name[0] if isinstance(name, tuple) else name
+
+        def timed_builder(df):
+            with timed(f"construcao:{stage}"):
+                return builder(df)
+
+        return self.registry.get_derived(self.key, name, timed_builder)
+
+    # --- Estruturas derivadas ---
+    @property
+    def exact_index(self):
+        return self.derived("exact_index", build_exact_index)
+
+    @property
+    def search_index(self):
+        return self.derived("search_index", build_search_index)
+
+    @property
+    def filtered_views(self):
+        return self.derived("filtered_views", build_filtered_views)
+
+    @property
+    def summary_cube(self):
+        return self.derived("summary_cube", build_summary_cube)
+
+    @property
+    def market_share_cube(self):
+        return self.derived("market_share_cube", build_market_share_cube)
+
+    @property
+    def client_name_index(self):
+        return self.derived("client_name_index", build_client_name_index)
+
+    @property
+    def vehicle_index(self):
+        """CNPJ do dono mais recente de cada placa e chassi (para a consulta em lote)."""
+        return self.derived("vehicle_index", build_vehicle_index)
+
+    def client_profiles(self, brands=(), segments=()):
+        """Tabela de perfis (um cliente por linha) para a combinação de filtros."""
+        return self.derived(
+            ("client_profiles",) + filter_signature(brands, segments),
+            lambda df: build_client_profiles(self.filtered(brands, segments)),
+        )
+
+    def purchase_matrix(self, brands=(), segments=()):
+        """Matrizes esparsas cliente × mês/modelo/marca para a combinação de filtros."""
+        return self.derived(
+            ("purchase_matrix",) + filter_signature(brands, segments),
+            lambda df: build_purchase_matrix(self.filtered(brands, segments)),
+        )
+
+    def recency_index(self, brands=(), segments=()):
+        return self.derived(
+            ("recency_index",) + filter_signature(brands, segments),
+            lambda df: build_recency_index(self.client_profiles(brands, segments)),
+        )
+
+    # --- Consultas ---
+    def filtered(self, brands=(), segments=()):
+        """Emplacamentos que passam nos filtros de Marca/Segmento (sem filtro, a base sem cópia)."""
+        with timed("filtro"):
+            return self.filtered_views.frame(brands, segments)
+
+    def search(self, query, brands=(), segments=()):
+        """Emplacamentos que casam com a busca por nome, CNPJ, placa ou chassi."""
+        with timed("busca"):
+            rows = search_rows(query, self.exact_index, self.search_index)
+            results = self.df.iloc[self.filtered_views.restrict(rows, brands, segments)]
+        count("buscas")
+        count("busca_linhas", len(results))
+        return results
+
+    def rank_clients(self, query, brands=(), segments=(), limit=TOP_K):
+        """Os `limit` clientes mais parecidos com a busca, com pontuação (0 a 1) e emplacamentos nos filtros.
+
+        CNPJ, placa e chassi (completos ou parciais) valem 1; nomes são comparados sem
+        acentos e com tolerância a erros de digitação, e o trecho exato de um nome
+        (busca por substring) vale SUBSTRING_SCORE. Empates saem pelo número de
+        emplacamentos.
+        """
+        with timed("busca"):
+            cnpjs = self.registry.get(self.key).column(COLUNA_CNPJ_NORMALIZADO)
+            identifier_rows = self.exact_index.lookup(query)
+            if identifier_rows is None or len(identifier_rows) == 0:
+                identifier_rows = self.search_index.search_identifiers(query)
+            substring_rows = self.search_index.name_index.search(query)
+            scores = merge_client_scores(
+                self.client_name_index.rank(query),
+                cnpjs.iloc[identifier_rows].astype(str),
+                cnpjs.iloc[substring_rows].astype(str),
+            )
+            ranked = rank_table(self.client_profiles(brands, segments), scores)
+        count("buscas")
+        count("busca_clientes", len(ranked))
+        return ranked.head(limit)
+
+    def client_rows(self, cnpj, brands=(), segments=()):
+        """Emplacamentos do cliente (CNPJ com ou sem pontuação) que passam nos filtros."""
+        rows = self.exact_index.by_cnpj.get(normalize_cnpj_query(cnpj), np.empty(0, dtype=np.int64))
+        return self.df.iloc[self.filtered_views.restrict(rows, brands, segments)]
+
+    def client_profile(self, cnpj, brands=(), segments=()):
+        """Linha do perfil do cliente, ou None se ele não tiver emplacamentos nos filtros."""
+        with timed("perfil_cliente"):
+            profiles = self.client_profiles(brands, segments)
+            cnpj = normalize_cnpj_query(cnpj)
+            return profiles.loc[cnpj] if cnpj in profiles.index else None
+
+    def client_report(self, cnpj, brands=(), segments=()):
+        """Perfil, argumento de venda, histórico mensal e detalhamento do cliente (ou None)."""
+        profile = self.client_profile(cnpj, brands, segments)
+        if profile is None:
+            return None
+        return build_client_report(
+            profile, self.client_rows(cnpj, brands, segments), self.purchase_history(cnpj, brands, segments)
+        )
+
+    def purchase_history(self, cnpj, brands=(), segments=()):
+        """Emplacamentos do cliente por mês (colunas AnoMes e Quantidade), da matriz cliente × mês."""
+        with timed("historico"):
+            return self.purchase_matrix(brands, segments).history(normalize_cnpj_query(cnpj))
+
+    def similar_clients(self, cnpj, brands=(), segments=(), limit=SIMILAR_LIMIT):
+        """Os `limit` clientes com a frota (modelos e marcas) mais parecida com a do cliente, com a similaridade (0 a 1)."""
+        with timed("semelhantes"):
+            scores = self.purchase_matrix(brands, segments).similar(normalize_cnpj_query(cnpj), limit)
+            similar = similar_table(self.client_profiles(brands, segments), scores)
+        count("semelhantes")
+        return similar
+
+    def enrich(self, identifiers, brands=(), segments=(), today=None):
+        """Perfil de cada CNPJ, placa ou chassi da lista (uma linha por identificador, na ordem da lista).
+
+        Ver `engine.enrichment`: a lista inteira é resolvida com consultas vetorizadas
+        ao índice de veículos e à tabela de perfis dos filtros.
+        """
+        with timed("lote"):
+            classified = classify_identifiers(identifiers)
+            clients = self.vehicle_index.owners(classified)
+            table = enrichment_table(classified, clients, self.client_profiles(brands, segments), today)
+        count("lote_identificadores", len(table))
+        return table
+
+    def summary(self, brands=(), segments=()):
+        with timed("resumo"):
+            return self.summary_cube.summary(brands, segments)
+
+    def market_share(self, dimension, window=12, brands=(), segments=(), top_n=MARKET_TOP_N, end=None):
+        """Participação das concessionárias ou cidades na janela de `window` meses (ver `MarketShareCube`)."""
+        with timed("participacao"):
+            return self.market_share_cube.market_share(dimension, window, brands, segments, top_n, end)
+
+    def hot_opportunities(self, months_ahead, include_overdue=False, brands=(), segments=(), today=None):
+        with timed("oportunidades"):
+            return hot_opportunities(self.client_profiles(brands, segments), months_ahead, include_overdue, today)
+
+    def inactive_clients(self, min_months=13, max_months=None, brands=(), segments=(), today=None):
+        """Clientes sem comprar entre `min_months` e `max_months` meses (e não no ano corrente)."""
+        if today is None:
+            today = pd.Timestamp.now()
+        with timed("inativos"):
+            index = self.recency_index(brands, segments)
+            start, stop = index.inactive_range(min_months, max_months, today=today)
+            return index.rows(start, stop, today=today)
+
+    # --- Atualização ---
+    def append(self, delta_df, delta_key):
+        """Acrescenta um extrato já normalizado. Retorna (novo Dataset, estatísticas)."""
+        with timed("extrato"):
+            new_key, stats = append_delta(self.registry, self.key, delta_df, delta_key)
+        return Dataset(new_key, self.registry), stats
+
+    def append_file(self, file_path_or_buffer, compact=True, progress=None):
+        """Lê e acrescenta um extrato (.xlsx). Retorna (novo Dataset, estatísticas)."""
+        delta_key = snapshot.content_key(read_source_bytes(file_path_or_buffer), compact)
+        if isinstance(file_path_or_buffer, BytesIO):
+            file_path_or_buffer.seek(0)
+        delta_df = load_excel(file_path_or_buffer, compact=compact, progress=progress)
+        if progress is not None:
+            progress("extrato")
+        return self.append(delta_df, delta_key)
@@ -0,0 +1,119 @@
+"""Deduplicação de emplacamentos e dados cadastrais canônicos por CNPJ.
+
+Um mesmo emplacamento pode vir repetido na planilha (ex.: a placa escrita com e
+sem hífen, o chassi com espaços). Cada linha recebe um hash de 64 bits do
+veículo normalizado (chassi ou, sem ele, a placa) com a data do emplacamento, e
+as repetições do hash são descartadas. Veículos emplacados de novo em outra data
+(ex.: reemplacamento) continuam na base.
+
+Um CNPJ também aparece com grafias diferentes do nome, do endereço e do
+telefone. Cada CNPJ fica com um valor canônico por coluna: o nome mais frequente
+(empate: o mais recente) e o endereço e o telefone mais recentes (empate: o mais
+frequente). Tudo em groupbys por hash, com custo linear no número de linhas.
+"""
+import numpy as np
+import pandas as pd
+
+from engine.columns import COLUNA_CNPJ_NORMALIZADO, COLUNA_DATA, COLUNA_NOME, NOME_COLUNA_ENDERECO, NOME_COLUNA_TELEFONE
+from engine.search_index import normalize_chassi
+
+INVALID_VEHICLE_KEYS = {"", "N/A", "NAN", "NONE"}
+# Valores que não contam como dado cadastral (como nas modas dos perfis)
+INVALID_VALUES = ["N/A", "nan", ""]
+# Coluna -> critério do valor canônico ("frequente" ou "recente")
+CANONICAL_COLUMNS = {
+    COLUNA_NOME: "frequente",
+    NOME_COLUNA_ENDERECO: "recente",
+    NOME_COLUNA_TELEFONE: "recente",
+}
+REPORT_NAMES = {COLUNA_NOME: "nomes", NOME_COLUNA_ENDERECO: "enderecos", NOME_COLUNA_TELEFONE: "telefones"}
+
+
+def vehicle_keys(df):
+    """Identificador do veículo por linha (na ordem das linhas, com índice 0..n-1): chassi normalizado ou a placa."""
+    # Índice posicional nas duas colunas, para o `where` alinhar as mesmas linhas com qualquer índice de `df`
+    chassi = normalize_chassi(df["Chassi"]).reset_index(drop=True)
+    placa = df["PLACA_NORMALIZED"].astype(str).fillna("").str.upper().reset_index(drop=True)
+    has_chassi = ~chassi.isin(INVALID_VEHICLE_KEYS)
+    keys = ("C:" + chassi).where(has_chassi, "P:" + placa)
+    keys[~has_chassi & placa.isin(INVALID_VEHICLE_KEYS)] = None
+    return keys
+
+
+def record_hashes(df):
+    """Hash (uint64) de cada emplacamento: veículo normalizado + data. Retorna (hashes, máscara das linhas com veículo)."""
+    keys = vehicle_keys(df)
+    # O hash depende da unidade da data, que varia conforme a origem (planilha, snapshot, extrato)
+    dates = df[COLUNA_DATA].reset_index(drop=True).astype("datetime64[ns]")
+    records = pd.DataFrame({"veiculo": keys, "data": dates})
+    return pd.util.hash_pandas_object(records, index=False), keys.notna()
+
+
+def build_record_index(df):
+    """Índice (sem repetições) dos hashes dos emplacamentos com veículo, para conferir extratos contra a base."""
+    hashes, has_vehicle = record_hashes(df)
+    return pd.Index(hashes[has_vehicle].to_numpy()).unique()
+
+
+def drop_duplicate_records(df):
+    """Remove os emplacamentos repetidos (mesmo veículo na mesma data), mantendo o primeiro. Retorna (df, removidas)."""
+    hashes, has_vehicle = record_hashes(df)
+    repeated = (hashes.duplicated() & has_vehicle).to_numpy()
+    if not repeated.any():
+        return df, 0
+    return df[~repeated].reset_index(drop=True), int(repeated.sum())
+
+
+def canonical_codes(client_codes, value_codes, dates, n_clients, rule="frequente"):
+    """Código do valor canônico de cada cliente (-1 se ele não tiver valor válido).
+
+    `client_codes` e `value_codes` são os códigos (pd.factorize) por linha; códigos
+    negativos são ignorados. O agrupamento é feito sobre os pares de inteiros.
+    """
+    valid = (client_codes >= 0) & (value_codes >= 0)
+    cells = pd.DataFrame({"cliente": client_codes[valid], "valor": value_codes[valid], "data": dates[valid]})
+    stats = cells.groupby(["cliente", "valor"], sort=False).agg(vezes=("data", "size"), ultima=("data", "max")).reset_index()
+    first, second = ("vezes", "ultima") if rule == "frequente" else ("ultima", "vezes")
+    # Maior `first` por cliente e, entre os empatados, o maior `second` (idxmax: o primeiro a aparecer)
+    stats = stats[stats[first] == stats.groupby("cliente", sort=False)[first].transform("max")]
+    best = stats.loc[stats.groupby("cliente", sort=False)[second].idxmax()]
+    codes = np.full(n_clients, -1, dtype=np.int64)
+    codes[best["cliente"].to_numpy()] = best["valor"].to_numpy()
+    return codes
+
+
+def canonicalize_clients(df, columns=CANONICAL_COLUMNS):
+    """Troca nome, endereço e telefone de cada linha pelos valores canônicos do CNPJ.
+
+    Retorna (df, {"nomes": linhas alteradas, "enderecos": ..., "telefones": ...}).
+    """
+    df = df.copy(deep=False)
+    client_codes, clients = pd.factorize(df[COLUNA_CNPJ_NORMALIZADO])
+    dates = df[COLUNA_DATA].to_numpy()
+    has_client = client_codes >= 0
+    changed = {}
+    for col, rule in columns.items():
+        if col not in df.columns:
+            continue
+        value_codes, uniques = pd.factorize(df[col])
+        invalid = np.flatnonzero(pd.Index(uniques).astype(str).isin(INVALID_VALUES))
+        value_codes[np.isin(value_codes, invalid)] = -1
+        canonical = canonical_codes(client_codes, value_codes, dates, len(clients), rule)
+        row_codes = np.where(has_client, canonical[client_codes], -1)
+        replace = (row_codes >= 0) & (row_codes != value_codes)
+        if replace.any():
+            df[col] = df[col].where(~replace, pd.Series(uniques.take(np.maximum(row_codes, 0)), index=df.index))
+        changed[REPORT_NAMES.get(col, col)] = int(replace.sum())
+    return df, changed
+
+
+def deduplicate(df):
+    """Remove emplacamentos repetidos e aplica os dados cadastrais canônicos. Retorna (df, relatório)."""
+    df, duplicates = drop_duplicate_records(df)
+    df, changed = canonicalize_clients(df)
+    report = {"duplicadas": duplicates, **changed}
+    print(
+        f"Deduplicação: {duplicates} emplacamentos repetidos removidos; valores canônicos em "
+        + ", ".join(f"{count} {name}" for name, count in changed.items())
+    )
+    return df, report
@@ -0,0 +1,139 @@
+"""Dataset formado por uma pasta de planilhas (ex.: uma por ano).
+
+Cada planilha tem o próprio snapshot, indexado pelo hash do seu conteúdo; só as
+planilhas novas ou alteradas passam pelo Excel. Quando há mais de uma, elas são
+lidas em paralelo por processos auxiliares (`python -m engine.directory`), pois a
+leitura do openpyxl é CPU-bound e não escala com threads; cada processo grava o
+snapshot da sua planilha, que é lido em seguida pelo processo principal.
+
+Não se usa `multiprocessing`: no Streamlit o __main__ é o próprio app.py, que os
+métodos spawn/forkserver executariam de novo em cada processo, e fork não é seguro
+num processo com várias threads.
+
+Os DataFrames normalizados são unidos com as categorias harmonizadas, os emplacamentos
+repetidos entre planilhas (mesmo veículo na mesma data) são descartados e o
+resultado também vira snapshot, sob uma chave que combina as chaves de todas as
+planilhas.
+"""
+import argparse
+import glob
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from engine import snapshot
+from engine.dedup import canonicalize_clients, drop_duplicate_records
+from engine.loader import load_excel
+from engine.schema import concat_frames
+
+DIRECTORY_PATTERN = "*.xlsx"
+# Raiz do repositório, para os processos auxiliares importarem o pacote engine
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def list_spreadsheets(directory, pattern=DIRECTORY_PATTERN):
+    """Planilhas da pasta em ordem de nome, sem os arquivos temporários do Excel (~$...)."""
+    paths = glob.glob(os.path.join(directory, pattern))
+    return sorted(path for path in paths if os.path.isfile(path) and not os.path.basename(path).startswith("~$"))
+
+
+def directory_keys(paths, compact=True):
+    """Chave de conteúdo de cada planilha e a chave do conjunto (muda se qualquer planilha ou o esquema mudar)."""
+    keys = []
+    for path in paths:
+        with open(path, "rb") as f:
+            keys.append(snapshot.content_key(f.read(), compact))
+    return keys, snapshot.combined_key("pasta", *keys)
+
+
+def parse_spreadsheet(path, compact=True):
+    """Lê e normaliza uma planilha (executado nos processos auxiliares)."""
+    try:
+        return load_excel(path, compact=compact)
+    except Exception as e:
+        raise ValueError(f"{os.path.basename(path)}: {e}") from e
+
+
+def parse_in_subprocess(path, key, compact, snapshot_dir):
+    """Lê a planilha num processo auxiliar, que grava o snapshot dela em `snapshot_dir`."""
+    command = [sys.executable, "-m", "engine.directory", path, key, "--snapshot-dir", snapshot_dir]
+    if not compact:
+        command.append("--sem-esquema-compacto")
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [PACKAGE_ROOT, env.get("PYTHONPATH")]))
+    result = subprocess.run(command, capture_output=True, text=True, env=env)
+    if result.stdout:
+        print(result.stdout, end="")
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        raise ValueError(lines[-1] if lines else f"{os.path.basename(path)}: falha na leitura")
+
+
+def parse_spreadsheets(paths, keys, compact=True, max_workers=None, snapshot_dir=snapshot.SNAPSHOT_DIR):
+    """Lê as planilhas gravando o snapshot de cada uma; retorna os DataFrames na mesma ordem."""
+    workers = min(len(paths), max_workers or os.cpu_count() or 1)
+    if workers <= 1:
+        # Uma planilha só (ou uma CPU só): ler no próprio processo evita o custo de iniciar outro
+        frames = []
+        for path, key in zip(paths, keys):
+            frames.append(parse_spreadsheet(path, compact))
+            snapshot.write_snapshot(key, frames[-1], snapshot_dir)
+        return frames
+    snapshot_dir = os.path.abspath(snapshot_dir)
+    # As threads só aguardam os processos auxiliares, que fazem a leitura de fato
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda args: parse_in_subprocess(*args, compact, snapshot_dir), zip(paths, keys)))
+    return [snapshot.read_snapshot(key, snapshot_dir) for key in keys]
+
+
+def load_directory_frame(paths, keys, compact=True, use_snapshot=True, max_workers=None):
+    """Une as planilhas em um só DataFrame, lendo do Excel só as que não têm snapshot."""
+    started = time.perf_counter()
+    frames = [snapshot.read_snapshot(key) if use_snapshot else None for key in keys]
+    pending = [i for i, frame in enumerate(frames) if frame is None]
+    pending_paths = [paths[i] for i in pending]
+    pending_keys = [keys[i] for i in pending]
+    if use_snapshot:
+        parsed = parse_spreadsheets(pending_paths, pending_keys, compact, max_workers)
+    else:
+        # Sem snapshots permanentes, os processos auxiliares entregam o resultado numa pasta temporária
+        with tempfile.TemporaryDirectory() as tmp:
+            parsed = parse_spreadsheets(pending_paths, pending_keys, compact, max_workers, snapshot_dir=tmp)
+    for i, frame in zip(pending, parsed):
+        frames[i] = frame
+
+    df, duplicates = drop_duplicate_records(concat_frames(frames))
+    # Cada planilha já vem canonicalizada; a união recalcula os valores canônicos entre os anos
+    df, changed = canonicalize_clients(df)
+    print(
+        f"Pasta com {len(paths)} planilhas ({len(pending)} lidas do Excel, {len(paths) - len(pending)} de snapshots): "
+        f"{len(df)} linhas, {duplicates} emplacamentos repetidos removidos, {changed['nomes']} nomes canonicalizados, "
+        f"em {time.perf_counter() - started:.2f}s"
+    )
+    return df
+
+
+def main(argv=None):
+    """Processo auxiliar: lê uma planilha e grava o snapshot normalizado dela."""
+    parser = argparse.ArgumentParser(description="Lê uma planilha de emplacamentos e grava o snapshot dela.")
+    parser.add_argument("arquivo")
+    parser.add_argument("chave")
+    parser.add_argument("--snapshot-dir", default=snapshot.SNAPSHOT_DIR)
+    parser.add_argument("--sem-esquema-compacto", action="store_true")
+    args = parser.parse_args(argv)
+    try:
+        df = parse_spreadsheet(args.arquivo, compact=not args.sem_esquema_compacto)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    if not snapshot.write_snapshot(args.chave, df, args.snapshot_dir):
+        print(f"{os.path.basename(args.arquivo)}: não foi possível gravar o snapshot", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
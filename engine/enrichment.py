@@ -0,0 +1,196 @@
+"""Consulta em lote: uma lista de CNPJs, placas e chassis resolvida de uma vez.
+
+Os identificadores da lista são normalizados como as colunas CNPJ_NORMALIZED e
+PLACA_NORMALIZED da base (e o chassi como nos índices de busca), sem um laço
+por linha. As placas e os chassis viram o CNPJ do emplacamento mais recente do
+veículo pelo índice de veículos (montado uma vez por versão do dataset), e
+os CNPJs viram as linhas da tabela de perfis: cada etapa é um único
+`get_indexer` sobre a lista inteira, em vez de uma busca por identificador.
+"""
+import os
+import unicodedata
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+
+from engine.columns import (
+    COLUNA_CNPJ,
+    COLUNA_CNPJ_NORMALIZADO,
+    COLUNA_DATA,
+    COLUNA_NOME,
+    NOME_COLUNA_CIDADE,
+    NOME_COLUNA_TELEFONE,
+)
+from engine.dedup import INVALID_VEHICLE_KEYS
+from engine.prediction import sales_pitch_buckets
+from engine.search_index import CHASSI_PATTERN, CNPJ_PATTERN, CNPJ_QUERY_PATTERN, PLACA_PATTERN, normalize_chassi
+
+TIPO_CNPJ = "CNPJ"
+TIPO_PLACA = "Placa"
+TIPO_CHASSI = "Chassi"
+SITUACAO_ENCONTRADO = "Encontrado"
+SITUACAO_NAO_ENCONTRADO = "Não encontrado"
+SITUACAO_INVALIDO = "Identificador inválido"
+# Cabeçalhos reconhecidos na primeira linha da lista (sem acentos, em maiúsculas)
+IDENTIFIER_HEADERS = ["IDENTIFICADOR", "CNPJ", "CNPJ CLIENTE", "PLACA", "CHASSI"]
+CSV_SEPARATORS = [";", "\t", ","]
+# Excel grava CNPJ digitado como número sem os zeros à esquerda (até dois, na prática)
+MIN_NUMERIC_CNPJ_DIGITS = 12
+ENRICHMENT_COLUMNS = [
+    "Identificador", "Tipo", "Situacao", COLUNA_NOME, COLUNA_CNPJ, NOME_COLUNA_CIDADE, NOME_COLUNA_TELEFONE,
+    "TotalCompras", "UltimaCompra", "MarcasPreferidas", "ModelosPreferidos", "IntervaloMedioMeses",
+    "ProximaCompraPrevista", "Urgencia",
+]
+# Colunas da tabela de perfis copiadas para cada identificador encontrado
+PROFILE_COLUMNS = ENRICHMENT_COLUMNS[3:-1]
+
+
+def header_text(value):
+    text = unicodedata.normalize("NFKD", str(value)).encode("ascii", "ignore").decode("ascii")
+    return " ".join(text.upper().split())
+
+
+def identifier_column(table):
+    """Valores da coluna de identificadores: a do cabeçalho reconhecido ou, sem ele, a primeira."""
+    if table.empty:
+        return pd.Series(dtype=object)
+    header = [header_text(value) for value in table.iloc[0]]
+    recognized = [position for position, name in enumerate(header) if name in IDENTIFIER_HEADERS]
+    if recognized:
+        values = table.iloc[1:, recognized[0]]
+    else:
+        values = table.iloc[:, 0]
+        # Todo CNPJ, placa ou chassi tem dígitos: sem eles, a primeira linha é um cabeçalho (ex.: "Clientes")
+        if not any(ch.isdigit() for ch in header[0]):
+            values = values.iloc[1:]
+    # Linhas em branco da planilha não contam como identificadores
+    return values[values.astype(str).str.strip() != ""].reset_index(drop=True)
+
+
+def csv_separator(text):
+    """Separador mais frequente na primeira linha (ponto e vírgula, tabulação ou vírgula)."""
+    first_line = text.split("\n", 1)[0]
+    return max(CSV_SEPARATORS, key=first_line.count)
+
+
+def read_identifiers(file_path_or_buffer, file_name=None):
+    """Identificadores da lista (.xlsx ou .csv), na ordem do arquivo.
+
+    `file_name` indica o formato quando a lista vem como BytesIO (ex.: upload).
+    """
+    file_name = file_name or str(file_path_or_buffer)
+    if os.path.splitext(file_name)[1].lower() == ".csv":
+        if hasattr(file_path_or_buffer, "read"):
+            content = file_path_or_buffer.read()
+        else:
+            with open(file_path_or_buffer, "rb") as f:
+                content = f.read()
+        try:
+            text = content.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            # CSV salvo pelo Excel em português costuma vir em Latin-1
+            text = content.decode("latin-1")
+        table = pd.read_csv(StringIO(text), header=None, dtype=str, sep=csv_separator(text), keep_default_na=False)
+    else:
+        table = pd.read_excel(file_path_or_buffer, header=None, dtype=str, keep_default_na=False)
+    return identifier_column(table)
+
+
+def classify_identifiers(values):
+    """Tipo e chave normalizada de cada identificador (colunas Identificador, Tipo e Chave).
+
+    CNPJ vira os 14 dígitos, placa e chassi as chaves do índice de veículos. Tipo
+    e Chave ficam None para o que não for reconhecido; a ordem de tentativa é a de
+    `exact_query`: CNPJ, placa e chassi.
+    """
+    raw = pd.Series(values, dtype=object).reset_index(drop=True)
+    raw = raw.where(raw.notna(), "").astype(str).str.strip()
+    digits = raw.str.replace(r"\D", "", regex=True)
+    numeric = raw.str.fullmatch(r"\d+") & (digits.str.len() >= MIN_NUMERIC_CNPJ_DIGITS)
+    cnpj = digits.where(~numeric, digits.str.zfill(14))
+    is_cnpj = raw.str.fullmatch(CNPJ_QUERY_PATTERN) & cnpj.str.fullmatch(CNPJ_PATTERN)
+    placa = raw.str.replace("-", "", regex=False).str.replace(" ", "", regex=False).str.upper()
+    is_placa = ~is_cnpj & placa.str.fullmatch(PLACA_PATTERN)
+    chassi = normalize_chassi(raw)
+    is_chassi = ~is_cnpj & ~is_placa & chassi.str.fullmatch(CHASSI_PATTERN)
+
+    kinds = np.select([is_cnpj, is_placa, is_chassi], [TIPO_CNPJ, TIPO_PLACA, TIPO_CHASSI], default=None)
+    keys = np.select([is_cnpj, is_placa, is_chassi], [cnpj, placa, chassi], default=None)
+    return pd.DataFrame({"Identificador": raw, "Tipo": kinds, "Chave": keys})
+
+
+def latest_owners(vehicles, cnpjs, order):
+    """CNPJ do emplacamento mais recente de cada veículo, indexado pelo veículo.
+
+    `order` são as posições das linhas em ordem de data; o agrupamento é feito
+    sobre os códigos inteiros do factorize, não sobre os textos.
+    """
+    codes, uniques = pd.factorize(vehicles)
+    # Código -1 (vazio) cai na última posição, que é sempre inválida
+    valid = np.append(~pd.Index(uniques).isin(INVALID_VEHICLE_KEYS), False)
+    newest_first = order[::-1]
+    newest_first = newest_first[valid[codes[newest_first]]]
+    vehicle_codes, first = np.unique(codes[newest_first], return_index=True)
+    return pd.Series(cnpjs.take(newest_first[first]), index=pd.Index(uniques.take(vehicle_codes)))
+
+
+class VehicleIndex:
+    """Dono atual (CNPJ do emplacamento mais recente) de cada placa e de cada chassi."""
+
+    def __init__(self, by_placa, by_chassi):
+        self.by_kind = {TIPO_PLACA: by_placa, TIPO_CHASSI: by_chassi}
+        for owners in self.by_kind.values():
+            # is_unique monta a tabela hash do índice agora, e não na primeira consulta em lote
+            owners.index.is_unique
+
+    def owners(self, identifiers):
+        """CNPJ de cada identificador: o próprio CNPJ ou o dono do veículo (None se não estiver na base)."""
+        kinds, keys = identifiers["Tipo"], identifiers["Chave"]
+        clients = keys.where(kinds == TIPO_CNPJ).to_numpy(dtype=object)
+        for kind, owners in self.by_kind.items():
+            selected = (kinds == kind).to_numpy()
+            positions = owners.index.get_indexer(keys[selected].astype(str))
+            found = positions >= 0
+            clients[np.flatnonzero(selected)[found]] = owners.iloc[positions[found]].to_numpy(dtype=object)
+        return clients
+
+
+def build_vehicle_index(df):
+    """Índice de veículos da base: placas como em PLACA_NORMALIZED e chassis como nos índices de busca."""
+    order = np.argsort(df[COLUNA_DATA].to_numpy(), kind="stable")
+    cnpjs = df[COLUNA_CNPJ_NORMALIZADO].astype(str).array
+    return VehicleIndex(
+        latest_owners(df["PLACA_NORMALIZED"].astype(str).str.upper(), cnpjs, order),
+        latest_owners(normalize_chassi(df["Chassi"]), cnpjs, order),
+    )
+
+
+def enrichment_table(identifiers, clients, profiles, today=None):
+    """Uma linha por identificador da lista, com o perfil do cliente encontrado (colunas ENRICHMENT_COLUMNS).
+
+    `clients` são os CNPJs de `VehicleIndex.owners`; os perfis saem de `profiles` com um
+    único `get_indexer`, então identificadores repetidos não custam nada a mais.
+    """
+    clients = pd.Series(clients, dtype=object)
+    positions = profiles.index.get_indexer(clients.where(clients.notna(), ""))
+    found = positions >= 0
+    matched = profiles.iloc[positions[found]].reindex(columns=PROFILE_COLUMNS)
+    matched.index = np.flatnonzero(found)
+    # Listas de preferências viram texto para caber em CSV/XLSX
+    for col in ["MarcasPreferidas", "ModelosPreferidos"]:
+        matched[col] = matched[col].map(", ".join)
+    matched["IntervaloMedioMeses"] = matched["IntervaloMedioMeses"].round(1)
+    matched["Urgencia"] = sales_pitch_buckets(
+        matched["UltimaCompra"], matched["ProximaCompraPrevista"], matched["TotalCompras"], today
+    )
+
+    # Identificadores sem cliente ficam com as colunas do perfil vazias
+    table = matched.reindex(identifiers.index)
+    table["TotalCompras"] = table["TotalCompras"].astype("Int64")
+    table.insert(0, "Situacao", np.select(
+        [found, identifiers["Tipo"].notna()], [SITUACAO_ENCONTRADO, SITUACAO_NAO_ENCONTRADO], default=SITUACAO_INVALIDO
+    ))
+    table.insert(0, "Tipo", identifiers["Tipo"].fillna(""))
+    table.insert(0, "Identificador", identifiers["Identificador"])
+    return table[ENRICHMENT_COLUMNS]
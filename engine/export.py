@@ -0,0 +1,127 @@
+"""Exportação de relatórios (XLSX, CSV e Parquet) em blocos de linhas.
+
+Os arquivos são escritos bloco a bloco (openpyxl em modo write-only, CSV e
+row groups de Parquet), sem montar a planilha inteira em objetos na memória. A
+geração é adiada até o clique no botão de download (`lazy_export`) e o arquivo
+pronto fica num cache LRU por (relatório, versão do dataset, parâmetros, formato).
+"""
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from engine.metrics import count, timed
+
+EXPORT_CHUNK_ROWS = 10_000
+MAX_CACHED_EXPORT_BYTES = 64 * 1024 * 1024
+
+EXPORT_FORMATS = {
+    "xlsx": {"extension": ".xlsx", "mime": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"},
+    "csv": {"extension": ".csv", "mime": "text/csv"},
+    "parquet": {"extension": ".parquet", "mime": "application/vnd.apache.parquet"},
+}
+
+
+def iter_chunks(df, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Blocos consecutivos de até `chunk_rows` linhas (sempre ao menos um, mesmo vazio)."""
+    yield df.iloc[:chunk_rows]
+    for start in range(chunk_rows, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def write_xlsx(df, target, sheet_name="Sheet1"):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=sheet_name)
+    sheet.append([str(col) for col in df.columns])
+    for chunk in iter_chunks(df):
+        # Células vazias (NaN/NaT) viram None, que o openpyxl grava como célula em branco
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        for row in chunk.itertuples(index=False, name=None):
+            sheet.append(row)
+    workbook.save(target)
+
+
+def write_csv(df, target, encoding="utf-8-sig"):
+    # O BOM (utf-8-sig) vai só no início do arquivo, para o Excel reconhecer a acentuação
+    for i, chunk in enumerate(iter_chunks(df)):
+        text = chunk.to_csv(index=False, header=(i == 0))
+        target.write(text.encode(encoding if i == 0 else "utf-8"))
+
+
+def write_parquet(df, target):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for chunk in iter_chunks(df):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(target, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+WRITERS = {"xlsx": write_xlsx, "csv": write_csv, "parquet": write_parquet}
+
+
+def export_frame(df, fmt, **options):
+    """Conteúdo (bytes) do arquivo `fmt` com as linhas de `df`."""
+    if fmt not in WRITERS:
+        raise ValueError(f"Formato de exportação não suportado: {fmt}")
+    buffer = BytesIO()
+    with timed(f"exportacao:{fmt}"):
+        WRITERS[fmt](df, buffer, **options)
+    count("exportacao_bytes", buffer.tell())
+    return buffer.getvalue()
+
+
+def export_file_name(base_name, fmt):
+    return base_name + EXPORT_FORMATS[fmt]["extension"]
+
+
+def export_mime(fmt):
+    return EXPORT_FORMATS[fmt]["mime"]
+
+
+class ExportCache:
+    """Arquivos exportados já gerados, com descarte LRU acima de `max_bytes`."""
+
+    def __init__(self, max_bytes=MAX_CACHED_EXPORT_BYTES):
+        self.max_bytes = max_bytes
+        self._files = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, builder):
+        with self._lock:
+            content = self._files.get(key)
+            if content is not None:
+                self._files.move_to_end(key)
+                return content
+        content = builder()
+        with self._lock:
+            if key not in self._files:
+                self._files[key] = content
+                self._total_bytes += len(content)
+            while self._total_bytes > self.max_bytes and len(self._files) > 1:
+                _, dropped = self._files.popitem(last=False)
+                self._total_bytes -= len(dropped)
+        return content
+
+
+# Cache único por processo, compartilhado pelas sessões (como o registro de datasets)
+EXPORTS = ExportCache()
+
+
+def lazy_export(key, frame_builder, fmt, **options):
+    """Função para o `data` do st.download_button: o arquivo só é gerado quando o download é pedido.
+
+    `key` identifica o relatório (nome, versão do dataset e parâmetros); `frame_builder`
+    devolve o DataFrame a exportar.
+    """
+    return lambda: EXPORTS.get_or_build(tuple(key) + (fmt,), lambda: export_frame(frame_builder(), fmt, **options))
+
@@ -0,0 +1,97 @@
+"""Atualização incremental: acrescenta um extrato (ex.: mensal) a uma versão do dataset.
+
+Só o extrato é lido e normalizado. Os emplacamentos já existentes (mesmo veículo
+na mesma data, pelo hash de engine.dedup) são descartados consultando o índice de
+hashes da versão atual; um veículo reemplacado em outra data entra. Os
+índices e perfis da versão anterior são estendidos com as linhas novas em vez de
+reconstruídos sobre o histórico inteiro. Clientes que já estão na base mantêm o
+nome canônico dela (ver engine.dedup), mesmo que o extrato traga outra grafia.
+"""
+import threading
+
+import pandas as pd
+
+from engine import snapshot
+from engine.columns import COLUNA_CNPJ_NORMALIZADO, COLUNA_NOME
+from engine.dedup import build_record_index, record_hashes
+from engine.profiles import update_client_profiles
+from engine.schema import concat_frames
+from engine.search_index import build_exact_index
+
+
+def new_rows_mask(base_record_index, delta_df):
+    """Máscara das linhas do extrato que ainda não estão na base (nem repetidas no extrato).
+
+    `base_record_index` é o índice de `build_record_index` da base: a consulta é um
+    único `get_indexer`, com custo proporcional ao extrato.
+    """
+    hashes, has_vehicle = record_hashes(delta_df)
+    has_vehicle = has_vehicle.to_numpy()
+    known = has_vehicle & (base_record_index.get_indexer(hashes.to_numpy()) >= 0)
+    # Linhas sem chassi nem placa não podem ser deduplicadas e entram sempre
+    repeated = hashes.duplicated().to_numpy() & has_vehicle
+    return ~known & ~repeated
+
+
+def adopt_base_names(base_df, base_exact_index, delta_df):
+    """Extrato com o nome que cada CNPJ já conhecido tem na base (a base já está canonicalizada)."""
+    cnpjs = delta_df[COLUNA_CNPJ_NORMALIZADO]
+    known = [cnpj for cnpj in pd.unique(cnpjs) if cnpj in base_exact_index.by_cnpj]
+    if not known:
+        return delta_df
+    first_rows = [base_exact_index.by_cnpj[cnpj][0] for cnpj in known]
+    base_names = pd.Series(base_df[COLUNA_NOME].to_numpy()[first_rows], index=known)
+    delta_df = delta_df.copy(deep=False)
+    delta_df[COLUNA_NOME] = cnpjs.map(base_names).fillna(delta_df[COLUNA_NOME])
+    return delta_df
+
+
+def append_delta(registry, base_key, delta_df, delta_key):
+    """Acrescenta o extrato normalizado `delta_df` à versão `base_key` do registro.
+
+    Retorna (nova chave, estatísticas). A nova versão já nasce com os índices e perfis
+    estendidos a partir dos da versão anterior.
+    """
+    base_entry = registry.get(base_key)
+    if base_entry is None:
+        raise KeyError(base_key)
+    base_df = base_entry.df
+    base_exact = registry.get_derived(base_key, "exact_index", build_exact_index)
+    base_records = registry.get_derived(base_key, "record_index", build_record_index)
+
+    delta_df = delta_df.reset_index(drop=True)
+    added_df = adopt_base_names(base_df, base_exact, delta_df[new_rows_mask(base_records, delta_df)].reset_index(drop=True))
+    stats = {
+        "linhas_extrato": len(delta_df),
+        "duplicadas": len(delta_df) - len(added_df),
+        "acrescentadas": len(added_df),
+    }
+    if added_df.empty:
+        return base_key, stats
+
+    new_key = snapshot.combined_key(base_key, delta_key)
+    if new_key in registry:
+        return new_key, stats
+
+    row_start = len(base_df)
+    new_df = concat_frames([base_df, added_df])
+
+    derived = {}
+    new_exact = base_exact.extend(added_df, row_start)
+    derived["exact_index"] = new_exact
+    # As linhas acrescentadas não se repetem entre si nem com a base: o índice continua sem repetições
+    derived["record_index"] = base_records.append(build_record_index(added_df))
+    for name, value in list(base_entry.derived.items()):
+        if name == "search_index":
+            derived[name] = value.extend(added_df, row_start)
+        elif name in ("summary_cube", "market_share_cube"):
+            derived[name] = value.extend(added_df)
+        elif isinstance(name, tuple) and name[0] == "client_profiles":
+            _, brands, segments = name
+            derived[name] = update_client_profiles(value, new_df, added_df, new_exact.by_cnpj, brands, segments)
+        # Demais estruturas são reconstruídas sob demanda na nova versão
+
+    registry.put(new_key, new_df, source_name=base_entry.source_name, derived=derived)
+    # O snapshot da nova versão é gravado em segundo plano para não atrasar a atualização
+    threading.Thread(target=snapshot.write_snapshot, args=(new_key, new_df), daemon=True).start()
+    return new_key, stats
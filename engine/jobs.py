@@ -0,0 +1,173 @@
+"""Carregamentos em segundo plano (uploads e extratos), com progresso por etapa.
+
+Uma planilha enviada é lida, normalizada e indexada numa thread, enquanto a
+sessão continua consultando a versão anterior dos dados. A sessão só troca a
+chave do dataset quando o trabalho termina com sucesso (troca atômica: uma única
+atribuição); se ele falhar, a versão anterior continua valendo.
+
+Os trabalhos ficam num registro do processo (como o de datasets), identificados
+pela chave de conteúdo do resultado: duas sessões que enviam o mesmo arquivo
+acompanham o mesmo trabalho em vez de lerem a planilha duas vezes.
+"""
+import threading
+import time
+from io import BytesIO
+
+from engine import snapshot
+from engine.dataset import Dataset
+from engine.metrics import count, timed
+from engine.warmup import DERIVED_STRUCTURES
+
+# Etapa -> texto exibido no progresso
+STAGE_LABELS = {
+    "fila": "aguardando início",
+    "leitura": "lendo a planilha",
+    "normalizacao": "normalizando os dados",
+    "extrato": "acrescentando à base",
+    "indices": "montando os índices",
+}
+LOAD_STAGES = ["fila", "leitura", "normalizacao", "indices"]
+APPEND_STAGES = ["fila", "leitura", "normalizacao", "extrato", "indices"]
+# Trabalhos concluídos ficam disponíveis por este tempo para as sessões buscarem o resultado
+JOB_TTL_SECONDS = 10 * 60
+
+
+class LoadJob:
+    """Um carregamento em segundo plano: etapa atual, resultado ou erro."""
+
+    def __init__(self, job_id, kind, description, stages):
+        self.id = job_id
+        self.kind = kind
+        self.description = description
+        self.stages = list(stages)
+        self.stage = self.stages[0]
+        self.stage_fraction = 0.0
+        self.started = time.monotonic()
+        self.finished = None
+        self.result = None
+        self.error = None
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    @property
+    def failed(self):
+        return self.done and self.error is not None
+
+    @property
+    def progress(self):
+        """Fração concluída (0 a 1), pelas etapas já passadas e pelo andamento da etapa atual."""
+        if self.done:
+            return 1.0
+        position = self.stages.index(self.stage) if self.stage in self.stages else 0
+        return min((position + self.stage_fraction) / len(self.stages), 1.0)
+
+    @property
+    def label(self):
+        return STAGE_LABELS.get(self.stage, self.stage)
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    def set_stage(self, stage, fraction=0.0):
+        self.stage = stage
+        self.stage_fraction = fraction
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def run(self, work):
+        try:
+            with timed(f"segundo_plano:{self.kind}"):
+                self.result = work(self.set_stage)
+        except Exception as e:
+            self.error = e
+            print(f"Carregamento em segundo plano '{self.description}' falhou: {e}")
+        finally:
+            self.finished = time.monotonic()
+            self._done.set()
+
+
+class JobRunner:
+    """Registro dos trabalhos do processo, cada um na sua thread."""
+
+    def __init__(self, ttl_seconds=JOB_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, job_id, kind, description, stages, work):
+        """Dispara `work(progress)` numa thread e devolve o trabalho.
+
+        Se já houver um trabalho com o mesmo id em andamento (ou concluído com
+        sucesso), ele é devolvido em vez de começar outro; um que falhou é refeito.
+        """
+        with self._lock:
+            self._evict_finished(time.monotonic())
+            job = self._jobs.get(job_id)
+            if job is not None and not job.failed:
+                return job
+            job = LoadJob(job_id, kind, description, stages)
+            self._jobs[job_id] = job
+        count("trabalhos_segundo_plano")
+        threading.Thread(target=job.run, args=(work,), name=f"carga-{job_id[:8]}", daemon=True).start()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def running(self):
+        with self._lock:
+            return [job for job in self._jobs.values() if not job.done]
+
+    def _evict_finished(self, now):
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.done and now - job.finished > self.ttl_seconds
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+# Instância única por processo, compartilhada pelas sessões (como o registro de datasets)
+JOBS = JobRunner()
+
+
+def build_derived(dataset, progress):
+    """Monta as estruturas derivadas da nova versão, para a troca não pesar na primeira consulta."""
+    for i, build in enumerate(DERIVED_STRUCTURES.values()):
+        progress("indices", i / len(DERIVED_STRUCTURES))
+        build(dataset)
+
+
+def submit_load(file_bytes, description, compact=True, runner=JOBS):
+    """Carrega uma planilha enviada em segundo plano. O resultado é {"key": chave do dataset}."""
+
+    def work(progress):
+        dataset = Dataset.open(BytesIO(file_bytes), compact=compact, progress=progress)
+        build_derived(dataset, progress)
+        return {"key": dataset.key}
+
+    return runner.submit(snapshot.content_key(file_bytes, compact), "upload", description, LOAD_STAGES, work)
+
+
+def submit_append(base_key, delta_bytes, description, compact=True, runner=JOBS):
+    """Acrescenta um extrato à versão `base_key` em segundo plano.
+
+    O resultado é {"key": chave da nova versão, "stats": estatísticas do acréscimo}.
+    """
+
+    def work(progress):
+        base = Dataset.restore(base_key)
+        if base is None:
+            raise KeyError(f"a versão atual dos dados ({base_key}) não está mais disponível")
+        dataset, stats = base.append_file(BytesIO(delta_bytes), compact=compact, progress=progress)
+        build_derived(dataset, progress)
+        return {"key": dataset.key, "stats": stats}
+
+    job_id = snapshot.combined_key(base_key, snapshot.content_key(delta_bytes, compact))
+    return runner.submit(job_id, "extrato", description, APPEND_STAGES, work)
@@ -0,0 +1,231 @@
+"""Leitura e normalização da planilha de emplacamentos.
+
+A planilha é lida em modo streaming (openpyxl `read_only`), os nomes alternativos
+das colunas são resolvidos só a partir da linha de cabeçalho e apenas as colunas
+usadas pelo app são materializadas. As datas são convertidas de forma vetorizada:
+texto no formato dd/mm/aaaa, números seriais do Excel e células já do tipo data.
+Por fim, os emplacamentos repetidos são removidos e os dados cadastrais de cada
+CNPJ são canonicalizados (ver engine.dedup).
+"""
+import time
+from datetime import date, datetime
+
+import pandas as pd
+
+from engine.columns import (
+    COLUNA_CNPJ,
+    COLUNA_CNPJ_NORMALIZADO,
+    COLUNA_DATA,
+    COLUNA_NOME,
+    NOME_COLUNA_CIDADE,
+    NOME_COLUNA_CONCESSIONARIO,
+    NOME_COLUNA_ENDERECO,
+    NOME_COLUNA_TELEFONE,
+)
+from engine.dedup import deduplicate
+from engine.metrics import count
+from engine.schema import compact_dtypes
+
+# Nomes alternativos aceitos no cabeçalho, na ordem de preferência
+COLUMN_ALIASES = {
+    "PLACA": ["PLACA", "Placa", "placa", "PLACA VEÍCULO", "Placa Veículo",
+              "PLACA_VEICULO", "NÚMERO DA PLACA", "Numero da Placa"],
+    NOME_COLUNA_CONCESSIONARIO: ["concessionário", "concessionario", "Concessionário", "Concessionaria",
+                                 "CONCESSIONÁRIO", "CONCESSIONARIO", "CONC", "LOJA", "Conc", "Loja"],
+    "Chassi": ["Chassi", "CHASSI", "chassi", "CHASSIS", "Chassis", "chassis", "CHASSÍS", "Chassís"],
+    "Modelo": ["Modelo", "MODELO", "modelo", "Model", "model", "VEÍCULO", "Veículo", "veículo"],
+}
+REQUIRED_COLUMNS = [COLUNA_DATA, COLUNA_CNPJ, COLUNA_NOME]
+# Colunas de texto usadas pelo app; as ausentes são criadas com "N/A"
+TEXT_COLUMNS = [COLUNA_CNPJ, COLUNA_NOME, NOME_COLUNA_ENDERECO, NOME_COLUNA_TELEFONE, NOME_COLUNA_CIDADE,
+                "Marca", "Segmento", "Modelo", "Chassi", NOME_COLUNA_CONCESSIONARIO, "PLACA"]
+
+DATE_FORMAT = "%d/%m/%Y"
+EXCEL_EPOCH = pd.Timestamp("1899-12-30")
+# Células com erro de fórmula chegam como texto e são tratadas como vazias
+EXCEL_ERROR_VALUES = ["#N/A", "#VALUE!", "#REF!", "#DIV/0!", "#NUM!", "#NAME?", "#NULL!"]
+
+
+def resolve_columns(header):
+    """Mapeia cada coluna usada pelo app para a posição dela no cabeçalho (aceitando os nomes alternativos)."""
+    positions = {}
+    for i, name in enumerate(header):
+        if isinstance(name, str):
+            name = name.strip()
+        if name is not None and name not in positions:
+            positions[name] = i
+
+    resolved = {}
+    for col in [COLUNA_DATA] + TEXT_COLUMNS:
+        for alias in COLUMN_ALIASES.get(col, [col]):
+            if alias in positions:
+                resolved[col] = positions[alias]
+                if alias != col:
+                    print(f"Coluna '{alias}' renomeada para '{col}'")
+                break
+
+    missing = [col for col in REQUIRED_COLUMNS if col not in resolved]
+    if missing:
+        raise ValueError(f"Colunas obrigatórias ausentes na planilha: {', '.join(missing)}")
+    return resolved
+
+
+def iter_columns(file_path_or_buffer, chunk_rows=None):
+    """Lê a primeira aba em streaming, em blocos {coluna: lista de valores} só das colunas usadas.
+
+    Cada bloco tem até `chunk_rows` linhas (None: a aba inteira num bloco só); sempre
+    há ao menos um bloco, mesmo que vazio.
+    """
+    # Importado só quando há planilha a ler (o snapshot dispensa o openpyxl)
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path_or_buffer, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            raise ValueError("A planilha está vazia.")
+        resolved = resolve_columns(header)
+        names = list(resolved)
+        indices = [resolved[col] for col in names]
+        width = max(indices) + 1
+
+        values, n_rows, yielded = None, 0, False
+        for row in rows:
+            if len(row) < width:
+                row = row + (None,) * (width - len(row))
+            picked = [row[i] for i in indices]
+            # Linhas totalmente vazias (ex.: formatação no fim da aba) são ignoradas
+            if all(value is None for value in picked):
+                continue
+            if values is None:
+                values = {col: [] for col in names}
+                appenders = [values[col].append for col in names]
+            for append, value in zip(appenders, picked):
+                append(value)
+            n_rows += 1
+            if n_rows == chunk_rows:
+                yield values
+                values, n_rows, yielded = None, 0, True
+        if values is not None or not yielded:
+            yield values if values is not None else {col: [] for col in names}
+    finally:
+        workbook.close()
+
+
+def read_columns(file_path_or_buffer):
+    """Lê a primeira aba em streaming e devolve {coluna: lista de valores} só das colunas usadas."""
+    return list(iter_columns(file_path_or_buffer))[0]
+
+
+def parse_dates(values):
+    """Converte as células de data: texto dd/mm/aaaa, serial do Excel ou data/hora nativa."""
+    cells = pd.Series(values, dtype=object)
+    kinds = cells.map(type)
+    result = pd.Series(pd.NaT, index=cells.index, dtype="datetime64[us]")
+
+    is_text = (kinds == str).to_numpy()
+    if is_text.any():
+        text = cells[is_text].str.strip()
+        parsed = pd.to_datetime(text, format=DATE_FORMAT, errors="coerce")
+        # Textos fora do formato padrão: ISO (aaaa-mm-dd) e, por fim, a interpretação genérica com dia primeiro
+        for fallback in ({"format": "ISO8601"}, {"format": "mixed", "dayfirst": True}):
+            leftover = parsed.isna() & (text != "")
+            if not leftover.any():
+                break
+            parsed[leftover] = pd.to_datetime(text[leftover], errors="coerce", **fallback)
+        result[is_text] = parsed
+
+    is_serial = kinds.isin([int, float]).to_numpy()
+    if is_serial.any():
+        serials = pd.to_numeric(cells[is_serial], errors="coerce")
+        result[is_serial] = pd.to_datetime(serials, unit="D", origin=EXCEL_EPOCH, errors="coerce")
+
+    is_native = kinds.map(lambda kind: issubclass(kind, date)).to_numpy() & ~is_text & ~is_serial
+    if is_native.any():
+        result[is_native] = pd.to_datetime(cells[is_native].map(
+            lambda value: value if isinstance(value, datetime) else datetime(value.year, value.month, value.day)
+        ))
+    return result
+
+
+def to_text(values):
+    """Texto aparado das células; números inteiros viram '123' (e não '123.0'), vazias e erros ficam nulos."""
+    cells = pd.Series(values, dtype=object)
+    integral = cells.map(lambda value: isinstance(value, float) and value.is_integer()).to_numpy(dtype=bool)
+    if integral.any():
+        cells[integral] = cells[integral].map(lambda value: str(int(value)))
+    cells = cells.astype(str).str.strip()
+    return cells.mask((cells == "") | cells.isin(EXCEL_ERROR_VALUES))
+
+
+def load_excel(file_path_or_buffer, compact=True, timings=None, progress=None):
+    """Carrega e normaliza a planilha de emplacamentos.
+
+    Levanta FileNotFoundError/ValueError em caso de problema; quem chama decide como
+    exibir o erro. Se `timings` for um dicionário, ele recebe o tempo (s) de cada etapa;
+    `progress(etapa)` é chamada no início da leitura e da normalização.
+    """
+    timings = {} if timings is None else timings
+    if progress is not None:
+        progress("leitura")
+    started = time.perf_counter()
+    raw = read_columns(file_path_or_buffer)
+    timings["leitura"] = time.perf_counter() - started
+    if progress is not None:
+        progress("normalizacao")
+    df = normalize_columns(raw, compact=compact, timings=timings)
+
+    total = sum(timings.values())
+    breakdown = " | ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items())
+    print(f"Carga do Excel ({len(df)} linhas) em {total:.2f}s: {breakdown}")
+    return df
+
+
+def normalize_columns(raw, compact=True, timings=None, dedup=True):
+    """Monta o DataFrame normalizado a partir de {coluna: valores brutos das células}.
+
+    `raw` usa os nomes padronizados das colunas (como devolvido por `read_columns`) e
+    é consumido pela função. Com `dedup=False`, a remoção dos repetidos e os valores
+    canônicos ficam para quem chama (ex.: a gravação em blocos do SQLite, que os
+    aplica sobre a base inteira).
+    """
+    timings = {} if timings is None else timings
+    started = time.perf_counter()
+
+    def lap(stage):
+        nonlocal started
+        now = time.perf_counter()
+        timings[stage] = now - started
+        started = now
+
+    df = pd.DataFrame({COLUNA_DATA: parse_dates(raw.pop(COLUNA_DATA))})
+    lap("datas")
+
+    has_placa = "PLACA" in raw
+    for col in TEXT_COLUMNS:
+        df[col] = to_text(raw.pop(col)) if col in raw else "N/A"
+    df["PLACA"] = df["PLACA"].str.upper()
+    # Sem coluna de placa na planilha, a placa normalizada fica vazia
+    df["PLACA_NORMALIZED"] = df["PLACA"].str.replace("-", "").str.replace(" ", "") if has_placa else ""
+    df[NOME_COLUNA_CONCESSIONARIO] = df[NOME_COLUNA_CONCESSIONARIO].replace(["", "nan"], "N/A")
+    df[COLUNA_CNPJ_NORMALIZADO] = df[COLUNA_CNPJ].str.replace(r"[.\\/-]", "", regex=True)
+    lap("textos")
+
+    # Linhas sem data válida não entram na base
+    df = df[df[COLUNA_DATA].notna()].reset_index(drop=True)
+    df["Ano"] = df[COLUNA_DATA].dt.year.astype(int)
+    df["Mes"] = df[COLUNA_DATA].dt.month.astype(int)
+    lap("derivadas")
+
+    if dedup:
+        # Emplacamentos repetidos saem e cada CNPJ fica com nome, endereço e telefone canônicos
+        df, report = deduplicate(df)
+        count("emplacamentos_repetidos", report["duplicadas"])
+        count("nomes_canonicalizados", report["nomes"])
+        lap("deduplicacao")
+
+    if compact:
+        df, _ = compact_dtypes(df)
+        lap("esquema")
+    return df
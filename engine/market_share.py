@@ -0,0 +1,217 @@
+"""Participação de mercado de concessionárias e cidades, mês a mês.
+
+As contagens ficam pré-agregadas no grão (Periodo, concessionária, cidade,
+Marca, Segmento), em que Periodo é o mês (ano * 12 + mês - 1). Para cada
+dimensão e combinação de filtros, `ShareSeries` guarda a matriz meses × valores
+e as somas móveis de 1, 3 e 12 meses, calculadas uma vez; um extrato novo soma
+as suas contagens e só recalcula as janelas a partir do primeiro mês afetado.
+Ranking, variações e gráficos são linhas e colunas dessas matrizes, sem tocar
+nos emplacamentos.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from engine.columns import COLUNA_DATA, NOME_COLUNA_CIDADE, NOME_COLUNA_CONCESSIONARIO
+from engine.purchase_matrix import month_label, month_numbers
+from engine.schema import concat_frames
+from engine.views import MAX_CACHED_VIEWS, apply_filters, filter_signature
+
+# Dimensão -> (coluna da base, rótulo exibido)
+DIMENSIONS = {
+    "concessionaria": (NOME_COLUNA_CONCESSIONARIO, "Concessionária"),
+    "cidade": (NOME_COLUNA_CIDADE, "Cidade"),
+}
+ROLLING_WINDOWS = (1, 3, 12)
+MARKET_COLUMNS = ["Periodo", NOME_COLUNA_CONCESSIONARIO, NOME_COLUNA_CIDADE, "Marca", "Segmento"]
+MISSING_LABEL = "N/A"
+TOP_N = 10
+
+
+def parse_month(text):
+    """Periodo (ano * 12 + mês - 1) de um texto 'aaaa-mm'."""
+    year, month = (int(part) for part in str(text).split("-")[:2])
+    return year * 12 + month - 1
+
+
+def label_dimensions(counts):
+    """Textos das dimensões, com vazios e "nan" como MISSING_LABEL (feito sobre as contagens, não sobre a base)."""
+    for col in MARKET_COLUMNS[1:]:
+        values = counts[col].astype(object)
+        counts[col] = values.where(values.notna(), MISSING_LABEL).astype(str).replace({"": MISSING_LABEL, "nan": MISSING_LABEL})
+    counts["Periodo"] = counts["Periodo"].astype(np.int64)
+    counts["Quantidade"] = counts["Quantidade"].astype(np.int64)
+    return counts
+
+
+def market_counts(df):
+    """Emplacamentos por (Periodo, concessionária, cidade, Marca, Segmento); linhas sem data ficam de fora."""
+    months = month_numbers(df[COLUNA_DATA])
+    dated = months >= 0
+    cells = df.loc[dated, MARKET_COLUMNS[1:]].copy(deep=False)
+    cells.insert(0, "Periodo", months[dated])
+    counts = cells.groupby(MARKET_COLUMNS, observed=True, dropna=False, sort=False).size().reset_index(name="Quantidade")
+    return label_dimensions(counts)
+
+
+def merge_counts(frames):
+    merged = concat_frames(frames)
+    return merged.groupby(MARKET_COLUMNS, sort=False)["Quantidade"].sum().reset_index()
+
+
+def rolling_sums(monthly, window, start=0):
+    """Somas móveis de `window` meses das linhas [start:] de `monthly` (meses × valores)."""
+    first = max(0, start - window + 1)
+    cumulative = np.vstack([np.zeros((1, monthly.shape[1]), dtype=np.int64), np.cumsum(monthly[first:], axis=0)])
+    ends = np.arange(start - first + 1, len(cumulative))
+    return cumulative[ends] - cumulative[np.maximum(ends - window, 0)]
+
+
+class ShareSeries:
+    """Emplacamentos por mês de cada valor de uma coluna (matriz meses × valores) e as somas móveis."""
+
+    def __init__(self, counts, column):
+        self.column = column
+        self.values = pd.Index(sorted(pd.unique(counts[column])))
+        if counts.empty:
+            self.first_month = 0
+            self.monthly = np.zeros((0, 0), dtype=np.int64)
+        else:
+            self.first_month = int(counts["Periodo"].min())
+            n_months = int(counts["Periodo"].max()) - self.first_month + 1
+            self.monthly = np.zeros((n_months, len(self.values)), dtype=np.int64)
+            self._add(counts)
+        self.rolling = {window: rolling_sums(self.monthly, window) for window in ROLLING_WINDOWS}
+
+    def _add(self, counts):
+        rows = counts["Periodo"].to_numpy(dtype=np.int64) - self.first_month
+        cols = self.values.get_indexer(counts[self.column])
+        np.add.at(self.monthly, (rows, cols), counts["Quantidade"].to_numpy(dtype=np.int64))
+
+    @property
+    def months(self):
+        return [month_label(self.first_month + i) for i in range(len(self.monthly))]
+
+    def extend(self, delta_counts):
+        """Nova versão somando `delta_counts`; as janelas só são recalculadas a partir do primeiro mês do extrato."""
+        if delta_counts.empty:
+            return self
+        if self.monthly.size == 0:
+            return ShareSeries(delta_counts, self.column)
+        extended = ShareSeries.__new__(ShareSeries)
+        extended.column = self.column
+        new_values = pd.Index(sorted(set(pd.unique(delta_counts[self.column])) - set(self.values)))
+        extended.values = self.values.append(new_values)
+        delta_first, delta_last = int(delta_counts["Periodo"].min()), int(delta_counts["Periodo"].max())
+        extended.first_month = min(self.first_month, delta_first)
+        offset = self.first_month - extended.first_month
+        n_months = max(self.first_month + len(self.monthly), delta_last + 1) - extended.first_month
+        shape = (n_months, len(extended.values))
+
+        extended.monthly = np.zeros(shape, dtype=np.int64)
+        extended.monthly[offset:offset + len(self.monthly), :len(self.values)] = self.monthly
+        extended._add(delta_counts)
+
+        # Janelas que terminam antes do extrato não mudam; os meses vazios entre o fim
+        # da base e o extrato também são novos e têm janelas com as vendas anteriores
+        recompute = min(delta_first, self.first_month + len(self.monthly)) - extended.first_month
+        extended.rolling = {}
+        for window, sums in self.rolling.items():
+            rolling = np.zeros(shape, dtype=np.int64)
+            kept = max(0, recompute - offset)
+            rolling[offset:offset + kept, :len(self.values)] = sums[:kept]
+            rolling[recompute:] = rolling_sums(extended.monthly, window, recompute)
+            extended.rolling[window] = rolling
+        return extended
+
+    def report(self, window, top_n=TOP_N, end=None, label=None):
+        """Ranking dos `top_n` valores na janela de `window` meses que termina em `end` e a série das participações.
+
+        Retorna {"periodo", "total", "ranking", "serie"}. A variação compara com a
+        janela anterior do mesmo tamanho (mês a mês, trimestre a trimestre ou ano a ano).
+        """
+        if window not in self.rolling:
+            raise ValueError(f"Janela de {window} meses não disponível (use {', '.join(map(str, ROLLING_WINDOWS))})")
+        label = label or self.column
+        rolling = self.rolling[window]
+        if len(rolling) == 0:
+            empty = pd.DataFrame(columns=[label, "Emplacamentos", "Participacao", "ParticipacaoAnterior", "Variacao"])
+            return {"periodo": None, "total": 0, "ranking": empty, "serie": pd.DataFrame()}
+
+        last = len(rolling) - 1
+        end_row = last if end is None else min(max(parse_month(end) - self.first_month, 0), last)
+        totals = rolling.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            shares = rolling * 100.0 / totals[:, None]
+
+        current = rolling[end_row]
+        # Empates em ordem alfabética, para a ordem não depender de quando cada valor apareceu na base
+        alphabetical = np.empty(len(self.values), dtype=np.int64)
+        alphabetical[self.values.argsort()] = np.arange(len(self.values))
+        top = np.lexsort((alphabetical, -current))[:top_n]
+        top = top[current[top] > 0]
+        previous_row = end_row - window
+        previous = shares[previous_row, top] if previous_row >= 0 else np.full(len(top), np.nan)
+        ranking = pd.DataFrame({
+            label: self.values[top],
+            "Emplacamentos": current[top],
+            "Participacao": shares[end_row, top].round(2),
+            "ParticipacaoAnterior": np.round(previous, 2),
+            "Variacao": np.round(shares[end_row, top] - previous, 2),
+        })
+        months = self.months
+        start_month = max(end_row - window + 1, 0)
+        return {
+            "periodo": months[end_row] if window == 1 else f"{months[start_month]} a {months[end_row]}",
+            "total": int(totals[end_row]),
+            "ranking": ranking,
+            "serie": pd.DataFrame(shares[:end_row + 1, top].round(2), index=pd.Index(months[:end_row + 1], name="AnoMes"),
+                                  columns=self.values[top]),
+        }
+
+
+class MarketShareCube:
+    """Contagens mensais por (concessionária, cidade, Marca, Segmento) e as séries de participação já pedidas."""
+
+    def __init__(self, counts, max_series=MAX_CACHED_VIEWS):
+        self.counts = counts
+        self.max_series = max_series
+        self._series = OrderedDict()  # (dimensão, assinatura dos filtros) -> ShareSeries
+        self._lock = threading.Lock()
+
+    def extend(self, delta_df):
+        """Nova versão somando as linhas de `delta_df` (o cubo atual não é alterado)."""
+        delta = market_counts(delta_df)
+        extended = MarketShareCube(merge_counts([self.counts, delta]), self.max_series)
+        with self._lock:
+            cached = list(self._series.items())
+        # Séries já montadas são atualizadas só com as contagens do extrato
+        for (dimension, signature), series in cached:
+            extended._series[(dimension, signature)] = series.extend(apply_filters(delta, *signature))
+        return extended
+
+    def series(self, dimension, brands=(), segments=()):
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Dimensão desconhecida: {dimension} (use {', '.join(DIMENSIONS)})")
+        key = (dimension, filter_signature(brands, segments))
+        with self._lock:
+            series = self._series.get(key)
+            if series is not None:
+                self._series.move_to_end(key)
+                return series
+        series = ShareSeries(apply_filters(self.counts, brands, segments), DIMENSIONS[dimension][0])
+        with self._lock:
+            self._series[key] = series
+            while len(self._series) > self.max_series:
+                self._series.popitem(last=False)
+        return series
+
+    def market_share(self, dimension, window=12, brands=(), segments=(), top_n=TOP_N, end=None):
+        """Ranking e série de participação da dimensão ("concessionaria" ou "cidade"); ver `ShareSeries.report`."""
+        return self.series(dimension, brands, segments).report(window, top_n, end, label=DIMENSIONS[dimension][1])
+
+
+def build_market_share_cube(df):
+    return MarketShareCube(market_counts(df))
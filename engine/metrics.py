@@ -0,0 +1,208 @@
+"""Instrumentação dos caminhos críticos: tempos e contadores por etapa e por rerun.
+
+Os trechos instrumentados usam `timed("etapa")` e `count("contador")`. Cada rerun
+do app abre uma execução (`start_run`) na thread do script e a fecha no fim
+(`finish_run`): o registro com os tempos das etapas, os contadores e a memória do
+processo vai para o painel de administração e, se configurado, para um arquivo
+JSON lines junto com os percentis de cada etapa no processo. Etapas executadas
+fora de um rerun (aquecimento, downloads) entram só nos percentis.
+
+Nada cresce sem limite: os percentis usam as últimas WINDOW_SIZE durações de
+cada etapa e, ao passar de MAX_LOG_BYTES, o arquivo de log vira `<arquivo>.1`
+(substituindo o anterior) e um novo é iniciado.
+
+Resumo de um arquivo de log:
+
+    python -m engine.metrics logs/metricas.jsonl
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Últimas durações guardadas por etapa para os percentis (por processo)
+WINDOW_SIZE = 1_000
+PERCENTILES = (50, 90, 99)
+# Tamanho do log a partir do qual ele é rotacionado (fica só um arquivo anterior)
+MAX_LOG_BYTES = 10 * 1024 * 1024
+
+
+def process_memory_mb():
+    """Memória residente atual do processo (ou o pico, onde /proc não existe). None se indisponível."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        # ru_maxrss: KB no Linux, bytes no macOS
+        scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    return None
+
+
+def percentiles(durations):
+    values = np.fromiter(durations, dtype=float)
+    stats = {f"p{p}": float(np.percentile(values, p)) for p in PERCENTILES}
+    stats["n"] = len(values)
+    return stats
+
+
+class Run:
+    """Tempos e contadores de um rerun."""
+
+    def __init__(self, session_id=None):
+        self.session_id = session_id
+        self.started = time.perf_counter()
+        self.memory_start_mb = process_memory_mb()
+        self.stages = {}  # etapa -> [segundos somados, chamadas]
+        self.counters = defaultdict(int)
+
+    def add(self, stage, seconds):
+        totals = self.stages.setdefault(stage, [0.0, 0])
+        totals[0] += seconds
+        totals[1] += 1
+
+
+class MetricsRecorder:
+    """Agregados por processo (janela de durações por etapa) e a execução corrente de cada thread."""
+
+    def __init__(self, log_path=None, window_size=WINDOW_SIZE, max_log_bytes=MAX_LOG_BYTES):
+        self.log_path = log_path
+        self.window_size = window_size
+        self.max_log_bytes = max_log_bytes
+        self._durations = defaultdict(lambda: deque(maxlen=self.window_size))
+        self._counters = defaultdict(int)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def current(self):
+        return getattr(self._local, "run", None)
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self._durations[stage].append(seconds)
+        run = self.current
+        if run is not None:
+            run.add(stage, seconds)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+        run = self.current
+        if run is not None:
+            run.counters[name] += n
+
+    @contextmanager
+    def timed(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def start_run(self, session_id=None):
+        """Abre a execução do rerun nesta thread (fechando uma anterior interrompida por st.stop)."""
+        if self.current is not None:
+            self.finish_run(interrupted=True)
+        self._local.run = Run(session_id)
+        return self._local.run
+
+    def finish_run(self, interrupted=False):
+        """Fecha a execução da thread, grava a linha no log e devolve o registro (ou None)."""
+        run = self.current
+        if run is None:
+            return None
+        self._local.run = None
+        memory_mb = process_memory_mb()
+        record = {
+            "data": datetime.now().isoformat(timespec="seconds"),
+            "sessao": run.session_id,
+            "total_s": time.perf_counter() - run.started,
+            "interrompida": interrupted,
+            "etapas": {stage: {"s": seconds, "n": calls} for stage, (seconds, calls) in run.stages.items()},
+            "contadores": dict(run.counters),
+            "memoria_mb": memory_mb,
+            "memoria_delta_mb": (
+                memory_mb - run.memory_start_mb if memory_mb is not None and run.memory_start_mb is not None else None
+            ),
+            "percentis": self.stage_percentiles(),
+        }
+        self.write(record)
+        return record
+
+    def stage_percentiles(self):
+        with self._lock:
+            snapshot = {stage: list(durations) for stage, durations in self._durations.items() if durations}
+        return {stage: percentiles(durations) for stage, durations in sorted(snapshot.items())}
+
+    def counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def write(self, record):
+        if not self.log_path:
+            return
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        try:
+            os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+            with self._lock:
+                if os.path.exists(self.log_path) and os.path.getsize(self.log_path) >= self.max_log_bytes:
+                    os.replace(self.log_path, self.log_path + ".1")
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+        except OSError as e:
+            # Falha no log nunca interrompe o app
+            print(f"Aviso: não foi possível gravar as métricas em {self.log_path}: {e}")
+
+
+# Instância única por processo, compartilhada pelas sessões (como o registro de datasets)
+METRICS = MetricsRecorder()
+
+
+def timed(stage):
+    return METRICS.timed(stage)
+
+
+def count(name, n=1):
+    METRICS.count(name, n)
+
+
+def summarize_log(path):
+    """Percentis por etapa (tempo total da etapa em cada rerun) a partir de um log JSON lines."""
+    durations = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            durations["total"].append(record["total_s"])
+            for stage, totals in record["etapas"].items():
+                durations[stage].append(totals["s"])
+    return {stage: percentiles(values) for stage, values in sorted(durations.items())}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print("Uso: python -m engine.metrics <arquivo.jsonl>", file=sys.stderr)
+        return 2
+    summary = summarize_log(argv[0])
+    print(f"{'etapa':<28} {'n':>6} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10}")
+    for stage, stats in summary.items():
+        print(f"{stage:<28} {stats['n']:>6} {stats['p50'] * 1000:>10.1f} {stats['p90'] * 1000:>10.1f} {stats['p99'] * 1000:>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+"""Previsão da próxima compra a partir do histórico de emplacamentos do cliente.
+
+`calculate_next_purchase_prediction` e `get_sales_pitch` atendem um cliente por vez.
+`predict_next_purchases` e `sales_pitch_buckets` fazem o mesmo cálculo para todos os
+clientes de uma vez (NumPy/pandas sobre ordinais de mês), com resultados idênticos
+aos das funções por cliente.
+"""
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+
+from engine.columns import COLUNA_CNPJ_NORMALIZADO, COLUNA_DATA
+
+MESES = ["Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho", "Julho", "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro"]
+
+TEXTO_HISTORICO_INSUFICIENTE = "Previsão não disponível (histórico insuficiente)."
+TEXTO_COMPRAS_PROXIMAS = "Previsão não disponível (compras muito próximas ou única)."
+
+# Faixas de urgência usadas por get_sales_pitch
+URGENCIA_SEM_HISTORICO = "Sem histórico"
+URGENCIA_ATRASADA = "🚨 Urgente"
+URGENCIA_QUENTE = "📈 Quente"
+URGENCIA_PLANEJAR = "🗓️ Planejar"
+URGENCIA_MANTER = "⏳ Manter relacionamento"
+URGENCIA_SUMICO = "🚨 Sumiço (18+ meses)"
+URGENCIA_SUMIDO = "👀 Sumido (12+ meses)"
+URGENCIA_FOLLOW_UP = "⏳ Follow-up (6+ meses)"
+URGENCIA_FIEL = "👍 Cliente fiel"
+URGENCIA_RECENTE = "✅ Compra recente"
+
+
+def format_month_year(date):
+    return f"{MESES[date.month - 1]} de {date.year}"
+
+
+def calculate_next_purchase_prediction(valid_purchase_dates):
+    if not valid_purchase_dates or len(valid_purchase_dates) < 2:
+        return TEXTO_HISTORICO_INSUFICIENTE, None
+
+    valid_purchase_dates.sort()
+    last_purchase_date = valid_purchase_dates[-1]
+    intervals_months = []
+    for i in range(1, len(valid_purchase_dates)):
+        delta = relativedelta(valid_purchase_dates[i], valid_purchase_dates[i-1])
+        months_diff = delta.years * 12 + delta.months
+        days_diff = delta.days
+        if months_diff > 0:
+            intervals_months.append(months_diff)
+        elif months_diff == 0 and days_diff > 0:
+             intervals_months.append(0.5)
+
+    if not intervals_months:
+         return TEXTO_COMPRAS_PROXIMAS, last_purchase_date
+
+    avg_interval_months = sum(intervals_months) / len(intervals_months)
+    if avg_interval_months < 1:
+        avg_interval_months = 1
+
+    predicted_next_date = last_purchase_date + relativedelta(months=int(round(avg_interval_months)))
+
+    prediction_text = f"Próxima compra provável em: **{format_month_year(predicted_next_date)}**"
+
+    return prediction_text, predicted_next_date
+
+
+def sales_pitch_bucket(last_purchase_date, predicted_next_date, total_purchases, today=None):
+    """Faixa de urgência do cliente (mesmas regras de get_sales_pitch)."""
+    if today is None:
+        today = pd.Timestamp.now().normalize()
+    if not last_purchase_date:
+        return URGENCIA_SEM_HISTORICO
+
+    if not isinstance(last_purchase_date, pd.Timestamp):
+        last_purchase_date = pd.to_datetime(last_purchase_date)
+
+    if predicted_next_date and isinstance(predicted_next_date, pd.Timestamp):
+        delta_to_next = relativedelta(predicted_next_date, today)
+        months_to_next = delta_to_next.years * 12 + delta_to_next.months
+        if months_to_next < 0 or (months_to_next == 0 and delta_to_next.days < 0):
+            return URGENCIA_ATRASADA
+        elif months_to_next <= 2:
+            return URGENCIA_QUENTE
+        elif months_to_next <= 6:
+            return URGENCIA_PLANEJAR
+        return URGENCIA_MANTER
+
+    delta_since_last = relativedelta(today, last_purchase_date)
+    months_since_last = delta_since_last.years * 12 + delta_since_last.months
+    if months_since_last >= 18:
+        return URGENCIA_SUMICO
+    elif months_since_last >= 12:
+        return URGENCIA_SUMIDO
+    elif months_since_last >= 6:
+        return URGENCIA_FOLLOW_UP
+    elif total_purchases > 3:
+        return URGENCIA_FIEL
+    return URGENCIA_RECENTE
+
+
+def get_sales_pitch(last_purchase_date, predicted_next_date, total_purchases):
+    today = pd.Timestamp.now().normalize()
+    bucket = sales_pitch_bucket(last_purchase_date, predicted_next_date, total_purchases, today)
+    if bucket == URGENCIA_SEM_HISTORICO:
+        return "Primeira vez? 🤔 Sem histórico de compras registrado para este cliente."
+
+    if not isinstance(last_purchase_date, pd.Timestamp):
+        last_purchase_date = pd.to_datetime(last_purchase_date)
+
+    delta_since_last = relativedelta(today, last_purchase_date)
+    months_since_last = delta_since_last.years * 12 + delta_since_last.months
+    last_purchase_str = last_purchase_date.strftime("%d/%m/%Y")
+    predicted_month_year = format_month_year(predicted_next_date) if isinstance(predicted_next_date, pd.Timestamp) else None
+
+    if bucket == URGENCIA_ATRASADA:
+        return f"🚨 **Atenção!** A compra prevista para **{predicted_month_year}** pode estar próxima ou já passou! Última compra em {last_purchase_str}. Contato urgente!"
+    elif bucket == URGENCIA_QUENTE:
+        return f"📈 **Oportunidade Quente!** Próxima compra prevista para **{predicted_month_year}**. Ótimo momento para contato! Última compra em {last_purchase_str}."
+    elif bucket == URGENCIA_PLANEJAR:
+        return f"🗓️ **Planeje-se!** Próxima compra prevista para **{predicted_month_year}**. Prepare sua abordagem! Última compra em {last_purchase_str}."
+    elif bucket == URGENCIA_MANTER:
+        return f"⏳ Compra prevista para **{predicted_month_year}**. Mantenha o relacionamento aquecido! Última compra em {last_purchase_str}."
+    elif bucket == URGENCIA_SUMICO:
+        return f"🚨 Alerta de sumiço! Faz {months_since_last} meses desde a última compra ({last_purchase_str}). Hora de reativar esse cliente! 📞"
+    elif bucket == URGENCIA_SUMIDO:
+        return f"👀 E aí, sumido! Faz {months_since_last} meses desde a última compra ({last_purchase_str}). Que tal um alô para esse cliente?"
+    elif bucket == URGENCIA_FOLLOW_UP:
+        return f"⏳ Já se passaram {months_since_last} meses... ({last_purchase_str}). Bom momento para um follow-up e mostrar as novidades!"
+    elif bucket == URGENCIA_FIEL:
+         return f"👍 Cliente fiel ({total_purchases} compras)! Última compra em {last_purchase_str}. Mantenha o bom trabalho!"
+    else:
+        return f"✅ Compra recente ({last_purchase_str}). Ótimo para fortalecer o relacionamento!"
+
+
+# --- Versões vetorizadas (todos os clientes de uma vez) ---
+
+def add_months(dates, months):
+    """Soma `months` meses a cada data, limitando o dia ao fim do mês (como relativedelta)."""
+    values = np.asarray(dates)
+    month_ordinal = values.astype("datetime64[M]").astype(np.int64)
+    day_start = values.astype("datetime64[D]")
+    day_index = (day_start - values.astype("datetime64[M]").astype("datetime64[D]")).astype(np.int64)
+    time_of_day = values - day_start
+
+    target = month_ordinal + np.asarray(months, dtype=np.int64)
+    target_start = target.astype("datetime64[M]").astype("datetime64[D]")
+    days_in_month = ((target + 1).astype("datetime64[M]").astype("datetime64[D]") - target_start).astype(np.int64)
+    day_index = np.minimum(day_index, days_in_month - 1)
+    return (target_start + day_index.astype("timedelta64[D]")).astype(values.dtype) + time_of_day
+
+
+def relativedelta_months_days(dt1, dt2):
+    """Equivalente vetorizado de (rd.years * 12 + rd.months, rd.days) para rd = relativedelta(dt1, dt2)."""
+    dt1 = np.asarray(dt1)
+    dt2 = np.asarray(dt2).astype(dt1.dtype)
+    months = (dt1.astype("datetime64[M]").astype(np.int64) - dt2.astype("datetime64[M]").astype(np.int64))
+    shifted = add_months(dt2, months)
+    forward = dt1 >= dt2
+    months = months - (forward & (dt1 < shifted)) + (~forward & (dt1 > shifted))
+    residual_seconds = np.floor((dt1 - add_months(dt2, months)) / np.timedelta64(1, "s")).astype(np.int64)
+    days = np.sign(residual_seconds) * (np.abs(residual_seconds) // 86400)
+    return months, days
+
+
+def predict_next_purchases(df):
+    """Previsão de próxima compra de todos os clientes, igual a calculate_next_purchase_prediction.
+
+    Retorna um DataFrame indexado por CNPJ_NORMALIZED com IntervaloMedioMeses,
+    ProximaCompraPrevista e PrevisaoTexto.
+    """
+    purchases = df[[COLUNA_CNPJ_NORMALIZADO, COLUNA_DATA]].dropna(subset=[COLUNA_DATA])
+    purchases = purchases.sort_values([COLUNA_CNPJ_NORMALIZADO, COLUNA_DATA], kind="stable")
+    clients = purchases[COLUNA_CNPJ_NORMALIZADO].to_numpy()
+    dates = purchases[COLUNA_DATA].to_numpy()
+
+    # Intervalos entre compras consecutivas do mesmo cliente
+    same_client = np.zeros(len(clients), dtype=bool)
+    same_client[1:] = clients[1:] == clients[:-1]
+    months, days = relativedelta_months_days(dates[1:], dates[:-1])
+    intervals = np.where(months > 0, months, np.where((months == 0) & (days > 0), 0.5, np.nan))
+    intervals = pd.Series(np.where(same_client[1:], intervals, np.nan)).groupby(clients[1:])
+
+    by_client = purchases.groupby(COLUNA_CNPJ_NORMALIZADO, sort=False)[COLUNA_DATA]
+    result = pd.DataFrame({"TotalDatas": by_client.size(), "UltimaData": by_client.max()})
+    result["IntervaloMedioMeses"] = intervals.sum(min_count=1) / intervals.count()
+
+    has_history = result["TotalDatas"] >= 2
+    has_interval = has_history & result["IntervaloMedioMeses"].notna()
+    rounded = np.rint(result["IntervaloMedioMeses"].clip(lower=1).fillna(0)).astype(np.int64)
+
+    predicted = pd.Series(pd.NaT, index=result.index, dtype=result["UltimaData"].dtype)
+    predicted[has_interval] = add_months(result.loc[has_interval, "UltimaData"].to_numpy(), rounded[has_interval].to_numpy())
+    # Mesmo comportamento da função por cliente: sem intervalos válidos, devolve a última compra
+    predicted[has_history & ~has_interval] = result.loc[has_history & ~has_interval, "UltimaData"]
+    result["ProximaCompraPrevista"] = predicted
+
+    result["PrevisaoTexto"] = TEXTO_HISTORICO_INSUFICIENTE
+    result.loc[has_history & ~has_interval, "PrevisaoTexto"] = TEXTO_COMPRAS_PROXIMAS
+    month_names = np.asarray(MESES, dtype=object)[predicted[has_interval].dt.month.to_numpy() - 1]
+    result.loc[has_interval, "PrevisaoTexto"] = (
+        "Próxima compra provável em: **" + month_names + " de "
+        + predicted[has_interval].dt.year.astype(str).to_numpy() + "**"
+    )
+    result.loc[~has_interval, "IntervaloMedioMeses"] = np.nan
+    return result[["IntervaloMedioMeses", "ProximaCompraPrevista", "PrevisaoTexto"]]
+
+
+def sales_pitch_buckets(last_purchase_dates, predicted_next_dates, total_purchases, today=None):
+    """Faixa de urgência de todos os clientes de uma vez (mesmas regras de sales_pitch_bucket)."""
+    if today is None:
+        today = pd.Timestamp.now().normalize()
+    last = pd.Series(last_purchase_dates)
+    predicted = pd.Series(predicted_next_dates, index=last.index)
+    totals = pd.Series(total_purchases, index=last.index)
+    today_values = np.full(len(last), np.datetime64(today.to_datetime64(), "us"))
+
+    has_prediction = predicted.notna().to_numpy()
+    predicted_values = predicted.to_numpy(dtype="datetime64[us]")
+    months_to_next, days_to_next = relativedelta_months_days(np.where(has_prediction, predicted_values, today_values), today_values)
+    last_values = last.to_numpy(dtype="datetime64[us]")
+    has_last = last.notna().to_numpy()
+    months_since_last, _ = relativedelta_months_days(today_values, np.where(has_last, last_values, today_values))
+
+    conditions = [
+        ~has_last,
+        has_prediction & ((months_to_next < 0) | ((months_to_next == 0) & (days_to_next < 0))),
+        has_prediction & (months_to_next <= 2),
+        has_prediction & (months_to_next <= 6),
+        has_prediction,
+        months_since_last >= 18,
+        months_since_last >= 12,
+        months_since_last >= 6,
+        totals.to_numpy() > 3,
+    ]
+    choices = [
+        URGENCIA_SEM_HISTORICO, URGENCIA_ATRASADA, URGENCIA_QUENTE, URGENCIA_PLANEJAR, URGENCIA_MANTER,
+        URGENCIA_SUMICO, URGENCIA_SUMIDO, URGENCIA_FOLLOW_UP, URGENCIA_FIEL,
+    ]
+    return pd.Series(np.select(conditions, choices, default=URGENCIA_RECENTE), index=last.index)
@@ -0,0 +1,144 @@
+"""Tabela de perfis de clientes (uma linha por CNPJ) calculada de uma vez só.
+
+A visão de detalhe do cliente passa a ser uma consulta de linha nesta tabela, em
+vez de refazer filtros, ordenações, modas e previsão a cada busca.
+"""
+import numpy as np
+import pandas as pd
+
+from engine.columns import (
+    COLUNA_CNPJ,
+    COLUNA_CNPJ_NORMALIZADO,
+    COLUNA_DATA,
+    COLUNA_NOME,
+    NOME_COLUNA_CIDADE,
+    NOME_COLUNA_CONCESSIONARIO,
+    NOME_COLUNA_ENDERECO,
+    NOME_COLUNA_TELEFONE,
+)
+from engine.prediction import TEXTO_HISTORICO_INSUFICIENTE, add_months, predict_next_purchases, sales_pitch_buckets
+from engine.views import apply_filters
+
+INVALID_MODE_VALUES = ["N/A", "nan", ""]
+LATEST_RECORD_COLUMNS = [COLUNA_NOME, COLUNA_CNPJ, NOME_COLUNA_ENDERECO, NOME_COLUNA_TELEFONE, NOME_COLUNA_CIDADE]
+MODE_COLUMNS = {
+    "ModelosPreferidos": "Modelo",
+    "MarcasPreferidas": "Marca",
+    "ConcessionariasPreferidas": NOME_COLUNA_CONCESSIONARIO,
+}
+# Colunas dos emplacamentos lidas por build_client_profiles
+PROFILE_SOURCE_COLUMNS = [COLUNA_DATA, COLUNA_CNPJ_NORMALIZADO] + LATEST_RECORD_COLUMNS + list(MODE_COLUMNS.values())
+
+
+def get_modes(series):
+    """Valores mais frequentes da série (empates em ordem alfabética), ignorando vazios e "N/A"."""
+    # value_counts conta direto sobre os códigos quando a coluna é categórica
+    counts = series.value_counts(dropna=True)
+    counts = counts[counts > 0]
+    counts = counts[~counts.index.astype(str).isin(INVALID_MODE_VALUES)]
+    if counts.empty:
+        return ["N/A"]
+    max_count = counts.max()
+    return sorted(str(item) for item in counts.index[counts == max_count])
+
+
+def modes_by_client(df, col):
+    """Valores mais frequentes de `col` por cliente (empates em ordem alfabética), como get_modes."""
+    values = df[col]
+    valid = values.notna() & ~values.astype(str).isin(INVALID_MODE_VALUES)
+    counts = df.loc[valid].groupby([COLUNA_CNPJ_NORMALIZADO, col], observed=True).size()
+    counts = counts[counts > 0]
+    top = counts[counts == counts.groupby(level=0).transform("max")].reset_index()
+    top[col] = top[col].astype(str)
+    top = top.sort_values([COLUNA_CNPJ_NORMALIZADO, col])
+    modes = top.groupby(COLUNA_CNPJ_NORMALIZADO, sort=False)[col].agg(list)
+    clients = df[COLUNA_CNPJ_NORMALIZADO].unique()
+    return modes.reindex(clients).apply(lambda items: items if isinstance(items, list) else ["N/A"])
+
+
+def build_client_profiles(df):
+    """Monta a tabela de perfis indexada por CNPJ_NORMALIZED.
+
+    Colunas: PrimeiraCompra, UltimaCompra, TotalCompras, as modas de modelo/marca/
+    concessionária, os dados cadastrais do registro mais recente e a previsão de
+    próxima compra (IntervaloMedioMeses, ProximaCompraPrevista, PrevisaoTexto).
+    """
+    if df.empty:
+        return pd.DataFrame(index=pd.Index([], name=COLUNA_CNPJ_NORMALIZADO))
+
+    by_client = df.groupby(COLUNA_CNPJ_NORMALIZADO, sort=False)
+    profiles = pd.DataFrame({
+        "PrimeiraCompra": by_client[COLUNA_DATA].min(),
+        "UltimaCompra": by_client[COLUNA_DATA].max(),
+        "TotalCompras": by_client.size(),
+    })
+
+    # Dados cadastrais do emplacamento mais recente de cada cliente
+    latest = df.sort_values(COLUNA_DATA, kind="stable").groupby(COLUNA_CNPJ_NORMALIZADO, sort=False).tail(1)
+    latest = latest.set_index(COLUNA_CNPJ_NORMALIZADO)[LATEST_RECORD_COLUMNS]
+    profiles = profiles.join(latest)
+
+    for profile_col, source_col in MODE_COLUMNS.items():
+        profiles[profile_col] = modes_by_client(df, source_col)
+
+    profiles = profiles.join(predict_next_purchases(df))
+    profiles["PrevisaoTexto"] = profiles["PrevisaoTexto"].fillna(TEXTO_HISTORICO_INSUFICIENTE)
+    return profiles
+
+
+def hot_opportunities(profiles, months_ahead, include_overdue=False, today=None):
+    """Clientes cuja próxima compra prevista cai nos próximos `months_ahead` meses, ordenados pela data.
+
+    Só entram clientes com previsão de fato (intervalo médio calculado). Com
+    `include_overdue`, entram também as previsões que já venceram.
+    """
+    if today is None:
+        today = pd.Timestamp.now().normalize()
+    if profiles.empty:
+        return pd.DataFrame()
+    predicted = profiles["ProximaCompraPrevista"]
+    window_end = pd.Timestamp(add_months(np.array([today.to_datetime64()]), months_ahead)[0])
+    in_window = profiles["IntervaloMedioMeses"].notna() & (predicted < window_end)
+    if not include_overdue:
+        in_window &= predicted >= today
+    selected = profiles[in_window]
+
+    result = selected[[COLUNA_NOME, COLUNA_CNPJ, NOME_COLUNA_CIDADE, "UltimaCompra", "TotalCompras",
+                       "IntervaloMedioMeses", "ProximaCompraPrevista"]].copy()
+    result["Urgencia"] = sales_pitch_buckets(
+        selected["UltimaCompra"], selected["ProximaCompraPrevista"], selected["TotalCompras"], today
+    )
+    result["IntervaloMedioMeses"] = result["IntervaloMedioMeses"].round(1)
+    return result.sort_values(["ProximaCompraPrevista", "TotalCompras"], ascending=[True, False])
+
+
+def update_client_profiles(profiles, new_df, delta_df, client_rows, brands=(), segments=()):
+    """Nova tabela de perfis após acrescentar `delta_df`, recalculando só os clientes do extrato.
+
+    `client_rows` é o índice CNPJ -> posições das linhas da NOVA versão do dataset, de
+    modo que o custo depende do histórico dos clientes afetados e não da base inteira.
+    """
+    affected = pd.unique(delta_df[COLUNA_CNPJ_NORMALIZADO])
+    positions = [client_rows[cnpj] for cnpj in affected if cnpj in client_rows]
+    if not positions:
+        return profiles
+    affected_df = apply_filters(new_df.iloc[np.sort(np.concatenate(positions))], brands, segments)
+    kept = profiles.drop(index=affected, errors="ignore")
+    return pd.concat([kept, build_client_profiles(affected_df)])
+
+
+def purchase_history(client_rows):
+    """Emplacamentos do cliente por mês (colunas AnoMes 'aaaa-mm' e Quantidade)."""
+    history = client_rows.groupby(client_rows[COLUNA_DATA].dt.to_period("M")).size()
+    history = history.rename_axis("AnoMes").reset_index(name="Quantidade")
+    history["AnoMes"] = history["AnoMes"].astype(str)
+    return history
+
+
+def plate_details(client_rows):
+    """Tabela do "Detalhamento dos Emplacamentos": mais recentes primeiro, data em dd/mm/aaaa."""
+    details = client_rows.sort_values(by=COLUNA_DATA, ascending=False)
+    details = details[[COLUNA_DATA, "PLACA", "Chassi", "Modelo", NOME_COLUNA_CONCESSIONARIO]].copy()
+    details[COLUNA_DATA] = details[COLUNA_DATA].dt.strftime("%d/%m/%Y")
+    details.columns = ["Data", "Placa", "Chassi", "Modelo", "Concessionária"]
+    return details
@@ -0,0 +1,132 @@
+"""Matrizes esparsas de compras por cliente (cliente × mês e cliente × modelo/marca).
+
+Montadas uma vez por versão do dataset (e combinação de filtros), com uma linha
+por CNPJ. O histórico mensal do cliente vira a fatia da linha dele na matriz
+cliente × mês, em vez de um groupby a cada busca, e os "clientes com frota
+parecida" saem de um único produto da matriz de composição da frota (modelos e
+marcas, normalizada por cliente) pelo vetor do cliente consultado.
+"""
+import numpy as np
+import pandas as pd
+
+from engine.columns import COLUNA_CNPJ_NORMALIZADO, COLUNA_DATA
+from engine.profiles import INVALID_MODE_VALUES
+
+# Quantidade padrão de clientes parecidos listados
+SIMILAR_LIMIT = 10
+
+
+def month_numbers(dates):
+    """Mês de cada data como inteiro (ano * 12 + mês - 1); -1 para datas ausentes."""
+    dates = pd.Series(dates, copy=False)
+    valid = dates.notna().to_numpy()
+    months = np.full(len(dates), -1, dtype=np.int64)
+    months[valid] = dates[valid].dt.year.to_numpy() * 12 + dates[valid].dt.month.to_numpy() - 1
+    return months
+
+
+def month_label(month_number):
+    return f"{month_number // 12:04d}-{month_number % 12 + 1:02d}"
+
+
+def count_matrix(row_codes, col_codes, n_rows, n_cols):
+    """Matriz CSR com a contagem de cada par (linha, coluna); códigos negativos são ignorados."""
+    # Importado só quando uma matriz é montada (carregar a base e os índices dispensa o scipy)
+    from scipy import sparse
+
+    valid = (row_codes >= 0) & (col_codes >= 0)
+    data = np.ones(int(valid.sum()), dtype=np.int32)
+    # Pares repetidos são somados na conversão para CSR
+    return sparse.coo_matrix((data, (row_codes[valid], col_codes[valid])), shape=(n_rows, n_cols)).tocsr()
+
+
+def value_codes(values):
+    """Códigos (factorize) dos valores de uma coluna, com -1 para vazios e "N/A" (como nas modas dos perfis)."""
+    codes, uniques = pd.factorize(pd.Series(values, copy=False).astype(str))
+    invalid = np.flatnonzero(pd.Index(uniques).isin(INVALID_MODE_VALUES))
+    codes[np.isin(codes, invalid)] = -1
+    return codes, pd.Index(uniques)
+
+
+def normalize_rows(matrix, norm="l2"):
+    """Cada linha dividida pela sua soma ("l1") ou norma euclidiana ("l2"); linhas vazias ficam zeradas."""
+    from scipy import sparse
+
+    matrix = matrix.astype(np.float64)
+    if norm == "l1":
+        sizes = np.asarray(matrix.sum(axis=1)).ravel()
+    else:
+        sizes = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    scale = np.divide(1.0, sizes, out=np.zeros_like(sizes), where=sizes > 0)
+    return sparse.diags(scale) @ matrix
+
+
+class PurchaseMatrix:
+    """Contagens de emplacamentos por cliente: por mês (`by_month`), por modelo (`by_model`) e por marca (`by_brand`)."""
+
+    def __init__(self, df):
+        from scipy import sparse
+
+        client_codes, clients = pd.factorize(df[COLUNA_CNPJ_NORMALIZADO].astype(str))
+        self.clients = pd.Index(clients, name=COLUNA_CNPJ_NORMALIZADO)
+        n_clients = len(self.clients)
+
+        months = month_numbers(df[COLUNA_DATA])
+        dated = months >= 0
+        self.first_month = int(months[dated].min()) if dated.any() else 0
+        n_months = int(months[dated].max()) - self.first_month + 1 if dated.any() else 0
+        month_codes = np.where(dated, months - self.first_month, -1)
+        self.by_month = count_matrix(client_codes, month_codes, n_clients, n_months)
+
+        model_codes, self.models = value_codes(df["Modelo"])
+        self.by_model = count_matrix(client_codes, model_codes, n_clients, len(self.models))
+        brand_codes, self.brands = value_codes(df["Marca"])
+        self.by_brand = count_matrix(client_codes, brand_codes, n_clients, len(self.brands))
+
+        # Composição da frota: participação de cada modelo e de cada marca (pesos iguais),
+        # com norma 1 por linha para que o produto escalar seja a similaridade do cosseno
+        self._fleet_vectors = normalize_rows(
+            sparse.hstack([normalize_rows(self.by_model, "l1"), normalize_rows(self.by_brand, "l1")], format="csr")
+        )
+
+    def __len__(self):
+        return len(self.clients)
+
+    def _row(self, cnpj):
+        position = self.clients.get_indexer([cnpj])[0]
+        return None if position < 0 else int(position)
+
+    def history(self, cnpj):
+        """Emplacamentos do cliente por mês (colunas AnoMes 'aaaa-mm' e Quantidade), como `purchase_history`."""
+        row = self._row(cnpj)
+        if row is None:
+            return pd.DataFrame({"AnoMes": pd.Series(dtype=str), "Quantidade": pd.Series(dtype=np.int64)})
+        start, stop = self.by_month.indptr[row], self.by_month.indptr[row + 1]
+        # Índices de uma linha CSR canônica já vêm em ordem crescente de mês
+        month_codes = self.by_month.indices[start:stop]
+        return pd.DataFrame({
+            "AnoMes": [month_label(self.first_month + int(code)) for code in month_codes],
+            "Quantidade": self.by_month.data[start:stop].astype(np.int64),
+        })
+
+    def similar(self, cnpj, limit=SIMILAR_LIMIT):
+        """Similaridade (0 a 1) dos `limit` clientes com frota mais parecida com a do cliente, indexada por CNPJ.
+
+        Compara a participação de cada modelo e marca na frota (similaridade do
+        cosseno), sem considerar o próprio cliente nem clientes sem nada em comum.
+        """
+        row = self._row(cnpj)
+        if row is None or limit <= 0:
+            return pd.Series(dtype=np.float64, index=self.clients[:0])
+        vector = self._fleet_vectors[row].toarray().ravel()
+        scores = self._fleet_vectors @ vector
+        scores[row] = 0.0
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return pd.Series(np.minimum(scores[candidates], 1.0), index=self.clients[candidates])
+
+
+def build_purchase_matrix(df):
+    return PurchaseMatrix(df)
@@ -0,0 +1,63 @@
+"""Índice de recência de clientes para a lista de "Clientes Inativos".
+
+Os clientes ficam ordenados pela data da última compra. Como "meses sem comprar"
+só depende dessa data, uma faixa de inatividade (ex.: 12 a 24 meses) vira um
+intervalo contíguo do índice, encontrado com busca binária; só a página exibida
+é materializada.
+"""
+import numpy as np
+import pandas as pd
+
+from engine.columns import COLUNA_CNPJ, COLUNA_NOME, NOME_COLUNA_CIDADE
+
+DIAS_POR_MES = 30
+RECENCY_COLUMNS = [COLUNA_NOME, COLUNA_CNPJ, NOME_COLUNA_CIDADE, "UltimaCompra", "TotalCompras"]
+
+
+class RecencyIndex:
+    """Clientes (um por CNPJ) ordenados da compra mais antiga para a mais recente."""
+
+    def __init__(self, profiles):
+        if profiles.empty:
+            table = pd.DataFrame(columns=RECENCY_COLUMNS)
+        else:
+            table = profiles.loc[profiles["UltimaCompra"].notna(), RECENCY_COLUMNS]
+            table = table.sort_values("UltimaCompra", kind="stable")
+        self.table = table
+        self._last_purchase = pd.to_datetime(table["UltimaCompra"]).to_numpy()
+
+    def __len__(self):
+        return len(self.table)
+
+    def inactive_range(self, min_months, max_months=None, today=None, exclude_current_year=True):
+        """Intervalo [início, fim) dos clientes com `min_months` a `max_months` meses sem comprar.
+
+        Meses sem comprar = dias desde a última compra // 30. Com `exclude_current_year`,
+        ficam de fora os clientes que já compraram no ano corrente.
+        """
+        if today is None:
+            today = pd.Timestamp.now()
+        last = self._last_purchase
+        # meses >= min  <=>  última compra <= hoje - min * 30 dias
+        stop = np.searchsorted(last, (today - pd.Timedelta(days=DIAS_POR_MES * min_months)).to_datetime64(), side="right")
+        if exclude_current_year:
+            year_start = pd.Timestamp(year=today.year, month=1, day=1).to_datetime64()
+            stop = min(stop, np.searchsorted(last, year_start, side="left"))
+        start = 0
+        if max_months is not None:
+            # meses <= max  <=>  última compra > hoje - (max + 1) * 30 dias
+            limit = (today - pd.Timedelta(days=DIAS_POR_MES * (max_months + 1))).to_datetime64()
+            start = np.searchsorted(last, limit, side="right")
+        return int(start), int(max(start, stop))
+
+    def rows(self, start, stop, today=None):
+        """Clientes das posições [start, stop) com a coluna MesesSemCompra calculada."""
+        if today is None:
+            today = pd.Timestamp.now()
+        page = self.table.iloc[start:stop].reset_index(drop=True)
+        page["MesesSemCompra"] = ((today - page["UltimaCompra"]) / pd.Timedelta(days=DIAS_POR_MES)).astype(int)
+        return page
+
+
+def build_recency_index(profiles):
+    return RecencyIndex(profiles)
@@ -0,0 +1,152 @@
+"""Registro de datasets compartilhado por todas as sessões do processo.
+
+Cada dataset é identificado pela chave de conteúdo (a mesma do snapshot) e é
+carregado uma única vez por processo. As sessões guardam apenas a chave e
+"arrendam" o dataset a cada rerun; entradas sem nenhuma sessão ativa dentro do
+TTL são descartadas (e voltam rapidamente do snapshot em disco se necessário).
+"""
+import threading
+import time
+
+SESSION_TTL_SECONDS = 30 * 60
+
+
+class DatasetEntry:
+    """Um dataset carregado, as sessões que o estão usando e as estruturas derivadas dele."""
+
+    def __init__(self, key, df, source_name=None):
+        self.key = key
+        self._df = df
+        self.source_name = source_name
+        self.last_used = time.monotonic()
+        self.sessions = {}  # session_id -> último acesso (monotonic)
+        self.derived = {}  # índices/agregados construídos sobre este dataset
+
+    @property
+    def df(self):
+        # Cópia rasa: não duplica os dados, só a lista de colunas, então colunas
+        # acrescentadas ou trocadas por uma sessão não aparecem no DataFrame
+        # compartilhado. Escrever valores ainda custa cópia: o Copy-on-Write do
+        # pandas copia a coluna alterada na primeira escrita.
+        return self._df.copy(deep=False)
+
+    def __len__(self):
+        return len(self._df)
+
+    def column(self, name):
+        """Uma coluna do DataFrame compartilhado, sem a cópia de `df` (para leitura)."""
+        return self._df[name]
+
+
+class DatasetRegistry:
+    """Datasets imutáveis indexados pela chave de conteúdo, com contagem de sessões e TTL."""
+
+    def __init__(self, ttl_seconds=SESSION_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._entries = {}
+        self._lock = threading.RLock()
+        self._key_locks = {}
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def keys(self):
+        with self._lock:
+            return list(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key, df, source_name=None, derived=None):
+        """Registra o DataFrame sob a chave; se já existir, mantém a entrada atual.
+
+        `derived` permite registrar estruturas derivadas já prontas (ex.: índices
+        atualizados incrementalmente a partir da versão anterior).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = DatasetEntry(key, df, source_name)
+                entry.derived.update(derived or {})
+                self._entries[key] = entry
+            return entry
+
+    def get_or_load(self, key, loader, source_name=None):
+        """Retorna a entrada da chave, chamando `loader()` uma única vez por processo se necessário.
+
+        Sessões concorrentes pedindo a mesma chave esperam o primeiro carregamento em vez
+        de lerem o arquivo em paralelo. Retorna None se `loader` devolver None; exceções
+        de `loader` são propagadas.
+        """
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        try:
+            with key_lock:
+                entry = self.get(key)
+                if entry is None:
+                    df = loader()
+                    if df is not None:
+                        entry = self.put(key, df, source_name)
+        finally:
+            with self._lock:
+                self._key_locks.pop(key, None)
+        return entry
+
+    def acquire(self, key, session_id):
+        """Marca a sessão como usuária da chave e libera a chave que ela usava antes."""
+        now = time.monotonic()
+        with self._lock:
+            for other_key, entry in self._entries.items():
+                if other_key != key:
+                    entry.sessions.pop(session_id, None)
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.sessions[session_id] = now
+                entry.last_used = now
+            self._evict_idle(now)
+            return entry
+
+    def release(self, key, session_id):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.sessions.pop(session_id, None)
+
+    def evict_idle(self):
+        with self._lock:
+            self._evict_idle(time.monotonic())
+
+    def _evict_idle(self, now):
+        for key, entry in list(self._entries.items()):
+            stale = [sid for sid, seen in entry.sessions.items() if now - seen > self.ttl_seconds]
+            for sid in stale:
+                del entry.sessions[sid]
+            if not entry.sessions and now - entry.last_used > self.ttl_seconds:
+                del self._entries[key]
+                print(f"Dataset '{key}' descartado da memória (sem sessões ativas).")
+
+    def get_derived(self, key, name, builder):
+        """Retorna a estrutura derivada `name` do dataset, construindo-a uma única vez por versão.
+
+        `builder` recebe o DataFrame compartilhado. Como a chave muda a cada versão dos
+        dados, índices e agregados nunca ficam desatualizados.
+        """
+        entry = self.get(key)
+        if entry is None:
+            raise KeyError(key)
+        with self._lock:
+            if name in entry.derived:
+                return entry.derived[name]
+        value = builder(entry._df)
+        with self._lock:
+            return entry.derived.setdefault(name, value)
+
+
+# Instância única por processo: o Streamlit reexecuta app.py a cada rerun, mas os
+# módulos importados (e portanto este registro) permanecem vivos entre sessões.
+DATASETS = DatasetRegistry()
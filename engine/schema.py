@@ -0,0 +1,68 @@
+"""Esquema compacto do DataFrame de emplacamentos.
+
+As colunas de baixa cardinalidade repetem as mesmas poucas centenas de textos em
+todas as linhas; como categóricas elas guardam só um código inteiro por linha, e
+filtros (`isin`), `groupby` e contagens passam a operar sobre esses códigos.
+"""
+import pandas as pd
+
+from engine.columns import COLUNA_DATA, NOME_COLUNA_CIDADE, NOME_COLUNA_CONCESSIONARIO
+
+CATEGORICAL_COLUMNS = ["Marca", "Segmento", "Modelo", NOME_COLUNA_CONCESSIONARIO, NOME_COLUNA_CIDADE]
+SMALL_INT_COLUMNS = {"Ano": "int16", "Mes": "int8"}
+DATE_COLUMN = COLUNA_DATA
+
+
+def memory_usage_mb(df):
+    """Memória total do DataFrame em MB (incluindo o conteúdo dos textos)."""
+    return df.memory_usage(deep=True).sum() / (1024 * 1024)
+
+
+def compact_dtypes(df):
+    """Converte as colunas repetitivas para categóricas e Ano/Mes para inteiros pequenos.
+
+    As colunas são trocadas no próprio `df` (sem cópia do DataFrame inteiro; só as
+    colunas convertidas ganham arrays novos). Retorna (df, relatório) com o uso de
+    memória antes e depois da conversão.
+    """
+    before_mb = memory_usage_mb(df)
+
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+
+    for col, dtype in SMALL_INT_COLUMNS.items():
+        if col in df.columns and not df[col].isna().any():
+            df[col] = df[col].astype(dtype)
+
+    # Ano/Mes são apenas projeções da data; a data fica numa única coluna datetime64
+    if DATE_COLUMN in df.columns and not pd.api.types.is_datetime64_any_dtype(df[DATE_COLUMN]):
+        df[DATE_COLUMN] = pd.to_datetime(df[DATE_COLUMN], errors="coerce")
+
+    after_mb = memory_usage_mb(df)
+    report = {"before_mb": before_mb, "after_mb": after_mb}
+    print(f"Esquema compacto: {before_mb:.1f} MB -> {after_mb:.1f} MB")
+    return df, report
+
+
+def concat_frames(frames):
+    """Concatena DataFrames normalizados mantendo as colunas categóricas como categóricas.
+
+    `pd.concat` transforma em object as categóricas com categorias diferentes; aqui as
+    categorias são unidas antes (a primeira base mantém seus códigos, novas categorias
+    entram no fim).
+    """
+    frames = [frame for frame in frames if frame is not None]
+    for col in CATEGORICAL_COLUMNS:
+        dtypes = [frame[col].dtype for frame in frames if col in frame.columns]
+        if not dtypes or not all(isinstance(dtype, pd.CategoricalDtype) for dtype in dtypes):
+            continue
+        categories = pd.Index(dtypes[0].categories)
+        for dtype in dtypes[1:]:
+            categories = categories.append(pd.Index(dtype.categories).difference(categories))
+        for i, frame in enumerate(frames):
+            if col in frame.columns and not frame[col].cat.categories.equals(categories):
+                frame = frame.copy(deep=False)
+                frame[col] = frame[col].cat.set_categories(categories)
+                frames[i] = frame
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,279 @@
+"""Índices de busca por nome, CNPJ, placa e chassi.
+
+Os índices são montados uma vez por versão do dataset:
+
+* `ExactIndex`: dicionários valor -> posições das linhas para CNPJ, placa e chassi.
+  Consultas bem formadas (CNPJ de 14 dígitos, placa antiga/Mercosul, chassi de 17
+  caracteres) são respondidas com uma única consulta ao dicionário.
+* `SearchIndex`: índice invertido de trigramas sobre os valores ÚNICOS de cada
+  coluna. Uma busca por substring vira a interseção das listas de trigramas da
+  consulta, seguida de uma conferência exata apenas nos candidatos, em vez de um
+  `str.contains` sobre todas as linhas.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+NGRAM_SIZE = 3
+MIN_CNPJ_DIGITS = 6
+# Acima disso os segmentos acrescentados por `extend` são compactados em um só
+MAX_SEGMENTS = 8
+
+CNPJ_PATTERN = re.compile(r"^\d{14}$")
+# Consulta composta só de dígitos e da pontuação do CNPJ (ex.: 12.345.678/0001-90)
+CNPJ_QUERY_PATTERN = re.compile(r"^[\d\s./\\-]+$")
+# Placa antiga (ABC1234) ou Mercosul (ABC1D23)
+PLACA_PATTERN = re.compile(r"^[A-Z]{3}\d[A-Z0-9]\d{2}$")
+# VIN: 17 caracteres, sem as letras I, O e Q
+CHASSI_PATTERN = re.compile(r"^[A-HJ-NPR-Z0-9]{17}$")
+
+
+def normalize_placa_query(query):
+    return str(query).replace("-", "").replace(" ", "").upper()
+
+
+def normalize_cnpj_query(query):
+    return "".join(filter(str.isdigit, str(query)))
+
+
+def normalize_chassi(values):
+    return pd.Series(values, copy=False).astype(str).str.replace(" ", "", regex=False).str.upper()
+
+
+def exact_query(query):
+    """("cnpj" | "placa" | "chassi", valor normalizado) de uma consulta completa, ou None se for parcial."""
+    query_cnpj = normalize_cnpj_query(query)
+    if CNPJ_PATTERN.match(query_cnpj) and CNPJ_QUERY_PATTERN.match(str(query).strip()):
+        return "cnpj", query_cnpj
+    query_upper = normalize_placa_query(query)
+    if PLACA_PATTERN.match(query_upper):
+        return "placa", query_upper
+    if CHASSI_PATTERN.match(query_upper):
+        return "chassi", query_upper
+    return None
+
+
+def _positions_by_value(values):
+    """Dicionário valor -> array com as posições das linhas que têm esse valor."""
+    values = pd.Series(values, copy=False).reset_index(drop=True)
+    return values.groupby(values, sort=False).indices
+
+
+def _merge_positions(base, delta, row_start):
+    merged = dict(base)
+    for value, positions in delta.items():
+        positions = positions + row_start
+        merged[value] = np.concatenate((base[value], positions)) if value in base else positions
+    return merged
+
+
+def _ngrams(text, n=NGRAM_SIZE):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class ExactIndex:
+    """Índices hash (dicionários) de CNPJ, placa e chassi para as consultas completas."""
+
+    def __init__(self, df):
+        self.by_cnpj = _positions_by_value(df["CNPJ_NORMALIZED"])
+        self.by_placa = _positions_by_value(df["PLACA_NORMALIZED"].astype(str).str.upper())
+        self.by_chassi = _positions_by_value(normalize_chassi(df["Chassi"]))
+
+    def lookup(self, query):
+        """Posições das linhas para uma consulta bem formada, ou None se a consulta for parcial."""
+        exact = exact_query(query)
+        if exact is None:
+            return None
+        kind, value = exact
+        index = {"cnpj": self.by_cnpj, "placa": self.by_placa, "chassi": self.by_chassi}[kind]
+        return index.get(value, np.empty(0, dtype=np.int64))
+
+    def extend(self, delta_df, row_start):
+        """Nova versão dos índices com as linhas de `delta_df` a partir da posição `row_start`."""
+        extended = ExactIndex.__new__(ExactIndex)
+        extended.by_cnpj = _merge_positions(self.by_cnpj, _positions_by_value(delta_df["CNPJ_NORMALIZED"]), row_start)
+        extended.by_placa = _merge_positions(
+            self.by_placa, _positions_by_value(delta_df["PLACA_NORMALIZED"].astype(str).str.upper()), row_start
+        )
+        extended.by_chassi = _merge_positions(self.by_chassi, _positions_by_value(normalize_chassi(delta_df["Chassi"])), row_start)
+        return extended
+
+
+class NgramIndex:
+    """Índice de n-gramas dos valores únicos de uma coluna, com as posições das linhas de cada valor.
+
+    As linhas de cada valor ficam em segmentos CSR (rows[offsets[i]:offsets[i+1]]).
+    `extend` acrescenta um segmento só com as linhas novas, sem reindexar o histórico.
+    """
+
+    def __init__(self, values, n=NGRAM_SIZE):
+        self.n = n
+        codes, uniques = pd.factorize(normalize_text(values))
+        self.uniques = pd.Series(uniques)
+        self._segments = [_csr_segment(codes, len(uniques), row_start=0)]
+        self._postings = _build_postings(self.uniques, 0, n)
+        self._value_ids = None
+
+    def __len__(self):
+        return len(self.uniques)
+
+    def matching_values(self, query):
+        """Ids dos valores únicos que contêm `query` (sem diferenciar maiúsculas/minúsculas)."""
+        query = str(query).upper()
+        if not query:
+            return np.empty(0, dtype=np.int64)
+        if len(query) < self.n:
+            # Consultas curtas não têm trigramas: varre só os valores únicos
+            mask = self.uniques.str.contains(query, regex=False).to_numpy(dtype=bool)
+            return np.flatnonzero(mask)
+
+        grams = sorted(_ngrams(query, self.n), key=lambda g: len(self._postings.get(g, ())))
+        candidates = self._postings.get(grams[0])
+        if candidates is None:
+            return np.empty(0, dtype=np.int64)
+        for gram in grams[1:]:
+            posting = self._postings.get(gram)
+            if posting is None:
+                return np.empty(0, dtype=np.int64)
+            candidates = np.intersect1d(candidates, posting, assume_unique=True)
+            if candidates.size == 0:
+                return candidates
+        # Trigramas em comum não garantem a substring: confere só os candidatos
+        return np.asarray([i for i in candidates if query in self.uniques.iat[i]], dtype=np.int64)
+
+    def rows_for_values(self, value_ids):
+        value_ids = np.asarray(value_ids, dtype=np.int64)
+        if value_ids.size == 0:
+            return np.empty(0, dtype=np.int64)
+        parts = []
+        for rows, offsets in self._segments:
+            # Valores criados depois do segmento não têm linhas nele
+            ids = value_ids[value_ids < len(offsets) - 1]
+            if ids.size:
+                parts.append(_gather_csr(rows, offsets, ids))
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def search(self, query):
+        """Posições (ordenadas) das linhas cujo valor contém `query`."""
+        return np.sort(self.rows_for_values(self.matching_values(query)))
+
+    def extend(self, values, row_start):
+        """Nova versão do índice com `values` acrescentados a partir da linha `row_start`.
+
+        Só os valores inéditos geram trigramas; o índice atual não é alterado, pois
+        outras sessões podem continuar usando a versão anterior do dataset.
+        """
+        normalized = normalize_text(values)
+        value_ids = dict(self._get_value_ids())
+        new_values = [value for value in pd.unique(normalized) if value not in value_ids]
+        first_new_id = len(self.uniques)
+        for offset, value in enumerate(new_values):
+            value_ids[value] = first_new_id + offset
+
+        extended = NgramIndex.__new__(NgramIndex)
+        extended.n = self.n
+        extended.uniques = pd.concat([self.uniques, pd.Series(new_values, dtype=self.uniques.dtype)], ignore_index=True)
+        extended._value_ids = value_ids
+        codes = normalized.map(value_ids).to_numpy(dtype=np.int64)
+        extended._segments = self._segments + [_csr_segment(codes, len(extended.uniques), row_start)]
+        if len(extended._segments) > MAX_SEGMENTS:
+            extended._segments = [_compact_segments(extended._segments, len(extended.uniques))]
+
+        postings = dict(self._postings)
+        for gram, ids in _build_postings(new_values, first_new_id, self.n).items():
+            postings[gram] = np.concatenate((postings[gram], ids)) if gram in postings else ids
+        extended._postings = postings
+        return extended
+
+    def _get_value_ids(self):
+        if self._value_ids is None:
+            self._value_ids = {value: value_id for value_id, value in enumerate(self.uniques)}
+        return self._value_ids
+
+
+def normalize_text(values):
+    return pd.Series(values, copy=False).astype(str).fillna("").str.upper().reset_index(drop=True)
+
+
+def _build_postings(values, first_id, n):
+    postings = {}
+    for value_id, value in enumerate(values, start=first_id):
+        for gram in _ngrams(value, n):
+            postings.setdefault(gram, []).append(value_id)
+    return {gram: np.asarray(ids, dtype=np.int64) for gram, ids in postings.items()}
+
+
+def _csr_segment(codes, n_values, row_start):
+    rows = np.argsort(codes, kind="stable") + row_start
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=n_values))))
+    return rows, offsets
+
+
+def _gather_csr(rows, offsets, value_ids):
+    # Concatena as fatias CSR de cada valor sem laço em Python
+    starts = offsets[value_ids]
+    lengths = offsets[value_ids + 1] - starts
+    shifts = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+    return rows[shifts + np.arange(lengths.sum())]
+
+
+def _compact_segments(segments, n_values):
+    """Junta vários segmentos CSR em um só (feito raramente, a cada MAX_SEGMENTS acréscimos)."""
+    all_rows = []
+    all_codes = []
+    for rows, offsets in segments:
+        all_rows.append(rows)
+        all_codes.append(np.repeat(np.arange(len(offsets) - 1), np.diff(offsets)))
+    rows = np.concatenate(all_rows)
+    codes = np.concatenate(all_codes)
+    order = np.lexsort((rows, codes))
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=n_values))))
+    return rows[order], offsets
+
+
+class SearchIndex:
+    """Índices de nome, CNPJ e placa de um dataset, com as mesmas regras da caixa de busca."""
+
+    def __init__(self, df):
+        self.name_index = NgramIndex(df["NOME DO CLIENTE"])
+        self.cnpj_index = NgramIndex(df["CNPJ_NORMALIZED"])
+        self.placa_index = NgramIndex(df["PLACA_NORMALIZED"])
+
+    def search(self, query):
+        """Posições das linhas que casam com a consulta por nome, CNPJ (6+ dígitos) ou placa."""
+        return np.unique(np.concatenate((self.name_index.search(query), self.search_identifiers(query))))
+
+    def search_identifiers(self, query):
+        """Posições das linhas cujo CNPJ (6+ dígitos) ou placa contém a consulta."""
+        parts = [np.empty(0, dtype=np.int64)]
+        query_cnpj = normalize_cnpj_query(query)
+        if len(query_cnpj) >= MIN_CNPJ_DIGITS:
+            parts.append(self.cnpj_index.search(query_cnpj))
+        query_placa = normalize_placa_query(query)
+        if query_placa:
+            parts.append(self.placa_index.search(query_placa))
+        return np.unique(np.concatenate(parts))
+
+    def extend(self, delta_df, row_start):
+        extended = SearchIndex.__new__(SearchIndex)
+        extended.name_index = self.name_index.extend(delta_df["NOME DO CLIENTE"], row_start)
+        extended.cnpj_index = self.cnpj_index.extend(delta_df["CNPJ_NORMALIZED"], row_start)
+        extended.placa_index = self.placa_index.extend(delta_df["PLACA_NORMALIZED"], row_start)
+        return extended
+
+
+def build_search_index(df):
+    return SearchIndex(df)
+
+
+def build_exact_index(df):
+    return ExactIndex(df)
+
+
+def search_rows(query, exact_index, search_index):
+    """Posições das linhas da busca: caminho O(1) para CNPJ/placa/chassi completos, senão trigramas."""
+    rows = exact_index.lookup(query)
+    if rows is not None and len(rows) > 0:
+        return np.sort(rows)
+    return search_index.search(query)
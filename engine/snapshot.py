@@ -0,0 +1,117 @@
+"""Snapshots colunares (Parquet) do DataFrame já normalizado por load_data.
+
+A chave de cada snapshot é o hash do conteúdo do arquivo de origem e do esquema
+(compacto ou não), então a leitura lenta do Excel só acontece quando os bytes do
+arquivo mudam, e o mesmo arquivo lido com e sem esquema compacto gera duas
+versões separadas.
+"""
+import hashlib
+import os
+
+import pandas as pd
+
+SNAPSHOT_DIR = os.path.join("data", ".cache")
+SNAPSHOT_EXTENSION = ".parquet"
+# Incrementar sempre que a normalização de load_data mudar, para invalidar snapshots antigos
+SNAPSHOT_SCHEMA_VERSION = 4
+# Cabe uma pasta com uma planilha por ano (um snapshot por planilha e um do conjunto)
+MAX_SNAPSHOTS = 32
+
+
+def content_key(raw_bytes, compact=True):
+    """Gera a chave do snapshot a partir do conteúdo bruto do arquivo e do esquema (`compact`)."""
+    digest = hashlib.sha256()
+    digest.update(f"schema-v{SNAPSHOT_SCHEMA_VERSION}:{'compacto' if compact else 'completo'}:".encode())
+    digest.update(raw_bytes)
+    return digest.hexdigest()[:32]
+
+
+def combined_key(*keys):
+    """Chave de uma versão derivada de outras (ex.: base + extrato mensal acrescentado).
+
+    O esquema vem das próprias chaves combinadas (ver `content_key`).
+    """
+    return hashlib.sha256(":".join(keys).encode()).hexdigest()[:32]
+
+
+def snapshot_path(key, snapshot_dir=SNAPSHOT_DIR):
+    return os.path.join(snapshot_dir, f"{key}{SNAPSHOT_EXTENSION}")
+
+
+def read_snapshot(key, snapshot_dir=SNAPSHOT_DIR):
+    """Lê o snapshot da chave informada. Retorna None se não existir ou estiver corrompido."""
+    path = snapshot_path(key, snapshot_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        df = pd.read_parquet(path)
+    except Exception as e:
+        print(f"Snapshot '{path}' ilegível, será recriado: {e}")
+        _remove_quietly(path)
+        return None
+    # Atualiza o mtime para que a poda mantenha os snapshots usados recentemente
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return df
+
+
+def write_snapshot(key, df, snapshot_dir=SNAPSHOT_DIR, max_snapshots=MAX_SNAPSHOTS):
+    """Grava o snapshot de forma atômica e poda os mais antigos. Retorna True se gravou."""
+    path = snapshot_path(key, snapshot_dir)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(snapshot_dir, exist_ok=True)
+        df.to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        # Sem pyarrow, disco somente leitura ou colunas com tipos mistos: segue sem snapshot
+        print(f"Não foi possível gravar o snapshot '{path}': {e}")
+        _remove_quietly(tmp_path)
+        return False
+    prune_snapshots(snapshot_dir, max_snapshots)
+    return True
+
+
+def prune_snapshots(snapshot_dir=SNAPSHOT_DIR, max_snapshots=MAX_SNAPSHOTS, extension=SNAPSHOT_EXTENSION):
+    """Mantém apenas os `max_snapshots` arquivos `extension` usados mais recentemente."""
+    try:
+        entries = [
+            os.path.join(snapshot_dir, name)
+            for name in os.listdir(snapshot_dir)
+            if name.endswith(extension)
+        ]
+    except OSError:
+        return
+    entries.sort(key=_mtime_or_zero, reverse=True)
+    for path in entries[max_snapshots:]:
+        _remove_quietly(path)
+
+
+def load_with_snapshot(key, loader, snapshot_dir=SNAPSHOT_DIR):
+    """Retorna o DataFrame da chave a partir do snapshot; se não existir, chama `loader()` e grava o resultado.
+
+    `loader` deve retornar o DataFrame normalizado (ou None em caso de erro).
+    """
+    df = read_snapshot(key, snapshot_dir)
+    if df is not None:
+        return df
+    df = loader()
+    if df is not None:
+        write_snapshot(key, df, snapshot_dir)
+    return df
+
+
+def _mtime_or_zero(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
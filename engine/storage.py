@@ -0,0 +1,803 @@
+"""Armazenamento opcional em SQLite para bases maiores que a memória.
+
+A base normalizada é gravada uma única vez num banco SQLite local
+(`data/.cache/<chave>.sqlite`, a mesma chave de conteúdo dos snapshots), com
+índices em CNPJ, placa, chassi, data, marca e segmento. A gravação não monta a
+base em memória: os blocos da planilha (lida em streaming) ou do snapshot Parquet
+vão direto para o banco, e a remoção dos emplacamentos repetidos e os valores
+canônicos de cada CNPJ (as regras de engine.dedup) são aplicados com SQL.
+
+`StoredDataset` oferece as mesmas consultas do `Dataset`; busca, resumo,
+participação de mercado, lista de inativos, ranking, relatório do cliente,
+consulta em lote e a página de `filtered` são resolvidos no banco e devolvem só
+as linhas exibidas (ou as dos clientes consultados).
+
+A busca por trecho segue as regras dos índices em memória: os valores únicos de
+nome, CNPJ e placa ficam numa tabela FTS5 com tokenizador de trigramas (ou numa
+tabela comum, se o SQLite não tiver FTS5), e as linhas saem pelos índices das
+colunas. A tabela de perfis (e as oportunidades) é montada em memória, pois a
+previsão usa o histórico inteiro de cada cliente, mas em blocos de clientes: a
+memória acompanha o número de clientes, e não o de emplacamentos. A matriz de
+compras dos clientes parecidos lê só as colunas que usa, mas de todas as linhas
+filtradas.
+"""
+import json
+import os
+import pathlib
+import sqlite3
+import threading
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+from engine import snapshot
+from engine.client_search import TOP_K, build_client_name_index
+from engine.columns import COLUNA_CNPJ, COLUNA_CNPJ_NORMALIZADO, COLUNA_DATA, COLUNA_NOME, NOME_COLUNA_CIDADE
+from engine.dataset import build_client_report, merge_client_scores, rank_table, read_source_bytes, similar_table
+from engine.dedup import CANONICAL_COLUMNS, INVALID_VALUES, REPORT_NAMES, record_hashes
+from engine.directory import directory_keys, list_spreadsheets
+from engine.enrichment import TIPO_CHASSI, TIPO_PLACA, VehicleIndex, classify_identifiers, enrichment_table
+from engine.export import iter_chunks
+from engine.loader import iter_columns, normalize_columns
+from engine.market_share import MARKET_COLUMNS, TOP_N as MARKET_TOP_N, MarketShareCube, label_dimensions
+from engine.metrics import count, timed
+from engine.profiles import PROFILE_SOURCE_COLUMNS, build_client_profiles, hot_opportunities, purchase_history
+from engine.purchase_matrix import SIMILAR_LIMIT, build_purchase_matrix
+from engine.recency import DIAS_POR_MES, RECENCY_COLUMNS
+from engine.schema import CATEGORICAL_COLUMNS, SMALL_INT_COLUMNS
+from engine.views import filter_signature
+from engine.search_index import (
+    MIN_CNPJ_DIGITS,
+    NGRAM_SIZE,
+    exact_query,
+    normalize_chassi,
+    normalize_cnpj_query,
+    normalize_placa_query,
+    normalize_text,
+)
+
+DATABASE_EXTENSION = ".sqlite"
+# Cada banco ocupa o tamanho da base inteira: guardar só os mais recentes
+MAX_DATABASES = 4
+INSERT_CHUNK_ROWS = 50_000
+# Linhas devolvidas por `filtered` (uma página da tabela exibida)
+FILTERED_PAGE_ROWS = 1_000
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Posição da linha no DataFrame de origem (mantém a ordem dos resultados do modo em memória)
+COLUNA_POSICAO = "pos"
+# Colunas auxiliares com a mesma normalização dos índices em memória
+COLUNA_NOME_BUSCA = "_NOME_BUSCA"
+COLUNA_PLACA_BUSCA = "_PLACA_BUSCA"
+COLUNA_CHASSI_BUSCA = "_CHASSI_BUSCA"
+# Hash do emplacamento (veículo + data) usado na deduplicação durante a carga
+COLUNA_REGISTRO = "_REGISTRO"
+EXACT_COLUMNS = {"cnpj": COLUNA_CNPJ_NORMALIZADO, "placa": COLUNA_PLACA_BUSCA, "chassi": COLUNA_CHASSI_BUSCA}
+SUBSTRING_COLUMNS = {"nome": COLUNA_NOME_BUSCA, "cnpj": COLUNA_CNPJ_NORMALIZADO, "placa": COLUNA_PLACA_BUSCA}
+CLIENT_INDEX = "idx_cnpj_data"
+INDEXES = {
+    CLIENT_INDEX: [COLUNA_CNPJ_NORMALIZADO, COLUNA_DATA],
+    "idx_placa": [COLUNA_PLACA_BUSCA],
+    "idx_chassi": [COLUNA_CHASSI_BUSCA],
+    "idx_nome": [COLUNA_NOME_BUSCA],
+    "idx_data": [COLUNA_DATA],
+    "idx_marca": ["Marca"],
+    "idx_segmento": ["Segmento"],
+}
+
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def database_path(key, storage_dir=snapshot.SNAPSHOT_DIR):
+    return os.path.join(storage_dir, f"{key}{DATABASE_EXTENSION}")
+
+
+def source_key(file_path_or_buffer, compact=True):
+    """Chave de conteúdo da planilha (ou da pasta de planilhas), a mesma do `Dataset.open`."""
+    if isinstance(file_path_or_buffer, (str, os.PathLike)) and os.path.isdir(file_path_or_buffer):
+        paths = list_spreadsheets(file_path_or_buffer)
+        if not paths:
+            raise FileNotFoundError(f"Nenhuma planilha encontrada em {file_path_or_buffer}")
+        return directory_keys(paths, compact)[1]
+    return snapshot.content_key(read_source_bytes(file_path_or_buffer), compact)
+
+
+def _to_sql_frame(chunk, row_start):
+    """Linhas prontas para o INSERT: datas em texto ISO, categóricas como texto, colunas de busca e o hash do emplacamento."""
+    frame = chunk.copy()
+    for col in frame.columns:
+        if isinstance(frame[col].dtype, pd.CategoricalDtype):
+            frame[col] = frame[col].astype(object)
+    frame[COLUNA_DATA] = frame[COLUNA_DATA].dt.strftime(DATE_FORMAT)
+    frame.insert(0, COLUNA_POSICAO, range(row_start, row_start + len(frame)))
+    frame[COLUNA_NOME_BUSCA] = normalize_text(chunk[COLUNA_NOME]).to_numpy()
+    frame[COLUNA_PLACA_BUSCA] = normalize_text(chunk["PLACA_NORMALIZED"]).to_numpy()
+    frame[COLUNA_CHASSI_BUSCA] = normalize_chassi(chunk["Chassi"]).to_numpy()
+    # Hash de engine.dedup como inteiro com sinal (o SQLite não guarda uint64); NULL sem veículo
+    hashes, has_vehicle = record_hashes(chunk)
+    records = hashes.to_numpy().view(np.int64).astype(object)
+    records[~has_vehicle.to_numpy()] = None
+    frame[COLUNA_REGISTRO] = records
+    return frame
+
+
+def _create_value_table(conn):
+    """Tabela dos valores únicos de busca; retorna True se for FTS5 (trigramas indexados)."""
+    try:
+        conn.execute("CREATE VIRTUAL TABLE valores USING fts5(coluna UNINDEXED, valor, tokenize='trigram case_sensitive 1')")
+        return True
+    except sqlite3.OperationalError:
+        # SQLite sem FTS5 (ou anterior à 3.34): a busca por trecho varre os valores únicos
+        conn.execute("CREATE TABLE valores (coluna TEXT, valor TEXT)")
+        return False
+
+
+def _create_rows_table(conn, columns):
+    columns = [COLUNA_POSICAO + " INTEGER PRIMARY KEY"] + [
+        quote(col) for col in list(columns) + [COLUNA_NOME_BUSCA, COLUNA_PLACA_BUSCA, COLUNA_CHASSI_BUSCA, COLUNA_REGISTRO]
+    ]
+    conn.execute(f"CREATE TABLE emplacamentos ({', '.join(columns)})")
+    # Já na carga: os valores canônicos são agrupados e atualizados por CNPJ
+    conn.execute(f"CREATE INDEX {CLIENT_INDEX} ON emplacamentos ({', '.join(map(quote, INDEXES[CLIENT_INDEX]))})")
+
+
+def _add_search_names(conn):
+    """Coluna `busca` da tabela temporária de nomes canônicos, com a normalização do índice em memória."""
+    # O UPPER do SQLite só trata ASCII: a normalização é feita em Python, em blocos
+    conn.execute("ALTER TABLE temp.canonicos ADD COLUMN busca TEXT")
+    last = 0
+    while True:
+        batch = conn.execute(
+            "SELECT rowid, valor FROM temp.canonicos WHERE rowid > ? ORDER BY rowid LIMIT ?", (last, INSERT_CHUNK_ROWS)
+        ).fetchall()
+        if not batch:
+            return
+        ids, names = zip(*batch)
+        names = normalize_text(pd.Series(names, dtype=object))
+        conn.executemany("UPDATE temp.canonicos SET busca = ? WHERE rowid = ?", zip(names, ids))
+        last = ids[-1]
+
+
+def deduplicate_rows(conn, start, stop):
+    """`engine.dedup.deduplicate` no banco, sobre as linhas com posição em [start, stop). Retorna o relatório."""
+    rows = f"{COLUNA_POSICAO} >= {int(start)} AND {COLUNA_POSICAO} < {int(stop)}"
+    duplicates = conn.execute(DUPLICATE_RECORDS_SQL.format(rows=rows)).rowcount
+    changed = {}
+    for col, rule in CANONICAL_COLUMNS.items():
+        conn.execute("DROP TABLE IF EXISTS temp.canonicos")
+        conn.execute(
+            "CREATE TEMP TABLE canonicos AS "
+            + CANONICAL_VALUES_SQL.format(column=quote(col), rows=rows, order=CANONICAL_ORDER[rule], invalid=INVALID_SQL)
+        )
+        conn.execute("CREATE UNIQUE INDEX temp.idx_canonicos ON canonicos (cnpj)")
+        assignments = f"{quote(col)} = c.valor"
+        if col == COLUNA_NOME:
+            _add_search_names(conn)
+            assignments += f", {quote(COLUNA_NOME_BUSCA)} = c.busca"
+        changed[REPORT_NAMES.get(col, col)] = conn.execute(
+            f"UPDATE emplacamentos SET {assignments} FROM temp.canonicos c "
+            f"WHERE c.cnpj = emplacamentos.{quote(COLUNA_CNPJ_NORMALIZADO)} AND {rows} "
+            f"AND emplacamentos.{quote(col)} IS NOT c.valor"
+        ).rowcount
+    conn.execute("DROP TABLE IF EXISTS temp.canonicos")
+    print(
+        f"Deduplicação (SQLite): {duplicates} emplacamentos repetidos removidos; valores canônicos em "
+        + ", ".join(f"{changes} {name}" for name, changes in changed.items())
+    )
+    count("emplacamentos_repetidos", duplicates)
+    count("nomes_canonicalizados", changed["nomes"])
+    return {"duplicadas": duplicates, **changed}
+
+
+def build_database(key, sources, storage_dir=snapshot.SNAPSHOT_DIR, max_databases=MAX_DATABASES):
+    """Grava no banco da chave (de forma atômica) os blocos normalizados de cada origem e poda os bancos antigos.
+
+    `sources` é uma lista de pares (blocos, limpa), um por planilha ou snapshot, na
+    ordem da base; `limpa` indica que os blocos já vêm sem repetidos e com os valores
+    canônicos. Nas outras origens, e na união de mais de uma (como em
+    `load_directory_frame`), a deduplicação é feita no banco: só um bloco por vez
+    fica em memória.
+    """
+    path = database_path(key, storage_dir)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    os.makedirs(storage_dir, exist_ok=True)
+    try:
+        with closing(sqlite3.connect(tmp_path)) as conn:
+            # O arquivo é temporário até o os.replace: sem journal nem fsync durante a carga
+            conn.execute("PRAGMA journal_mode = OFF")
+            conn.execute("PRAGMA synchronous = OFF")
+            columns, row_start = None, 0
+            for chunks, clean in sources:
+                source_start = row_start
+                for chunk in chunks:
+                    if columns is None:
+                        columns = list(chunk.columns)
+                        _create_rows_table(conn, columns)
+                    _to_sql_frame(chunk[columns], row_start).to_sql("emplacamentos", conn, if_exists="append", index=False)
+                    row_start += len(chunk)
+                if not clean:
+                    deduplicate_rows(conn, source_start, row_start)
+            if len(sources) > 1:
+                # Cada origem já está limpa; a união remove os repetidos entre elas e recalcula os canônicos
+                deduplicate_rows(conn, 0, row_start)
+
+            fts = _create_value_table(conn)
+            for kind, col in SUBSTRING_COLUMNS.items():
+                conn.execute(
+                    f"INSERT INTO valores (coluna, valor) SELECT DISTINCT ?, {quote(col)} FROM emplacamentos "
+                    f"WHERE {quote(col)} IS NOT NULL",
+                    (kind,),
+                )
+            for name, cols in INDEXES.items():
+                if name != CLIENT_INDEX:
+                    conn.execute(f"CREATE INDEX {name} ON emplacamentos ({', '.join(map(quote, cols))})")
+            _create_summary_tables(conn)
+            (n_rows,), = conn.execute("SELECT COUNT(*) FROM emplacamentos").fetchall()
+            conn.execute("CREATE TABLE meta (chave TEXT PRIMARY KEY, valor TEXT)")
+            conn.executemany(
+                "INSERT INTO meta VALUES (?, ?)",
+                [("linhas", str(n_rows)), ("colunas", json.dumps(columns)), ("busca_fts", "1" if fts else "0")],
+            )
+            conn.execute("ANALYZE")
+            conn.commit()
+        os.replace(tmp_path, path)
+    except BaseException:
+        snapshot._remove_quietly(tmp_path)
+        raise
+    snapshot.prune_snapshots(storage_dir, max_databases, extension=DATABASE_EXTENSION)
+    return path
+
+
+def write_database(key, df, storage_dir=snapshot.SNAPSHOT_DIR, max_databases=MAX_DATABASES):
+    """Grava o DataFrame normalizado (já deduplicado) no banco da chave."""
+    return build_database(key, [(iter_chunks(df, INSERT_CHUNK_ROWS), True)], storage_dir, max_databases)
+
+
+def excel_chunks(file_path_or_buffer):
+    """Blocos normalizados da planilha, lida em streaming (a deduplicação fica para o banco)."""
+    if hasattr(file_path_or_buffer, "seek"):
+        file_path_or_buffer.seek(0)
+    for raw in iter_columns(file_path_or_buffer, INSERT_CHUNK_ROWS):
+        yield normalize_columns(raw, compact=False, dedup=False)
+
+
+def snapshot_chunks(key, snapshot_dir=snapshot.SNAPSHOT_DIR):
+    """Blocos do snapshot Parquet da chave, lidos um a um, ou None se não houver snapshot legível."""
+    path = snapshot.snapshot_path(key, snapshot_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        import pyarrow.parquet as pq
+
+        batches = pq.ParquetFile(path).iter_batches(batch_size=INSERT_CHUNK_ROWS)
+    except Exception as e:
+        print(f"Snapshot '{path}' ilegível, a planilha será lida: {e}")
+        return None
+    return (batch.to_pandas() for batch in batches)
+
+
+def source_chunks(file_path_or_buffer, key, compact=True, use_snapshot=True):
+    """Origens de `build_database` para a planilha ou pasta da chave `key`: os snapshots existentes ou o Excel em blocos."""
+    if isinstance(file_path_or_buffer, (str, os.PathLike)) and os.path.isdir(file_path_or_buffer):
+        paths = list_spreadsheets(file_path_or_buffer)
+        keys = directory_keys(paths, compact)[0]
+        combined = snapshot_chunks(key) if use_snapshot else None
+        if combined is not None:
+            return [(combined, True)]
+    else:
+        paths, keys = [file_path_or_buffer], [key]
+    sources = []
+    for path, file_key in zip(paths, keys):
+        chunks = snapshot_chunks(file_key) if use_snapshot else None
+        sources.append((chunks, True) if chunks is not None else (excel_chunks(path), False))
+    return sources
+
+
+def _create_summary_tables(conn):
+    """Tabelas pré-agregadas, como o SummaryCube e o RecencyIndex em memória.
+
+    `clientes` guarda o resumo de cada cliente sem filtro (ordenado pela última compra);
+    `resumo` conta os emplacamentos por (Ano, Mes, Marca, Segmento) e `resumo_clientes`
+    guarda os clientes de cada (Ano, Marca, Segmento), para os clientes únicos.
+    """
+    conn.execute(f"CREATE TABLE clientes AS {CLIENT_AGGREGATE_SQL.format(where='1')}")
+    conn.execute("CREATE UNIQUE INDEX idx_clientes_cnpj ON clientes (cnpj)")
+    conn.execute("CREATE INDEX idx_clientes_ultima ON clientes (ultima, primeira)")
+    conn.execute(
+        "CREATE TABLE resumo AS SELECT Ano, Mes, Marca, Segmento, COUNT(*) AS Quantidade "
+        "FROM emplacamentos GROUP BY Ano, Mes, Marca, Segmento"
+    )
+    conn.execute(
+        'CREATE TABLE resumo_clientes AS SELECT DISTINCT Ano, Marca, Segmento, "CNPJ_NORMALIZED" AS cnpj FROM emplacamentos'
+    )
+
+
+def filter_conditions(brands, segments):
+    """Condições SQL (e parâmetros) dos filtros de Marca/Segmento."""
+    conditions, params = [], []
+    for col, values in (("Marca", brands), ("Segmento", segments)):
+        if values:
+            values = sorted(values)
+            conditions.append(f"{quote(col)} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+    return conditions, params
+
+
+def where_clause(conditions):
+    return " AND ".join(conditions) if conditions else "1"
+
+
+def restore_types(frame, columns):
+    """Mesmos tipos do DataFrame normalizado em memória (datas, inteiros pequenos, categóricas e textos)."""
+    frame = frame[[col for col in columns if col in frame.columns]]
+    for col in frame.columns:
+        if col == COLUNA_DATA:
+            frame[col] = pd.to_datetime(frame[col], format=DATE_FORMAT).astype("datetime64[us]")
+        elif col in SMALL_INT_COLUMNS and not frame[col].isna().any():
+            frame[col] = frame[col].astype(SMALL_INT_COLUMNS[col])
+        elif col in CATEGORICAL_COLUMNS:
+            frame[col] = frame[col].astype("category")
+        elif frame[col].dtype == object:
+            frame[col] = frame[col].astype("str")
+    return frame
+
+
+# Por cliente: última compra, total de emplacamentos, primeira posição na base e a linha do
+# emplacamento mais recente (empate na data: o último na ordem da base), como em build_client_profiles
+CLIENT_AGGREGATE_SQL = """
+WITH filtrado AS (
+    SELECT pos, "CNPJ_NORMALIZED" AS cnpj, "Data emplacamento" AS data FROM emplacamentos WHERE {where}
+), agregado AS (
+    SELECT cnpj, MAX(data) AS ultima, COUNT(*) AS total, MIN(pos) AS primeira FROM filtrado GROUP BY cnpj
+)
+SELECT a.cnpj, a.ultima, a.total, a.primeira, MAX(f.pos) AS recente
+FROM agregado a JOIN filtrado f ON f.cnpj = a.cnpj AND f.data = a.ultima
+GROUP BY a.cnpj
+"""
+# Contagens mensais do cubo de participação de mercado (Periodo = ano * 12 + mês - 1)
+MARKET_COUNTS_SQL = """
+SELECT CAST(substr(d, 1, 4) AS INTEGER) * 12 + CAST(substr(d, 6, 2) AS INTEGER) - 1 AS Periodo, {columns},
+       COUNT(*) AS Quantidade
+FROM (SELECT "Data emplacamento" AS d, * FROM emplacamentos) WHERE d IS NOT NULL
+GROUP BY {groups}
+"""
+# Dono mais recente de cada placa ou chassi da lista (empate na data: o último na ordem da base)
+VEHICLE_OWNERS_SQL = """
+SELECT valor, cnpj FROM (
+    SELECT v.valor, e."CNPJ_NORMALIZED" AS cnpj,
+           ROW_NUMBER() OVER (PARTITION BY v.valor ORDER BY e."Data emplacamento" DESC, e.pos DESC) AS ordem
+    FROM temp.veiculos v JOIN emplacamentos e ON e.{column} = v.valor
+    WHERE v.tipo = ?
+) WHERE ordem = 1
+"""
+# Emplacamentos repetidos (mesmo hash) entre as linhas indicadas, menos o primeiro, como drop_duplicate_records
+DUPLICATE_RECORDS_SQL = """
+DELETE FROM emplacamentos WHERE pos IN (
+    SELECT pos FROM (
+        SELECT pos, ROW_NUMBER() OVER (PARTITION BY "_REGISTRO" ORDER BY pos) AS ordem
+        FROM emplacamentos WHERE "_REGISTRO" IS NOT NULL AND {rows}
+    ) WHERE ordem > 1
+)
+"""
+# Valor canônico da coluna por CNPJ, como canonical_codes: vezes e última data de cada valor
+# válido, desempate pela primeira aparição
+CANONICAL_VALUES_SQL = """
+SELECT cnpj, valor FROM (
+    SELECT cnpj, valor, ROW_NUMBER() OVER (PARTITION BY cnpj ORDER BY {order}) AS ordem FROM (
+        SELECT "CNPJ_NORMALIZED" AS cnpj, {column} AS valor, COUNT(*) AS vezes,
+               MAX("Data emplacamento") AS ultima, MIN(pos) AS primeira
+        FROM emplacamentos
+        WHERE {rows} AND "CNPJ_NORMALIZED" IS NOT NULL AND {column} IS NOT NULL AND {column} NOT IN ({invalid})
+        GROUP BY 1, 2
+    )
+) WHERE ordem = 1
+"""
+CANONICAL_ORDER = {"frequente": "vezes DESC, ultima DESC, primeira", "recente": "ultima DESC, vezes DESC, primeira"}
+INVALID_SQL = ", ".join("'" + value.replace("'", "''") + "'" for value in INVALID_VALUES)
+CLIENT_SUMMARY_SQL = """
+SELECT c.cnpj AS "CNPJ_NORMALIZED", {columns}, c.ultima AS UltimaCompra, c.total AS TotalCompras
+FROM {clients} c JOIN emplacamentos e ON e.pos = c.recente
+WHERE {condition}
+ORDER BY c.ultima, c.primeira
+{limit}
+"""
+
+
+class StoredDataset:
+    """Uma versão dos dados gravada em SQLite, com as consultas do `Dataset` resolvidas no banco."""
+
+    def __init__(self, key, storage_dir=snapshot.SNAPSHOT_DIR):
+        self.key = key
+        self.path = database_path(key, storage_dir)
+        if not os.path.exists(self.path):
+            raise KeyError(key)
+        self._uri = pathlib.Path(self.path).absolute().as_uri() + "?mode=ro"
+        self._lock = threading.Lock()
+        self._client_name_index = None
+        self._purchase_matrices = {}
+        self._market_share_cube = None
+        meta = dict(self._fetch("SELECT chave, valor FROM meta"))
+        self.columns = json.loads(meta["colunas"])
+        self._rows = int(meta["linhas"])
+        self._fts = meta["busca_fts"] == "1"
+
+    @classmethod
+    def open(cls, file_path_or_buffer, compact=True, use_snapshot=True, storage_dir=snapshot.SNAPSHOT_DIR):
+        """Banco da planilha (ou pasta); na primeira vez, os blocos dos snapshots (ou do Excel) são gravados nele.
+
+        A base não é montada em memória: ver `build_database`.
+        """
+        key = source_key(file_path_or_buffer, compact)
+        path = database_path(key, storage_dir)
+        if os.path.exists(path):
+            # Atualiza o mtime para que a poda mantenha os bancos usados recentemente
+            os.utime(path)
+            return cls(key, storage_dir)
+        with timed("construcao:sqlite"):
+            build_database(key, source_chunks(file_path_or_buffer, key, compact, use_snapshot), storage_dir)
+        return cls(key, storage_dir)
+
+    @classmethod
+    def from_dataset(cls, dataset, storage_dir=snapshot.SNAPSHOT_DIR):
+        """Grava (se ainda não existir) o banco da versão de `dataset` e o devolve."""
+        if not os.path.exists(database_path(dataset.key, storage_dir)):
+            with timed("construcao:sqlite"):
+                write_database(dataset.key, dataset.df, storage_dir)
+        return cls(dataset.key, storage_dir)
+
+    def __len__(self):
+        return self._rows
+
+    def _connect(self):
+        return closing(sqlite3.connect(self._uri, uri=True))
+
+    def _fetch(self, sql, params=()):
+        with self._connect() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def _frame(self, sql, params=(), conn=None):
+        if conn is not None:
+            return pd.read_sql_query(sql, conn, params=params)
+        with self._connect() as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+
+    def _rows_where(self, conditions, params, conn=None, columns=None, limit=None, offset=0):
+        """Emplacamentos que atendem às condições, na ordem da base (só as `columns`, se indicadas, e só a página pedida)."""
+        selected = "*" if columns is None else ", ".join(quote(col) for col in columns)
+        page = f" LIMIT {-1 if limit is None else int(limit)} OFFSET {int(offset)}" if limit is not None or offset else ""
+        frame = self._frame(
+            f"SELECT {selected} FROM emplacamentos WHERE {where_clause(conditions)} ORDER BY {COLUNA_POSICAO}{page}",
+            params,
+            conn,
+        )
+        return restore_types(frame, self.columns)
+
+    def _cnpjs_where(self, conditions, params):
+        rows = self._fetch(
+            f"SELECT DISTINCT {quote(COLUNA_CNPJ_NORMALIZADO)} FROM emplacamentos WHERE {' OR '.join(conditions)}", params
+        )
+        return pd.Series([row[0] for row in rows], dtype=object).astype(str)
+
+    # --- Condições de busca ---
+    def exact_condition(self, query):
+        """Condição de igualdade para CNPJ, placa ou chassi completos, ou None se a consulta for parcial."""
+        exact = exact_query(query)
+        if exact is None:
+            return None
+        kind, value = exact
+        return f"{quote(EXACT_COLUMNS[kind])} = ?", [value]
+
+    def substring_condition(self, kind, value):
+        """Linhas cujo valor normalizado da coluna `kind` contém `value` (pelos trigramas quando possível)."""
+        col = quote(SUBSTRING_COLUMNS[kind])
+        if self._fts and len(value) >= NGRAM_SIZE:
+            # Frase de trigramas = trecho contínuo; o instr confere como os índices em memória
+            phrase = '"' + value.replace('"', '""') + '"'
+            return (
+                f"{col} IN (SELECT valor FROM valores WHERE valores MATCH ? AND coluna = ? AND instr(valor, ?) > 0)",
+                [phrase, kind, value],
+            )
+        return f"{col} IN (SELECT valor FROM valores WHERE coluna = ? AND instr(valor, ?) > 0)", [kind, value]
+
+    def identifier_conditions(self, query):
+        """Condições de CNPJ (6+ dígitos) e placa contendo a consulta, como `search_identifiers`."""
+        conditions, params = [], []
+        query_cnpj = normalize_cnpj_query(query)
+        if len(query_cnpj) >= MIN_CNPJ_DIGITS:
+            condition, condition_params = self.substring_condition("cnpj", query_cnpj)
+            conditions.append(condition)
+            params.extend(condition_params)
+        query_placa = normalize_placa_query(query)
+        if query_placa:
+            condition, condition_params = self.substring_condition("placa", query_placa)
+            conditions.append(condition)
+            params.extend(condition_params)
+        return conditions, params
+
+    def name_condition(self, query):
+        query = str(query).upper()
+        return self.substring_condition("nome", query) if query else None
+
+    # --- Estruturas derivadas ---
+    @property
+    def client_name_index(self):
+        """Índice dos nomes, montado sobre os pares únicos (CNPJ, nome) lidos do banco."""
+        with self._lock:
+            if self._client_name_index is None:
+                with timed("construcao:client_name_index"):
+                    pairs = self._frame(
+                        f"SELECT DISTINCT {quote(COLUNA_CNPJ_NORMALIZADO)}, {quote(COLUNA_NOME)} FROM emplacamentos"
+                    )
+                    self._client_name_index = build_client_name_index(pairs)
+            return self._client_name_index
+
+    def purchase_matrix(self, brands=(), segments=()):
+        """Matrizes cliente × mês/modelo/marca, montadas em memória (uma vez por filtro) só com as colunas necessárias."""
+        signature = filter_signature(brands, segments)
+        with self._lock:
+            if signature not in self._purchase_matrices:
+                with timed("construcao:purchase_matrix"):
+                    conditions, params = filter_conditions(brands, segments)
+                    columns = ", ".join(quote(col) for col in (COLUNA_CNPJ_NORMALIZADO, COLUNA_DATA, "Modelo", "Marca"))
+                    frame = self._frame(f"SELECT {columns} FROM emplacamentos WHERE {where_clause(conditions)}", params)
+                    self._purchase_matrices[signature] = build_purchase_matrix(restore_types(frame, self.columns))
+            return self._purchase_matrices[signature]
+
+    @property
+    def market_share_cube(self):
+        """Cubo de participação de mercado montado com um GROUP BY no banco (só as contagens saem dele)."""
+        with self._lock:
+            if self._market_share_cube is None:
+                with timed("construcao:market_share_cube"):
+                    columns = ", ".join(quote(col) for col in MARKET_COLUMNS[1:])
+                    groups = ", ".join(str(i) for i in range(1, len(MARKET_COLUMNS) + 1))
+                    counts = self._frame(MARKET_COUNTS_SQL.format(columns=columns, groups=groups))
+                    self._market_share_cube = MarketShareCube(label_dimensions(counts))
+            return self._market_share_cube
+
+    def client_profiles(self, brands=(), segments=()):
+        """Tabela de perfis completa, montada em blocos de clientes (só as colunas dos perfis).
+
+        Os emplacamentos filtrados saem do banco ordenados por cliente, em blocos de até
+        INSERT_CHUNK_ROWS linhas que nunca dividem um cliente; cada bloco vira os perfis
+        dos seus clientes, e a tabela final segue a ordem da primeira compra na base,
+        como em `build_client_profiles`.
+        """
+        conditions, params = filter_conditions(brands, segments)
+        # Linhas sem CNPJ não têm perfil (o groupby em memória também as descarta)
+        conditions.append(f"{quote(COLUNA_CNPJ_NORMALIZADO)} IS NOT NULL")
+        columns = ", ".join(quote(col) for col in [COLUNA_POSICAO] + PROFILE_SOURCE_COLUMNS)
+        sql = (
+            f"SELECT {columns} FROM emplacamentos WHERE {where_clause(conditions)} "
+            f"ORDER BY {quote(COLUNA_CNPJ_NORMALIZADO)}, {COLUNA_POSICAO}"
+        )
+        parts, first_rows, pending = [], [], None
+
+        def add_part(rows):
+            first_rows.append(rows.groupby(COLUNA_CNPJ_NORMALIZADO, sort=False)[COLUNA_POSICAO].min())
+            parts.append(build_client_profiles(restore_types(rows, self.columns)))
+
+        with self._connect() as conn:
+            for chunk in pd.read_sql_query(sql, conn, params=params, chunksize=INSERT_CHUNK_ROWS):
+                if pending is not None:
+                    chunk = pd.concat([pending, chunk], ignore_index=True)
+                # O último cliente do bloco pode continuar no próximo
+                last_client = (chunk[COLUNA_CNPJ_NORMALIZADO] == chunk[COLUNA_CNPJ_NORMALIZADO].iloc[-1]).to_numpy()
+                pending = chunk[last_client]
+                if not last_client.all():
+                    add_part(chunk[~last_client])
+        if pending is not None:
+            add_part(pending)
+        if not parts:
+            return build_client_profiles(pd.DataFrame())
+        profiles = pd.concat(parts)
+        first_row = pd.concat(first_rows).reindex(profiles.index).to_numpy()
+        profiles = profiles.iloc[np.argsort(first_row, kind="stable")]
+        # Cada bloco tem as próprias categorias; a tabela volta a ter colunas categóricas únicas
+        for col in parts[0].columns:
+            if isinstance(parts[0][col].dtype, pd.CategoricalDtype):
+                profiles[col] = profiles[col].astype("category")
+        return profiles
+
+    # --- Consultas ---
+    def filtered(self, brands=(), segments=(), limit=FILTERED_PAGE_ROWS, offset=0):
+        """Uma página (`limit` linhas a partir de `offset`) dos emplacamentos que passam nos filtros.
+
+        Só a página sai do banco; `limit=None` devolve todas as linhas filtradas, o que
+        coloca a base filtrada inteira em memória.
+        """
+        with timed("filtro"):
+            return self._rows_where(*filter_conditions(brands, segments), limit=limit, offset=offset)
+
+    def search(self, query, brands=(), segments=()):
+        """Emplacamentos que casam com a busca por nome, CNPJ, placa ou chassi (mesmas regras do `Dataset`)."""
+        with timed("busca"):
+            filters, filter_params = filter_conditions(brands, segments)
+            exact = self.exact_condition(query)
+            if exact is not None and self._fetch(f"SELECT 1 FROM emplacamentos WHERE {exact[0]} LIMIT 1", exact[1]):
+                conditions, params = [exact[0]], list(exact[1])
+            else:
+                conditions, params = self.identifier_conditions(query)
+                name = self.name_condition(query)
+                if name is not None:
+                    conditions.append(name[0])
+                    params.extend(name[1])
+                if not conditions:
+                    conditions = ["0"]
+                conditions = ["(" + " OR ".join(conditions) + ")"]
+            results = self._rows_where(conditions + filters, params + filter_params)
+        count("buscas")
+        count("busca_linhas", len(results))
+        return results
+
+    def client_summaries(self, conditions, params, condition="1", condition_params=(), limit="", conn=None):
+        """Um cliente por linha (nome, CNPJ e cidade mais recentes, UltimaCompra, TotalCompras), da compra mais antiga à mais recente.
+
+        `conditions` filtram os emplacamentos (sem elas, usa a tabela `clientes` pré-agregada);
+        `condition` filtra os clientes pela última compra (c.ultima) ou pelo CNPJ (c.cnpj).
+        """
+        clients = "clientes" if not conditions else f"({CLIENT_AGGREGATE_SQL.format(where=where_clause(conditions))})"
+        columns = ", ".join(f"e.{quote(col)}" for col in [COLUNA_NOME, COLUNA_CNPJ, NOME_COLUNA_CIDADE])
+        sql = CLIENT_SUMMARY_SQL.format(columns=columns, clients=clients, condition=condition, limit=limit)
+        frame = self._frame(sql, list(params) + list(condition_params), conn)
+        summaries = restore_types(frame, [COLUNA_CNPJ_NORMALIZADO, COLUNA_NOME, COLUNA_CNPJ, NOME_COLUNA_CIDADE])
+        summaries["UltimaCompra"] = pd.to_datetime(frame["UltimaCompra"], format=DATE_FORMAT).astype("datetime64[us]")
+        summaries["TotalCompras"] = frame["TotalCompras"].astype("int64")
+        return summaries.set_index(COLUNA_CNPJ_NORMALIZADO)
+
+    def scored_clients(self, cnpjs, brands=(), segments=()):
+        """`client_summaries` só dos clientes `cnpjs` com emplacamentos nos filtros."""
+        conditions, params = filter_conditions(brands, segments)
+        candidates = "cnpj IN (SELECT cnpj FROM temp.candidatos)"
+        if conditions:
+            conditions.append(f"{quote(COLUNA_CNPJ_NORMALIZADO)} IN (SELECT cnpj FROM temp.candidatos)")
+        with self._connect() as conn:
+            # Tabela temporária em vez de IN (?, ?, ...): o número de candidatos não tem limite
+            conn.execute("CREATE TEMP TABLE candidatos (cnpj TEXT PRIMARY KEY)")
+            conn.executemany("INSERT OR IGNORE INTO candidatos VALUES (?)", ((cnpj,) for cnpj in cnpjs))
+            return self.client_summaries(conditions, params, "c." + candidates, conn=conn)
+
+    def rank_clients(self, query, brands=(), segments=(), limit=TOP_K):
+        """Os `limit` clientes mais parecidos com a busca (mesma pontuação do `Dataset.rank_clients`)."""
+        with timed("busca"):
+            exact = self.exact_condition(query)
+            identifier_cnpjs = self._cnpjs_where([exact[0]], exact[1]) if exact is not None else pd.Series(dtype=object)
+            if identifier_cnpjs.empty:
+                conditions, params = self.identifier_conditions(query)
+                if conditions:
+                    identifier_cnpjs = self._cnpjs_where(conditions, params)
+            name = self.name_condition(query)
+            substring_cnpjs = self._cnpjs_where([name[0]], name[1]) if name is not None else pd.Series(dtype=object)
+            scores = merge_client_scores(self.client_name_index.rank(query), identifier_cnpjs, substring_cnpjs)
+            ranked = rank_table(self.scored_clients(scores.index, brands, segments), scores)
+        count("buscas")
+        count("busca_clientes", len(ranked))
+        return ranked.head(limit)
+
+    def client_rows(self, cnpj, brands=(), segments=()):
+        """Emplacamentos do cliente (CNPJ com ou sem pontuação) que passam nos filtros."""
+        conditions, params = filter_conditions(brands, segments)
+        return self._rows_where([f"{quote(COLUNA_CNPJ_NORMALIZADO)} = ?"] + conditions, [normalize_cnpj_query(cnpj)] + params)
+
+    def client_profile(self, cnpj, brands=(), segments=()):
+        """Perfil do cliente montado só com os emplacamentos dele, ou None se não houver nenhum nos filtros."""
+        with timed("perfil_cliente"):
+            profiles = build_client_profiles(self.client_rows(cnpj, brands, segments))
+            return profiles.iloc[0] if not profiles.empty else None
+
+    def client_report(self, cnpj, brands=(), segments=()):
+        """Perfil, argumento de venda, histórico mensal e detalhamento do cliente (ou None)."""
+        with timed("perfil_cliente"):
+            rows = self.client_rows(cnpj, brands, segments)
+            profiles = build_client_profiles(rows)
+        if profiles.empty:
+            return None
+        return build_client_report(profiles.iloc[0], rows)
+
+    def purchase_history(self, cnpj, brands=(), segments=()):
+        """Emplacamentos do cliente por mês, agrupados a partir das linhas dele."""
+        with timed("historico"):
+            return purchase_history(self.client_rows(cnpj, brands, segments))
+
+    def similar_clients(self, cnpj, brands=(), segments=(), limit=SIMILAR_LIMIT):
+        """Os `limit` clientes com a frota mais parecida com a do cliente (mesmo resultado do `Dataset`)."""
+        with timed("semelhantes"):
+            scores = self.purchase_matrix(brands, segments).similar(normalize_cnpj_query(cnpj), limit)
+            similar = similar_table(self.scored_clients(scores.index, brands, segments), scores)
+        count("semelhantes")
+        return similar
+
+    def vehicle_index(self, identifiers, conn):
+        """Índice de veículos só com as placas e chassis de `identifiers` (donos consultados no banco)."""
+        vehicles = identifiers[identifiers["Tipo"].isin([TIPO_PLACA, TIPO_CHASSI])].drop_duplicates(["Tipo", "Chave"])
+        conn.execute("CREATE TEMP TABLE veiculos (tipo TEXT, valor TEXT, PRIMARY KEY (tipo, valor))")
+        conn.executemany("INSERT INTO veiculos VALUES (?, ?)", zip(vehicles["Tipo"], vehicles["Chave"]))
+        owners = []
+        for kind, column in ((TIPO_PLACA, COLUNA_PLACA_BUSCA), (TIPO_CHASSI, COLUNA_CHASSI_BUSCA)):
+            found = self._frame(VEHICLE_OWNERS_SQL.format(column=quote(column)), [kind], conn)
+            owners.append(pd.Series(found["cnpj"].to_numpy(dtype=object), index=found["valor"].astype(str)))
+        return VehicleIndex(*owners)
+
+    def enrich(self, identifiers, brands=(), segments=(), today=None):
+        """Perfil de cada identificador da lista (mesmo resultado do `Dataset.enrich`).
+
+        Só os emplacamentos dos clientes da lista (e só as colunas usadas pelos
+        perfis) saem do banco; o custo acompanha o histórico desses clientes.
+        """
+        with timed("lote"):
+            classified = classify_identifiers(identifiers)
+            filters, filter_params = filter_conditions(brands, segments)
+            with self._connect() as conn:
+                clients = self.vehicle_index(classified, conn).owners(classified)
+                conn.execute("CREATE TEMP TABLE candidatos (cnpj TEXT PRIMARY KEY)")
+                listed = pd.unique(clients[pd.notna(clients)])
+                conn.executemany("INSERT OR IGNORE INTO candidatos VALUES (?)", ((cnpj,) for cnpj in listed))
+                condition = f"{quote(COLUNA_CNPJ_NORMALIZADO)} IN (SELECT cnpj FROM temp.candidatos)"
+                rows = self._rows_where([condition] + filters, filter_params, conn, PROFILE_SOURCE_COLUMNS)
+            table = enrichment_table(classified, clients, build_client_profiles(rows), today)
+        count("lote_identificadores", len(table))
+        return table
+
+    def summary(self, brands=(), segments=()):
+        """Métricas do Resumo Geral, a partir das tabelas pré-agregadas `resumo` e `resumo_clientes`."""
+        with timed("resumo"):
+            conditions, params = filter_conditions(brands, segments)
+            where = where_clause(conditions)
+            total, first_year, last_year = self._fetch(
+                f"SELECT COALESCE(SUM(Quantidade), 0), MIN(Ano), MAX(Ano) FROM resumo WHERE {where}", params
+            )[0]
+            (clients,), = self._fetch(f"SELECT COUNT(DISTINCT cnpj) FROM resumo_clientes WHERE {where}", params)
+            por_ano = self._frame(
+                f"SELECT Ano, SUM(Quantidade) AS count FROM resumo WHERE {where} GROUP BY Ano ORDER BY Ano", params
+            )
+            marca_ano = self._frame(
+                f"SELECT Ano, Marca, SUM(Quantidade) AS Quantidade FROM resumo WHERE {where} AND Marca IS NOT NULL "
+                "GROUP BY Ano, Marca",
+                params,
+            )
+        year_dtype = SMALL_INT_COLUMNS["Ano"]
+        marca_ano["Ano"] = marca_ano["Ano"].astype(year_dtype)
+        marca_ano["Marca"] = marca_ano["Marca"].astype("category")
+        return {
+            "total_emplacamentos": int(total),
+            "clientes_unicos": int(clients),
+            "primeiro_ano": int(first_year) if first_year is not None else None,
+            "ultimo_ano": int(last_year) if last_year is not None else None,
+            "por_ano": por_ano.set_index(por_ano["Ano"].astype(year_dtype))["count"],
+            "marca_ano": marca_ano.pivot(index="Marca", columns="Ano", values="Quantidade").fillna(0).astype(int),
+        }
+
+    def market_share(self, dimension, window=12, brands=(), segments=(), top_n=MARKET_TOP_N, end=None):
+        with timed("participacao"):
+            return self.market_share_cube.market_share(dimension, window, brands, segments, top_n, end)
+
+    def hot_opportunities(self, months_ahead, include_overdue=False, brands=(), segments=(), today=None):
+        with timed("oportunidades"):
+            return hot_opportunities(self.client_profiles(brands, segments), months_ahead, include_overdue, today)
+
+    def inactive_clients(self, min_months=13, max_months=None, brands=(), segments=(), today=None, limit=None, offset=0):
+        """Clientes sem comprar entre `min_months` e `max_months` meses (e não no ano corrente).
+
+        A faixa vira condições sobre a data da última compra (ver RecencyIndex), e
+        `limit`/`offset` paginam no próprio banco.
+        """
+        if today is None:
+            today = pd.Timestamp.now()
+        bounds = ["c.ultima <= ?", "c.ultima < ?"]
+        bound_params = [
+            (today - pd.Timedelta(days=DIAS_POR_MES * min_months)).strftime(DATE_FORMAT),
+            pd.Timestamp(year=today.year, month=1, day=1).strftime(DATE_FORMAT),
+        ]
+        if max_months is not None:
+            bounds.append("c.ultima > ?")
+            bound_params.append((today - pd.Timedelta(days=DIAS_POR_MES * (max_months + 1))).strftime(DATE_FORMAT))
+        page_sql = f"LIMIT {-1 if limit is None else int(limit)} OFFSET {int(offset)}" if limit is not None or offset else ""
+        with timed("inativos"):
+            conditions, params = filter_conditions(brands, segments)
+            page = self.client_summaries(conditions, params, " AND ".join(bounds), bound_params, page_sql)
+        page = page.reset_index(drop=True)[RECENCY_COLUMNS]
+        page["MesesSemCompra"] = ((today - page["UltimaCompra"]) / pd.Timedelta(days=DIAS_POR_MES)).astype(int)
+        return page
@@ -0,0 +1,86 @@
+"""Filtros gerais da barra lateral (Marca/Segmento) aplicados ao dataset.
+
+`FilteredViews` guarda, por versão do dataset, as posições das linhas de cada
+combinação de filtros recente (LRU pequeno), de modo que os reruns do Streamlit
+não refazem os `isin`. Só as posições ficam no cache (8 bytes por linha): o
+DataFrame filtrado é montado com `iloc` quando pedido. Sem filtro, a visão é a
+própria base (cópia rasa, sem copiar dados).
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+MAX_CACHED_VIEWS = 8
+
+
+def filter_signature(brands, segments):
+    """Assinatura estável de uma combinação de filtros, usada como chave de cache."""
+    return (tuple(sorted(brands or ())), tuple(sorted(segments or ())))
+
+
+def filter_mask(df, brands, segments):
+    """Máscara booleana das linhas que passam nos filtros, ou None se não houver filtro."""
+    mask = None
+    if brands:
+        mask = df["Marca"].isin(list(brands))
+    if segments:
+        segment_mask = df["Segmento"].isin(list(segments))
+        mask = segment_mask if mask is None else mask & segment_mask
+    return mask
+
+
+def apply_filters(df, brands, segments):
+    mask = filter_mask(df, brands, segments)
+    return df if mask is None else df[mask]
+
+
+class FilteredViews:
+    """Visões filtradas de uma versão do dataset, memorizadas por assinatura de filtro."""
+
+    def __init__(self, df, max_entries=MAX_CACHED_VIEWS):
+        self._df = df
+        self.max_entries = max_entries
+        self._cache = OrderedDict()  # assinatura -> posições das linhas
+        self._lock = threading.Lock()
+
+    def rows(self, brands, segments):
+        """Posições (ordenadas) das linhas que passam nos filtros, ou None se não houver filtro."""
+        signature = filter_signature(brands, segments)
+        if signature == ((), ()):
+            return None
+        return self._get(signature)
+
+    def frame(self, brands, segments):
+        """DataFrame filtrado, montado a partir das posições; sem filtro, a própria base (sem copiar dados)."""
+        rows = self.rows(brands, segments)
+        if rows is None:
+            return self._df.copy(deep=False)
+        return self._df.iloc[rows]
+
+    def restrict(self, positions, brands, segments):
+        """Mantém de `positions` (ordenadas e sem repetição) apenas as linhas que passam nos filtros."""
+        filter_rows = self.rows(brands, segments)
+        positions = np.asarray(positions, dtype=np.int64)
+        if filter_rows is None:
+            return positions
+        return positions[np.isin(positions, filter_rows, assume_unique=True)]
+
+    def _get(self, signature):
+        with self._lock:
+            cached = self._cache.get(signature)
+            if cached is not None:
+                self._cache.move_to_end(signature)
+                return cached
+
+        rows = np.flatnonzero(filter_mask(self._df, *signature).to_numpy(dtype=bool))
+        with self._lock:
+            self._cache[signature] = rows
+            self._cache.move_to_end(signature)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return rows
+
+
+def build_filtered_views(df):
+    return FilteredViews(df)
@@ -0,0 +1,80 @@
+"""Aquecimento do processo: dataset padrão e módulos pesados carregados em segundo plano.
+
+Na primeira execução do app (a tela de senha), uma thread carrega a planilha
+padrão (ou o snapshot dela) no registro compartilhado, monta as estruturas
+derivadas usadas pelas consultas sem filtro e importa os módulos que o app só
+usa sob demanda. Quando o primeiro usuário termina de digitar a senha, a busca já
+responde a partir da memória; se ele chegar antes do fim, `get_or_load` o faz
+esperar pelo mesmo carregamento em vez de ler o arquivo de novo.
+"""
+import importlib
+import os
+import threading
+import time
+
+from engine.dataset import Dataset
+
+# Importados pelo app só quando necessários (gráfico do cliente, leitura/exportação de Excel)
+LAZY_MODULES = ["openpyxl", "plotly.express"]
+
+# Estruturas usadas pelas consultas sem filtro, montadas antes do primeiro uso de uma versão
+DERIVED_STRUCTURES = {
+    "indice_exato": lambda dataset: dataset.exact_index,
+    "indice_busca": lambda dataset: dataset.search_index,
+    "indice_nomes": lambda dataset: dataset.client_name_index,
+    "visoes_filtradas": lambda dataset: dataset.filtered_views,
+    "cubo_resumo": lambda dataset: dataset.summary_cube,
+    "cubo_participacao": lambda dataset: dataset.market_share_cube,
+    "perfis": lambda dataset: dataset.client_profiles(),
+    "recencia": lambda dataset: dataset.recency_index(),
+    "matriz_compras": lambda dataset: dataset.purchase_matrix(),
+    "indice_veiculos": lambda dataset: dataset.vehicle_index,
+}
+
+_lock = threading.Lock()
+_started = False
+# Etapa -> segundos da última execução do aquecimento (para diagnóstico)
+TIMINGS = {}
+
+
+def warm_up(file_path, compact=True, modules=LAZY_MODULES):
+    """Carrega o dataset e suas estruturas derivadas, importa `modules` e registra os tempos."""
+    started = time.perf_counter()
+
+    def timed(stage, fn):
+        stage_started = time.perf_counter()
+        result = fn()
+        TIMINGS[stage] = time.perf_counter() - stage_started
+        return result
+
+    try:
+        dataset = timed("dataset", lambda: Dataset.open(file_path, compact=compact))
+        for stage, build in DERIVED_STRUCTURES.items():
+            timed(stage, lambda: build(dataset))
+        for module in modules:
+            timed(f"import {module}", lambda: importlib.import_module(module))
+    except Exception as e:
+        # O erro volta a aparecer (na tela) quando a sessão tentar carregar o mesmo arquivo
+        print(f"Aquecimento interrompido: {e}")
+        return None
+    total = time.perf_counter() - started
+    breakdown = " | ".join(f"{stage} {seconds:.2f}s" for stage, seconds in TIMINGS.items())
+    print(f"Aquecimento concluído em {total:.2f}s: {breakdown}")
+    return dataset
+
+
+def start_warmup(file_path, compact=True, import_seconds=None):
+    """Dispara o aquecimento em uma thread, uma única vez por processo. Retorna a thread (ou None)."""
+    global _started
+    with _lock:
+        if _started:
+            return None
+        _started = True
+        if import_seconds is not None:
+            print(f"Imports do app em {import_seconds:.2f}s")
+        if not os.path.exists(file_path):
+            print(f"Aquecimento ignorado: {file_path} não encontrado.")
+            return None
+        thread = threading.Thread(target=warm_up, args=(file_path, compact), name="warmup", daemon=True)
+        thread.start()
+        return thread
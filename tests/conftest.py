@@ -0,0 +1,16 @@
+"""Bases sintéticas pequenas (benchmarks/synthetic.py) para os testes de equivalência."""
+import pytest
+
+from benchmarks.run import raw_columns
+from benchmarks.synthetic import generate_frame
+from engine.loader import normalize_columns
+
+
+def synthetic_base(n_rows, seed=0, start="2019-01-01", end="2026-06-30"):
+    """Base normalizada como a do app, gerada sem passar pelo Excel."""
+    return normalize_columns(raw_columns(generate_frame(n_rows, seed=seed, start=start, end=end)))
+
+
+@pytest.fixture(scope="session")
+def base_df():
+    return synthetic_base(3_000)
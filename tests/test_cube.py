@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+from engine.columns import COLUNA_CNPJ_NORMALIZADO
+from engine.cube import build_summary_cube
+from engine.views import apply_filters
+
+FILTERS = [((), ()), (("VW",), ()), ((), ("PESADOS", "LEVES")), (("SCANIA", "VOLVO"), ("EXTRAPESADOS",)), (("JAC",), ("PESADOS",))]
+
+
+def groupby_summary(df):
+    """Resumo Geral calculado direto sobre os emplacamentos, como antes do cubo."""
+    marca_ano = df.groupby(["Marca", "Ano"], observed=True).size().unstack(fill_value=0)
+    return {
+        "total_emplacamentos": len(df),
+        "clientes_unicos": df[COLUNA_CNPJ_NORMALIZADO].nunique(),
+        "primeiro_ano": int(df["Ano"].min()) if len(df) else None,
+        "ultimo_ano": int(df["Ano"].max()) if len(df) else None,
+        "por_ano": df.groupby("Ano").size().sort_index(),
+        "marca_ano": marca_ano,
+    }
+
+
+@pytest.mark.parametrize("brands, segments", FILTERS)
+def test_cube_matches_groupby(base_df, brands, segments):
+    got = build_summary_cube(base_df).summary(brands, segments)
+    expected = groupby_summary(apply_filters(base_df, brands, segments))
+    for key in ["total_emplacamentos", "clientes_unicos", "primeiro_ano", "ultimo_ano"]:
+        assert got[key] == expected[key]
+    pd.testing.assert_series_equal(got["por_ano"], expected["por_ano"], check_names=False, check_dtype=False)
+    pd.testing.assert_frame_equal(got["marca_ano"], expected["marca_ano"], check_like=True, check_dtype=False,
+                                  check_categorical=False, check_index_type=False, check_column_type=False,
+                                  check_names=False)
+
+
+def test_extended_cube_matches_groupby(base_df):
+    cutoff = len(base_df) * 2 // 3
+    cube = build_summary_cube(base_df.iloc[:cutoff]).extend(base_df.iloc[cutoff:])
+    for brands, segments in FILTERS:
+        got = cube.summary(brands, segments)
+        expected = groupby_summary(apply_filters(base_df, brands, segments))
+        assert got["total_emplacamentos"] == expected["total_emplacamentos"]
+        assert got["clientes_unicos"] == expected["clientes_unicos"]
+        pd.testing.assert_series_equal(got["por_ano"], expected["por_ano"], check_names=False, check_dtype=False)
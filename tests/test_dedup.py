@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+
+from engine.dedup import drop_duplicate_records, record_hashes, vehicle_keys
+from engine.schema import concat_frames
+
+
+def test_sliced_frame_hashes_one_per_row(base_df):
+    sliced = base_df.iloc[10:20]
+    hashes, has_vehicle = record_hashes(sliced)
+    assert len(hashes) == len(has_vehicle) == len(sliced)
+    # Mesmos hashes das linhas correspondentes na base inteira
+    full_hashes, _ = record_hashes(base_df)
+    np.testing.assert_array_equal(hashes.to_numpy(), full_hashes.to_numpy()[10:20])
+    assert list(vehicle_keys(sliced)) == list(vehicle_keys(base_df))[10:20]
+
+
+def test_drop_duplicates_on_filtered_frame(base_df):
+    repeated = concat_frames([base_df, base_df.iloc[:30]])
+    # Índice com lacunas, como depois de um filtro ou de `dropna`
+    filtered = repeated[repeated["Marca"] != "VW"]
+    filtered.index = filtered.index * 3
+    deduplicated, removed = drop_duplicate_records(filtered)
+    expected_removed = int((repeated.iloc[len(base_df):]["Marca"] != "VW").sum())
+    assert removed == expected_removed
+    assert len(deduplicated) == len(filtered) - expected_removed
+    pd.testing.assert_frame_equal(
+        deduplicated, filtered.iloc[: len(filtered) - expected_removed].reset_index(drop=True)
+    )
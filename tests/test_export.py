@@ -0,0 +1,47 @@
+from io import BytesIO
+
+import pandas as pd
+import pytest
+
+from engine import export
+from engine.prediction import predict_next_purchases
+
+CHUNK_ROWS = 7
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    """Blocos pequenos, para que os arquivos de teste tenham várias emendas entre blocos."""
+    iter_chunks = export.iter_chunks
+    monkeypatch.setattr(export, "iter_chunks", lambda df, chunk_rows=CHUNK_ROWS: iter_chunks(df, chunk_rows))
+
+
+@pytest.fixture
+def report(base_df):
+    """Relatório com texto acentuado, datas, vazios e números, como os exportados pelo app."""
+    predicted = predict_next_purchases(base_df).reset_index()
+    return predicted.head(100)
+
+
+def test_csv_matches_pandas(report):
+    content = export.export_frame(report, "csv")
+    assert content == report.to_csv(index=False).encode("utf-8-sig")
+
+
+def test_parquet_matches_pandas(report):
+    content = export.export_frame(report, "parquet")
+    pd.testing.assert_frame_equal(pd.read_parquet(BytesIO(content)), report)
+
+
+def test_xlsx_matches_pandas(report):
+    content = export.export_frame(report, "xlsx")
+    expected = BytesIO()
+    report.to_excel(expected, index=False)
+    expected.seek(0)
+    pd.testing.assert_frame_equal(pd.read_excel(BytesIO(content)), pd.read_excel(expected))
+
+
+def test_empty_report_keeps_header(report):
+    empty = report.iloc[:0]
+    assert export.export_frame(empty, "csv") == empty.to_csv(index=False).encode("utf-8-sig")
+    assert list(pd.read_excel(BytesIO(export.export_frame(empty, "xlsx"))).columns) == list(report.columns)
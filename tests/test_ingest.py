@@ -0,0 +1,68 @@
+import pandas as pd
+
+from engine.columns import COLUNA_DATA, COLUNA_NOME
+from engine.dataset import Dataset
+from engine.registry import DatasetRegistry
+from engine.schema import concat_frames
+from tests.conftest import synthetic_base
+
+
+def registered(df, key="base"):
+    registry = DatasetRegistry()
+    registry.put(key, df)
+    return Dataset(key, registry)
+
+
+def test_append_keeps_vehicles_registered_again_on_another_date():
+    base = synthetic_base(300, seed=3, end="2025-12-31")
+    new_rows = synthetic_base(50, seed=4, start="2026-01-01")
+    same_date = base.iloc[:10]
+    # Mesmo veículo, outra data: reemplacamento, que precisa entrar
+    other_date = base.iloc[10:20].copy()
+    other_date[COLUNA_DATA] = pd.Timestamp("2026-05-15")
+    delta = concat_frames([same_date, other_date, new_rows, new_rows.iloc[:5]])
+
+    appended, stats = registered(base).append(delta, "extrato")
+    assert stats["duplicadas"] == len(same_date) + 5
+    assert stats["acrescentadas"] == len(other_date) + len(new_rows)
+    assert len(appended) == len(base) + len(other_date) + len(new_rows)
+
+    # Um segundo extrato confere os hashes contra o índice estendido, não só contra a base original
+    again, stats = appended.append(other_date, "extrato-2")
+    assert stats["acrescentadas"] == 0
+    assert again.key == appended.key
+
+
+def test_append_matches_rebuild(base_df):
+    cutoff = pd.Timestamp("2025-07-01")
+    before = base_df[base_df[COLUNA_DATA] < cutoff].reset_index(drop=True)
+    after = base_df[base_df[COLUNA_DATA] >= cutoff].reset_index(drop=True)
+    brands, segments = ("VW", "SCANIA"), ("PESADOS",)
+
+    base = registered(before)
+    # Estruturas já montadas na base são estendidas pelo append em vez de reconstruídas
+    for filters in [((), ()), (brands, ()), ((), segments)]:
+        base.summary(*filters)
+        base.client_profiles(*filters)
+    base.search("LTDA")
+    base.market_share("concessionaria")
+    appended, _ = base.append(after, "extrato")
+    assert set(appended.registry.get(appended.key).derived) >= {
+        "exact_index", "record_index", "search_index", "summary_cube", "market_share_cube", ("client_profiles", (), ()),
+    }
+    rebuilt = registered(concat_frames([before, after]), key="completa")
+
+    queries = ["LTDA", str(after[COLUNA_NOME].iloc[0]), str(after["PLACA"].iloc[0]), str(after["CNPJ CLIENTE"].iloc[0])]
+    for query in queries:
+        pd.testing.assert_frame_equal(appended.search(query), rebuilt.search(query))
+    for filters in [((), ()), (brands, ()), ((), segments)]:
+        pd.testing.assert_frame_equal(appended.client_profiles(*filters).sort_index(),
+                                      rebuilt.client_profiles(*filters).sort_index())
+        expected, got = rebuilt.summary(*filters), appended.summary(*filters)
+        for key in ["total_emplacamentos", "clientes_unicos", "primeiro_ano", "ultimo_ano"]:
+            assert got[key] == expected[key]
+        pd.testing.assert_series_equal(got["por_ano"], expected["por_ano"])
+        pd.testing.assert_frame_equal(got["marca_ano"], expected["marca_ano"], check_like=True)
+    for window in (1, 12):
+        got, expected = appended.market_share("concessionaria", window), rebuilt.market_share("concessionaria", window)
+        pd.testing.assert_frame_equal(got["ranking"], expected["ranking"])
@@ -0,0 +1,51 @@
+from datetime import date, datetime
+
+import pandas as pd
+import pytest
+from dateutil import parser as date_parser
+
+from benchmarks.run import raw_columns
+from benchmarks.synthetic import generate_frame
+from engine.export import write_xlsx
+from engine.loader import DATE_FORMAT, EXCEL_EPOCH, load_excel, normalize_columns, parse_dates
+
+CELLS = [
+    "05/03/2024", " 31/12/2023 ", "2024-02-29", "2024-02-29 13:45:00", "7-3-2024", "29/02/2023", "", "sem data",
+    45292, 45292.5, 1.0, date(2024, 1, 31), datetime(2024, 6, 30, 8, 15), None,
+]
+
+
+def parse_cell(value):
+    """Conversão de uma célula por vez, como a leitura fazia antes da versão vetorizada."""
+    if isinstance(value, str):
+        text = value.strip()
+        if not text:
+            return pd.NaT
+        for parse in (lambda: datetime.strptime(text, DATE_FORMAT), lambda: datetime.fromisoformat(text),
+                      lambda: date_parser.parse(text, dayfirst=True)):
+            try:
+                return pd.Timestamp(parse())
+            except ValueError:
+                continue
+        return pd.NaT
+    if isinstance(value, (int, float)):
+        return EXCEL_EPOCH + pd.to_timedelta(value, unit="D")
+    if isinstance(value, datetime):
+        return pd.Timestamp(value)
+    if isinstance(value, date):
+        return pd.Timestamp(datetime(value.year, value.month, value.day))
+    return pd.NaT
+
+
+def test_parse_dates_matches_per_cell():
+    parsed = parse_dates(CELLS)
+    expected = pd.Series([parse_cell(value) for value in CELLS], dtype="datetime64[us]")
+    pd.testing.assert_series_equal(parsed, expected)
+
+
+@pytest.mark.parametrize("header_variant", ["padrao", "alternativo"])
+def test_streamed_read_matches_read_excel(tmp_path, header_variant):
+    path = str(tmp_path / "emplacamentos.xlsx")
+    write_xlsx(generate_frame(500, seed=5, header_variant=header_variant), path)
+    expected = normalize_columns(raw_columns(pd.read_excel(path)))
+    pd.testing.assert_frame_equal(load_excel(path), expected)
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from engine.columns import NOME_COLUNA_CONCESSIONARIO
+from engine.market_share import ROLLING_WINDOWS, ShareSeries, build_market_share_cube, market_counts, merge_counts
+from engine.schema import concat_frames
+from tests.conftest import synthetic_base
+
+COLUMN = NOME_COLUNA_CONCESSIONARIO
+
+
+def aligned(series, values):
+    """Somas móveis de `series` com as colunas na ordem de `values`."""
+    columns = series.values.get_indexer(values)
+    return {window: sums[:, columns] for window, sums in series.rolling.items()}
+
+
+@pytest.mark.parametrize("base_period, delta_period", [
+    (("2024-01-01", "2024-03-31"), ("2024-06-01", "2024-06-30")),  # extrato depois de meses sem dados
+    (("2024-01-01", "2024-03-31"), ("2024-03-01", "2024-05-31")),  # extrato sobreposto ao fim da base
+    (("2024-06-01", "2024-08-31"), ("2024-01-01", "2024-02-29")),  # extrato antes da base
+])
+def test_extend_matches_rebuild(base_period, delta_period):
+    base_counts = market_counts(synthetic_base(400, seed=1, start=base_period[0], end=base_period[1]))
+    delta_counts = market_counts(synthetic_base(150, seed=2, start=delta_period[0], end=delta_period[1]))
+
+    extended = ShareSeries(base_counts, COLUMN).extend(delta_counts)
+    rebuilt = ShareSeries(merge_counts([base_counts, delta_counts]), COLUMN)
+
+    assert extended.first_month == rebuilt.first_month
+    assert sorted(extended.values) == list(rebuilt.values)
+    np.testing.assert_array_equal(extended.monthly[:, extended.values.get_indexer(rebuilt.values)], rebuilt.monthly)
+    extended_sums = aligned(extended, rebuilt.values)
+    for window in ROLLING_WINDOWS:
+        np.testing.assert_array_equal(extended_sums[window], rebuilt.rolling[window])
+
+
+def test_cube_extend_matches_rebuild():
+    base = synthetic_base(400, seed=1, start="2024-01-01", end="2024-03-31")
+    delta = synthetic_base(150, seed=2, start="2024-06-01", end="2024-06-30")
+    cube = build_market_share_cube(base)
+    # Séries já montadas passam pelo caminho incremental
+    cube.series("concessionaria")
+    cube.series("cidade", brands=("VOLVO",))
+
+    extended = cube.extend(delta)
+    rebuilt = build_market_share_cube(concat_frames([base, delta]))
+    for dimension, brands in [("concessionaria", ()), ("cidade", ("VOLVO",))]:
+        for window in ROLLING_WINDOWS:
+            got = extended.market_share(dimension, window, brands=brands)
+            expected = rebuilt.market_share(dimension, window, brands=brands)
+            assert got["periodo"] == expected["periodo"]
+            assert got["total"] == expected["total"]
+            assert got["ranking"].equals(expected["ranking"])
@@ -0,0 +1,28 @@
+import json
+
+from engine.metrics import MetricsRecorder
+
+
+def test_durations_keep_only_the_window():
+    metrics = MetricsRecorder(window_size=5)
+    for i in range(50):
+        metrics.record("busca", float(i))
+    assert metrics.stage_percentiles()["busca"]["n"] == 5
+
+
+def test_log_is_rotated_past_the_size_limit(tmp_path):
+    log_path = str(tmp_path / "metricas.jsonl")
+    metrics = MetricsRecorder(log_path=log_path, max_log_bytes=1_000)
+    for i in range(200):
+        metrics.start_run(f"sessao-{i}")
+        metrics.record("busca", 0.01)
+        metrics.finish_run()
+
+    current, previous = tmp_path / "metricas.jsonl", tmp_path / "metricas.jsonl.1"
+    # Cada arquivo passa do limite em no máximo uma linha
+    line_bytes = len(previous.read_text(encoding="utf-8").splitlines()[-1].encode("utf-8")) + 1
+    for path in (current, previous):
+        assert path.stat().st_size < 1_000 + line_bytes
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["metricas.jsonl", "metricas.jsonl.1"]
+    last = json.loads(current.read_text(encoding="utf-8").splitlines()[-1])
+    assert last["sessao"] == "sessao-199"
@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+
+from engine.columns import COLUNA_CNPJ_NORMALIZADO, COLUNA_DATA
+from engine.prediction import (
+    calculate_next_purchase_prediction,
+    predict_next_purchases,
+    sales_pitch_bucket,
+    sales_pitch_buckets,
+)
+
+# Fins de mês, compras no mesmo dia e a menos de um mês, e clientes com uma compra só
+EDGE_CASES = {
+    "fim_de_mes": ["2024-01-31", "2024-02-29", "2024-03-31", "2024-05-31"],
+    "mesmo_dia": ["2024-03-10", "2024-03-10", "2024-03-10"],
+    "menos_de_um_mes": ["2023-12-20", "2024-01-05", "2024-01-19"],
+    "bissexto": ["2020-02-29", "2021-02-28", "2022-03-01"],
+    "unica": ["2025-06-30"],
+    "horario": ["2024-01-15 18:30", "2024-02-15 09:00", "2024-04-15 23:59"],
+}
+
+
+def edge_case_frame():
+    rows = [(cnpj, pd.Timestamp(day)) for cnpj, days in EDGE_CASES.items() for day in days]
+    return pd.DataFrame(rows, columns=[COLUNA_CNPJ_NORMALIZADO, COLUNA_DATA])
+
+
+@pytest.fixture(params=["sintetica", "casos_limite"])
+def purchases(request, base_df):
+    if request.param == "casos_limite":
+        return edge_case_frame()
+    return base_df[[COLUNA_CNPJ_NORMALIZADO, COLUNA_DATA]]
+
+
+def test_vectorized_prediction_matches_per_client(purchases):
+    predicted = predict_next_purchases(purchases)
+    for cnpj, dates in purchases.groupby(COLUNA_CNPJ_NORMALIZADO)[COLUNA_DATA]:
+        text, next_date = calculate_next_purchase_prediction(list(dates))
+        assert predicted.at[cnpj, "PrevisaoTexto"] == text
+        got = predicted.at[cnpj, "ProximaCompraPrevista"]
+        if next_date is None:
+            assert pd.isna(got)
+        else:
+            assert got == next_date
+
+
+def test_vectorized_buckets_match_per_client(base_df):
+    profiles = predict_next_purchases(base_df)
+    by_client = base_df.groupby(COLUNA_CNPJ_NORMALIZADO)[COLUNA_DATA]
+    last, totals = by_client.max(), by_client.size()
+    for today in [pd.Timestamp("2025-01-15"), pd.Timestamp("2026-08-31")]:
+        buckets = sales_pitch_buckets(last, profiles["ProximaCompraPrevista"].reindex(last.index), totals, today)
+        for cnpj in last.index:
+            next_date = profiles.at[cnpj, "ProximaCompraPrevista"]
+            expected = sales_pitch_bucket(last[cnpj], None if pd.isna(next_date) else next_date, totals[cnpj], today)
+            assert buckets[cnpj] == expected
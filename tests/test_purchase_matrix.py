@@ -0,0 +1,7 @@
+import subprocess
+import sys
+
+
+def test_dataset_import_does_not_load_scipy():
+    code = "import sys, engine.dataset, engine.storage; sys.exit('scipy' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code]).returncode == 0
@@ -0,0 +1,45 @@
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import generate_frame
+from engine.dataset import Dataset
+from engine.directory import directory_keys
+from engine.export import write_xlsx
+from engine.registry import DatasetRegistry
+from engine.schema import CATEGORICAL_COLUMNS
+
+
+@pytest.fixture
+def spreadsheet(tmp_path, monkeypatch):
+    # Snapshots vão para data/.cache relativo ao diretório atual: isolados no diretório do teste
+    monkeypatch.chdir(tmp_path)
+    path = str(tmp_path / "emplacamentos.xlsx")
+    write_xlsx(generate_frame(200, seed=6), path)
+    return path
+
+
+def is_compact(dataset):
+    return all(isinstance(dataset.df[col].dtype, pd.CategoricalDtype) for col in CATEGORICAL_COLUMNS)
+
+
+@pytest.mark.parametrize("first", [True, False])
+def test_compact_flag_gets_its_own_version(spreadsheet, first):
+    registry = DatasetRegistry()
+    opened = Dataset.open(spreadsheet, registry=registry, compact=first)
+    # Mesmo arquivo com o outro esquema: nem o registro nem o snapshot podem devolver a versão anterior
+    other = Dataset.open(spreadsheet, registry=registry, compact=not first)
+    assert other.key != opened.key
+    assert is_compact(opened) is first
+    assert is_compact(other) is not first
+
+    # Num registro novo, cada esquema volta do próprio snapshot
+    for compact in (first, not first):
+        restored = Dataset.open(spreadsheet, registry=DatasetRegistry(), compact=compact)
+        assert is_compact(restored) is compact
+        assert list(restored.df.dtypes.astype(str)) == list(
+            (opened if compact == first else other).df.dtypes.astype(str)
+        )
+
+
+def test_directory_key_depends_on_compact_flag(spreadsheet):
+    assert directory_keys([spreadsheet], compact=True) != directory_keys([spreadsheet], compact=False)
@@ -0,0 +1,82 @@
+import os
+
+import pandas as pd
+import pytest
+
+from engine.dataset import Dataset
+from engine.registry import DatasetRegistry
+from engine import storage
+from engine.storage import StoredDataset
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "EMPLACAMENTO ANUAL - CAMINHÕES.xlsx")
+
+
+def assert_same_frame(left, right):
+    pd.testing.assert_frame_equal(
+        left.reset_index(drop=True), right.reset_index(drop=True),
+        check_dtype=False, check_categorical=False, check_index_type=False, check_column_type=False,
+    )
+
+
+@pytest.fixture(scope="module")
+def backends(tmp_path_factory):
+    if not os.path.exists(SAMPLE):
+        pytest.skip("planilha de exemplo ausente")
+    memory = Dataset.open(SAMPLE, registry=DatasetRegistry(), use_snapshot=False)
+    # Blocos menores que a planilha: a deduplicação no banco precisa juntar blocos diferentes
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(storage, "INSERT_CHUNK_ROWS", 7_000)
+        stored = StoredDataset.open(SAMPLE, use_snapshot=False, storage_dir=str(tmp_path_factory.mktemp("sqlite")))
+    return memory, stored
+
+
+@pytest.fixture(scope="module")
+def filters(backends):
+    memory, _ = backends
+    brands = list(memory.df["Marca"].value_counts().index[:2])
+    segments = list(memory.df["Segmento"].value_counts().index[:1])
+    return [((), ()), (brands, ()), ((), segments), (brands, segments)]
+
+
+def test_streamed_build_matches_memory(backends):
+    memory, stored = backends
+    assert len(stored) == len(memory)
+    assert_same_frame(memory.df, stored.filtered(limit=None))
+
+
+def test_filtered_returns_one_page(backends, filters):
+    memory, stored = backends
+    for brands, segments in filters:
+        expected = memory.filtered(brands, segments)
+        assert_same_frame(expected.iloc[:storage.FILTERED_PAGE_ROWS], stored.filtered(brands, segments))
+        assert_same_frame(expected.iloc[1500:1600], stored.filtered(brands, segments, limit=100, offset=1500))
+
+
+def test_search_matches_memory(backends, filters):
+    memory, stored = backends
+    df = memory.df
+    queries = ["TRANSP", "SILVA LTDA", "1350", "ab", ""]
+    queries += [str(df["PLACA"].iloc[0]), str(df["Chassi"].iloc[0]), str(df["CNPJ CLIENTE"].iloc[0])]
+    for brands, segments in filters:
+        for query in queries:
+            assert_same_frame(memory.search(query, brands, segments), stored.search(query, brands, segments))
+
+
+def test_profiles_match_memory(backends, filters):
+    memory, stored = backends
+    for brands, segments in filters:
+        assert_same_frame(memory.client_profiles(brands, segments).reset_index(),
+                          stored.client_profiles(brands, segments).reset_index())
+    for cnpj in memory.df["CNPJ_NORMALIZED"].drop_duplicates().sample(20, random_state=1):
+        pd.testing.assert_series_equal(memory.client_profile(cnpj), stored.client_profile(cnpj), check_dtype=False)
+
+
+def test_summary_matches_memory(backends, filters):
+    memory, stored = backends
+    for brands, segments in filters:
+        expected, got = memory.summary(brands, segments), stored.summary(brands, segments)
+        for key in ["total_emplacamentos", "clientes_unicos", "primeiro_ano", "ultimo_ano"]:
+            assert got[key] == expected[key]
+        pd.testing.assert_series_equal(expected["por_ano"], got["por_ano"], check_dtype=False, check_index_type=False)
+        pd.testing.assert_frame_equal(expected["marca_ano"], got["marca_ano"], check_dtype=False, check_categorical=False,
+                                      check_index_type=False, check_column_type=False, check_names=False)